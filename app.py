@@ -1,11 +1,22 @@
-import streamlit as st
-import pandas as pd
-from supabase import create_client
-import io
-import mercadopago
 import time
+t_inicio = time.perf_counter()  # importações e primeira pintura medidas a partir daqui
+import sys
+importacao_fria = "dados" not in sys.modules  # primeiro rerun do processo: os módulos abaixo ainda não foram importados
+import streamlit as st
 import os
-from datetime import datetime
+import uuid
+import tempfile
+from functools import partial
+from dados import BaseLeads
+from filtros import CuboContagens, IndiceFacetas, IndiceFiltros, Selecao
+from exportacao import FORMATOS, CacheExportacoes, FilaExportacoes, chave_exportacao, exportar_para_arquivo, montar_preview
+from pagamentos import VigiaPagamentos
+from remoto import BaseRemota
+from particoes import BaseParticionada
+from precos import calcular_preco
+from metricas import configurar, encerrar_perfil, iniciar_perfil, span
+from clientes import criar_mercado_pago, criar_supabase
+t_importacoes = time.perf_counter() - t_inicio
 
 # ==========================================
 # 🔐 CONFIGURAÇÕES (Sempre a primeira linha)
@@ -60,118 +71,188 @@ try:
     SUPABASE_KEY = os.getenv("SUPABASE_KEY") or st.secrets["supabase"]["key"]
     MP_ACCESS_TOKEN = os.getenv("MP_ACCESS_TOKEN") or st.secrets["mercado_pago"]["access_token"]
     NOME_MARCA = "DiskLeads"
+    LEADS_PAGE_SIZE = int(os.getenv("LEADS_PAGE_SIZE", 1000))
+    LEADS_WORKERS = int(os.getenv("LEADS_WORKERS", 8))
+    LEADS_MARCA = os.getenv("LEADS_MARCA", "id")
+    LEADS_DELTA_SECONDS = int(os.getenv("LEADS_DELTA_SECONDS", 300))
+    LEADS_SNAPSHOT_DIR = os.getenv("LEADS_SNAPSHOT_DIR", ".snapshots")
+    LEADS_COMPACTAR = os.getenv("LEADS_COMPACTAR", "1") == "1"
+    LEADS_MODO = os.getenv("LEADS_MODO", "local")  # "remoto": filtra no Supabase, sem baixar a base (ver remoto.py); "uf": baixa só as UFs selecionadas (ver particoes.py)
+    LEADS_UF_MB = int(os.getenv("LEADS_UF_MB", 512))
+    LEADS_UF_PREFETCH = [uf for uf in os.getenv("LEADS_UF_PREFETCH", "").split(",") if uf]  # vazio = as maiores UFs
+    EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", ".export_cache")
+    EXPORT_CACHE_MB = int(os.getenv("EXPORT_CACHE_MB", 500))
+    EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 2))
+    PAGAMENTO_INTERVALO_MAX = float(os.getenv("PAGAMENTO_INTERVALO_MAX", 15))
+    PAGAMENTO_TTL = float(os.getenv("PAGAMENTO_TTL", 30))
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # painel de desempenho em ?admin=<token> (vazio = desligado)
 except Exception as e:
     st.error("Erro: Verifique se todos os secrets estão configurados corretamente.")
     st.stop()
 
-# Clientes
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-SDK = mercadopago.SDK(MP_ACCESS_TOKEN)
+# Cada rerun da sessão é medido do início ao fim (ver metricas.py); o painel admin pode pedir um cProfile
+metricas = configurar("app")
+sessao_nova = 'sessao_id' not in st.session_state
+if sessao_nova:
+    st.session_state.sessao_id = uuid.uuid4().hex[:8]
+if '_perfil' in st.session_state:  # o rerun perfilado parou no meio (st.rerun)
+    st.session_state.ultimo_perfil = encerrar_perfil(st.session_state.pop('_perfil'), nome=st.session_state.sessao_id)
+if st.session_state.pop('perfilar', False):
+    perfil = iniciar_perfil()
+    if perfil: st.session_state._perfil = perfil
+    else: st.toast("⚠️ Já existe um perfil rodando neste processo; tente de novo em seguida.")
+metricas.iniciar_rerun(st.session_state.sessao_id)
+if importacao_fria: metricas.registrar("importacoes", t_importacoes)
 
 # ==========================================
 # 🧠 FUNÇÕES
 # ==========================================
 
-def normalizar_categoria(cat_google):
-    if not cat_google: return "Outros"
-    cat = str(cat_google).lower()
-    if any(x in cat for x in ['natural', 'suplemento', 'academia', 'fit']): return "Saúde & Fitness"
-    if any(x in cat for x in ['restaurante', 'pizzaria', 'hamburgueria', 'lanchonete', 'padaria']): return "Alimentação"
-    if any(x in cat for x in ['médic', 'clinica', 'saúde', 'hospital', 'dentista']): return "Clínicas & Saúde"
-    if any(x in cat for x in ['oficina', 'mecânic', 'auto', 'carro']): return "Automotivo"
-    if any(x in cat for x in ['advoga', 'jurídic', 'lei', 'contabilidade']): return "Jurídico & Escritórios"
-    if any(x in cat for x in ['loja', 'varejo', 'comércio', 'moda']): return "Varejo & Comércio"
-    if any(x in cat for x in ['imobili', 'construtor', 'engenharia']): return "Construção & Imóveis"
-    return "Outros"
-
 def fmt_real(valor):
     return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
-def classificar_telefone_global(tel):
-    if not tel: return "Outro"
-    nums = "".join(filter(str.isdigit, str(tel)))
-    if nums.startswith("55"):
-        if len(nums) > 2 and nums[2] == '0': return "Outro"
-        if len(nums) == 13 and nums[4] == '9': return "Celular"
-        elif len(nums) == 12: return "Fixo"
-    else:
-        if nums.startswith("0"): return "Outro"
-        if len(nums) == 11 and nums[2] == '9': return "Celular"
-        elif len(nums) == 10: return "Fixo"
-    return "Outro"
-
-def calcular_preco(qtd):
-    tabela = [
-        {"limite": 200, "preco": 0.35, "nome": "Iniciante"},
-        {"limite": 1000, "preco": 0.20, "nome": "Profissional"}, 
-        {"limite": 5000, "preco": 0.10, "nome": "Business"},     
-        {"limite": float('inf'), "preco": 0.05, "nome": "Atacado"} 
-    ]
-    faixa_atual = None
-    prox_faixa_info = None
-    for i, faixa in enumerate(tabela):
-        if qtd <= faixa["limite"]:
-            faixa_atual = faixa
-            if i + 1 < len(tabela):
-                proxima = tabela[i+1]
-                prox_faixa_info = {"meta": faixa["limite"] + 1, "preco": proxima["preco"]}
-            break
-    if not faixa_atual: faixa_atual = tabela[-1]
-    
-    preco_unitario = faixa_atual["preco"]
-    valor_total = qtd * preco_unitario
-    valor_ancora = qtd * 0.35
-    pct_economia_total = 0 if preco_unitario >= 0.35 else int(((valor_ancora - valor_total) / valor_ancora) * 100)
-
-    return {
-        "unitario": preco_unitario,
-        "total": valor_total,
-        "total_ancora": valor_ancora,
-        "pct_off": pct_economia_total,
-        "nivel": faixa_atual["nome"],
-        "prox_qtd": prox_faixa_info["meta"] if prox_faixa_info else None,
-        "prox_preco": prox_faixa_info["preco"] if prox_faixa_info else None
-    }
+def fmt_opcao(valor, contagem):
+    return f"{valor} ({contagem.get(valor, 0):,})".replace(",", ".")
+
+def caminho_publicado(chave, formato):
+    """Caminho do arquivo da fatia no bucket; vai também em vendas.arquivo para o robô achar a cópia publicada."""
+    return f"cache/{chave}.{FORMATOS[formato]['extensao']}"
+
+def baixar_publicado(chave, formato):
+    """Baixa do Storage a cópia já publicada de `chave` para um arquivo temporário (None se não houver)."""
+    try:
+        with span("download_storage", formato=formato):
+            conteudo = supabase.storage.from_('leads_pedidos').download(caminho_publicado(chave, formato))
+    except Exception:
+        return None
+    fd, caminho = tempfile.mkstemp(suffix=f".{FORMATOS[formato]['extensao']}")
+    with os.fdopen(fd, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    return caminho
+
+def arquivo_leads(cache, chave, obter_leads, formato, progresso=None, publicado=False):
+    """`with arquivo_leads(...) as caminho`: arquivo da fatia, reaproveitado do cache se a mesma fatia já
+    foi gerada nesta versão da base, e protegido do despejo enquanto o bloco lê ou sobe o arquivo.
+
+    `obter_leads()` devolve as linhas da fatia e só é chamada se o arquivo precisar ser gerado.
+    Com `publicado=True` a cópia do Storage (a mesma do link do e-mail) vem antes de gerar de novo.
+    """
+    def gerar():
+        if publicado:
+            caminho = baixar_publicado(chave, formato)
+            if caminho: return caminho
+        with span("obter_leads", modo=LEADS_MODO) as s:
+            leads = obter_leads()
+            s["linhas"] = len(leads)
+        with span("exportacao", formato=formato) as s:
+            s["linhas"] = len(leads)
+            return exportar_para_arquivo(leads, formato, progresso=progresso)
+    return cache.usar(chave, FORMATOS[formato]['extensao'], gerar)
+
+def publicar_arquivo(cache, chave, caminho, formato):
+    """Sobe o arquivo para o Storage uma vez por chave e devolve a URL pública."""
+    bucket = supabase.storage.from_('leads_pedidos')
+    caminho_bucket = caminho_publicado(chave, formato)
+    nome = caminho_bucket.split("/", 1)[1]
+    if chave not in cache.publicados:
+        with span("upload_storage", formato=formato):
+            if not any(obj.get('name') == nome for obj in bucket.list('cache', {"search": chave})):
+                with open(caminho, 'rb') as arquivo:
+                    bucket.upload(
+                        path=caminho_bucket,
+                        file=arquivo,
+                        file_options={"x-upsert": "true", "content-type": FORMATOS[formato]['mime']}
+                    )
+        cache.publicados.add(chave)
+    return bucket.get_public_url(caminho_bucket)
+
+def gravar_url_venda(ref_venda, url_publica):
+    # vendas.url_arquivo é o que o disparo_email.py espera para mandar o link
+    with span("supabase_vendas"):
+        supabase.table("vendas").update({"url_arquivo": url_publica}).eq("external_reference", ref_venda).execute()
+
+def gerar_e_publicar(cache, chave, obter_leads, formato, ref_venda, progresso):
+    """Tarefa de segundo plano do checkout: gera, sobe e grava a URL na venda."""
+    with arquivo_leads(cache, chave, obter_leads, formato, progresso) as caminho:
+        progresso(1.0, "enviando")
+        url_publica = publicar_arquivo(cache, chave, caminho, formato)
+    gravar_url_venda(ref_venda, url_publica)
+    return url_publica
+
+# CLIENTES: UM POR PROCESSO, COM AS CONEXÕES REAPROVEITADAS ENTRE SESSÕES E RERUNS (ver clientes.py)
+@st.cache_resource
+def get_supabase():
+    return criar_supabase(SUPABASE_URL, SUPABASE_KEY)
+
+@st.cache_resource
+def get_mercado_pago():  # só o checkout usa; o SDK é importado no primeiro pagamento
+    return criar_mercado_pago(MP_ACCESS_TOKEN)
+
+# BASE COMPARTILHADA ENTRE SESSÕES: DELTA A CADA 5 MIN, RECARGA COMPLETA A CADA 24 HORAS
+@st.cache_resource
+def get_base():
+    return BaseLeads(supabase, "leads", coluna_marca=LEADS_MARCA, tamanho_pagina=LEADS_PAGE_SIZE, max_workers=LEADS_WORKERS,
+                     pasta_snapshot=LEADS_SNAPSHOT_DIR or None, compactar=LEADS_COMPACTAR)
 
-# CACHE DE 24 HORAS (86400 segundos)
-@st.cache_data(ttl=86400)
 def get_all_data():
-    all_rows = []
-    step = 1000
-    start = 0
-    while True:
-        res = supabase.table("leads").select("*").range(start, start + step - 1).execute()
-        rows = res.data
-        all_rows.extend(rows)
-        if len(rows) < step: break
-        start += step
-    
-    df = pd.DataFrame(all_rows)
-    if not df.empty:
-        df['nota'] = pd.to_numeric(df['nota'].astype(str).str.replace(',', '.'), errors='coerce').fillna(0)
-        
-        if 'avaliacoes' in df.columns:
-            df['avaliacoes'] = pd.to_numeric(df['avaliacoes'].astype(str).str.replace('.', '', regex=False), errors='coerce').fillna(0).astype(int)
+    return get_base().obter(intervalo_delta=LEADS_DELTA_SECONDS, intervalo_total=86400)
+
+# ÍNDICE DE FILTROS: REMONTADO SÓ QUANDO A VERSÃO DA BASE MUDA
+@st.cache_resource(max_entries=1)
+def get_indice(versao, _df):
+    return IndiceFiltros(_df)
+
+@st.cache_resource(max_entries=1)
+def get_facetas(versao, _df):
+    return IndiceFacetas(_df)
+
+@st.cache_resource(max_entries=1)
+def get_cubo(versao, _df):
+    return CuboContagens(_df)
+
+# MODO REMOTO: CONTAGENS, AMOSTRA E EXPORTAÇÃO CONSULTADAS NO SUPABASE
+@st.cache_resource
+def get_remota():
+    return BaseRemota(supabase, tamanho_pagina=LEADS_PAGE_SIZE, max_workers=LEADS_WORKERS, intervalo_cubo=LEADS_DELTA_SECONDS)
+
+# MODO UF: PARTIÇÕES POR ESTADO NUM LRU, AS MAIS PROCURADAS PRÉ-CARREGADAS
+@st.cache_resource
+def get_particionada():
+    base = BaseParticionada(get_remota(), limite_mb=LEADS_UF_MB, intervalo=LEADS_DELTA_SECONDS, ufs_prefetch=LEADS_UF_PREFETCH)
+    base.prefetch()
+    return base
+
+# ARQUIVOS GERADOS, COMPARTILHADOS ENTRE SESSÕES
+@st.cache_resource
+def get_cache_export():
+    return CacheExportacoes(EXPORT_CACHE_DIR, limite_mb=EXPORT_CACHE_MB)
+
+@st.cache_resource
+def get_fila_export():
+    return FilaExportacoes(max_workers=EXPORT_WORKERS)
+
+# STATUS DOS PAGAMENTOS: UMA CONSULTA POR CICLO PARA TODAS AS SESSÕES
+@st.cache_resource
+def get_vigia():
+    return VigiaPagamentos(supabase, "vendas", intervalo_max=PAGAMENTO_INTERVALO_MAX, ttl=PAGAMENTO_TTL)
+
+# Roda sozinho a cada 3s sem prender a sessão; só lê memória (vigia e fila)
+@st.fragment(run_every=3)
+def aguardar_pagamento():
+    ref = st.session_state.ref_venda
+    pago = get_vigia().inscrever(ref).is_set()
+    if 'tarefa_export' in st.session_state:
+        tarefa = get_fila_export().estado(st.session_state.tarefa_export)
+        if tarefa['estado'] == 'erro':
+            st.error(f"⚠️ Não conseguimos preparar seu arquivo. Fale com o suporte informando a referência {ref}.")
+        elif tarefa['estado'] != 'concluido':
+            st.progress(tarefa['progresso'], text=f"📦 Preparando seu arquivo... {int(tarefa['progresso'] * 100)}%")
         else:
-            df['avaliacoes'] = 0
-            
-        df['bairro'] = df['bairro'].fillna('Não informado')
-        df['estado'] = df['estado'].fillna('N/A')
-        if 'categoria_google' not in df.columns: df['categoria_google'] = 'Outros'
-        df['categoria_google'] = df['categoria_google'].fillna('Não identificada')
-        
-        df['Segmento'] = df['categoria_google'].apply(normalizar_categoria)
-        df['tipo_contato'] = df['telefone'].apply(classificar_telefone_global)
-        
-        if 'data_extracao' in df.columns:
-            df['data_obj'] = pd.to_datetime(df['data_extracao'], errors='coerce')
-            df['data_fmt'] = df['data_obj'].dt.strftime('%d/%m/%Y').fillna(datetime.today().strftime('%d/%m/%Y'))
-        else:
-            df['data_fmt'] = datetime.today().strftime('%d/%m/%Y')
-        
-        df = df[df['tipo_contato'].isin(['Celular', 'Fixo'])]
-        
-    return df
+            st.success("📦 Arquivo pronto! Ele também vai para o seu e-mail assim que o pagamento for confirmado.")
+    if pago:
+        st.success("✅ Pago!")
+        st.rerun()
+    st.caption("⏳ Aguardando confirmação do pagamento...")
 
 # ==========================================
 # 🖥️ UX: RENDERIZA O SITE PRIMEIRO
@@ -205,11 +286,27 @@ with st.expander("ℹ️ **O que eu vou receber e quanto custa?**", expanded=Fal
 
 st.divider()
 
+# Do início do script até aqui é o que a sessão nova vê antes dos dados (inclui as importações no primeiro rerun do processo)
+if sessao_nova:
+    metricas.registrar("primeira_pintura", time.perf_counter() - t_inicio, rotulos={"importacao": "fria" if importacao_fria else "quente"})
+
 # ==========================================
 # 📥 CARREGAMENTO DE DADOS (COM TEXTO TRANQUILIZADOR)
 # ==========================================
 with st.spinner("🔄 Conectando ao servidor seguro e baixando dados... Aguarde um instante."):
-    df_raw = get_all_data()
+    supabase = get_supabase()  # o supabase-py é importado aqui, com o cabeçalho já na tela
+    if LEADS_MODO in ("remoto", "uf"):
+        with span("indices", modo=LEADS_MODO):
+            facetas, cubo = get_remota().indices()
+        if LEADS_MODO == "uf": get_particionada()
+    else:
+        with span("carga_base") as s:
+            versao_base, id_versao_base, df_raw = get_all_data()
+            s["linhas"] = len(df_raw)
+        # Índices sempre chaveados pela versão lida junto com o df (um delta de outra sessão pode vir no meio)
+        with span("indices", modo=LEADS_MODO):
+            facetas = get_facetas(versao_base, df_raw)
+            cubo = get_cubo(versao_base, df_raw)
 
 # --- FILTROS ---
 with st.container(border=True):
@@ -227,65 +324,84 @@ with st.container(border=True):
     with t1:
         col_a, col_b = st.columns(2)
         with col_a:
-            opts_macro = sorted(df_raw['Segmento'].unique()) if not df_raw.empty else []
-            f_macro = st.multiselect("Setor Principal", opts_macro)
+            opts_macro = facetas.segmentos()
+            f_macro = st.multiselect("Setor Principal", list(opts_macro), format_func=lambda v: fmt_opcao(v, opts_macro))
         with col_b:
-            if f_macro: df_nicho_opts = df_raw[df_raw['Segmento'].isin(f_macro)]
-            else: df_nicho_opts = df_raw
-            opts_nicho = sorted(df_nicho_opts['categoria_google'].unique()) if not df_nicho_opts.empty else []
-            f_google = st.multiselect("Nicho Específico", opts_nicho)
+            opts_nicho = facetas.nichos(f_macro)
+            f_google = st.multiselect("Nicho Específico", list(opts_nicho), format_func=lambda v: fmt_opcao(v, opts_nicho))
 
     with t2:
         col_d, col_e, col_f = st.columns(3)
-        opts_uf = sorted(df_raw['estado'].unique()) if not df_raw.empty else []
-        with col_d: f_uf = st.multiselect("Estado (UF)", opts_uf)
+        opts_uf = facetas.ufs()
+        with col_d: f_uf = st.multiselect("Estado (UF)", list(opts_uf), format_func=lambda v: fmt_opcao(v, opts_uf))
         
-        if f_uf: df_cid_opts = df_raw[df_raw['estado'].isin(f_uf)]
-        else: df_cid_opts = df_raw
-        opts_cidade = sorted(df_cid_opts['cidade'].unique()) if not df_cid_opts.empty else []
-        with col_e: f_cidade = st.multiselect("Cidade", opts_cidade)
+        opts_cidade = facetas.cidades(f_uf)
+        with col_e: f_cidade = st.multiselect("Cidade", list(opts_cidade), format_func=lambda v: fmt_opcao(v, opts_cidade))
         
-        if f_cidade: df_bai_opts = df_cid_opts[df_cid_opts['cidade'].isin(f_cidade)]
-        else: df_bai_opts = df_cid_opts
-        opts_bairro = sorted(df_bai_opts['bairro'].unique()) if not df_bai_opts.empty else []
-        with col_f: f_bairro = st.multiselect("Bairro", opts_bairro)
+        opts_bairro = facetas.bairros(f_uf, f_cidade)
+        with col_f: f_bairro = st.multiselect("Bairro", list(opts_bairro), format_func=lambda v: fmt_opcao(v, opts_bairro))
 
 # --- APPLY FILTROS ---
-df_f = df_raw.copy()
-if busca_nome: df_f = df_f[df_f['nome'].str.contains(busca_nome, case=False, na=False)]
-if filtro_site == "Sim": df_f = df_f[df_f['site'].notnull()]
-elif filtro_site == "Não": df_f = df_f[df_f['site'].isnull()]
-
-df_f = df_f[(df_f['nota'] >= nota_range[0]) & (df_f['nota'] <= nota_range[1])]
-
 min_aval, max_aval = avaliacoes_range
-if max_aval == 1000:
-    df_f = df_f[df_f['avaliacoes'] >= min_aval]
+filtro = {
+    "site": {"Sim": True, "Não": False}.get(filtro_site),
+    "nota": nota_range,
+    "avaliacoes": (min_aval, None if max_aval == 1000 else max_aval),
+    "tipo_contato": {"Só Celular": ["Celular"], "Só Fixo": ["Fixo"]}.get(filtro_tel),
+    "Segmento": f_macro,
+    "categoria_google": f_google,
+    "estado": f_uf,
+    "cidade": f_cidade,
+    "bairro": f_bairro,
+    "nome": busca_nome.strip(),  # só espaços = sem busca (cubo, índice e chave do arquivo concordam)
+}
+if LEADS_MODO == "remoto" or (LEADS_MODO == "uf" and not f_uf):
+    selecao = None  # as linhas só são buscadas para a amostra e para o arquivo
+    obter_leads = partial(get_remota().baixar, filtro)
+    versao_dados = get_remota().id_versao
 else:
-    df_f = df_f[(df_f['avaliacoes'] >= min_aval) & (df_f['avaliacoes'] <= max_aval)]
-
-if filtro_tel == "Só Celular": df_f = df_f[df_f['tipo_contato'] == 'Celular']
-elif filtro_tel == "Só Fixo": df_f = df_f[df_f['tipo_contato'] == 'Fixo']
-
-if f_macro: df_f = df_f[df_f['Segmento'].isin(f_macro)]
-if f_google: df_f = df_f[df_f['categoria_google'].isin(f_google)]
-if f_uf: df_f = df_f[df_f['estado'].isin(f_uf)]
-if f_cidade: df_f = df_f[df_f['cidade'].isin(f_cidade)]
-if f_bairro: df_f = df_f[df_f['bairro'].isin(f_bairro)]
+    if LEADS_MODO == "uf":
+        with st.spinner("📥 Carregando os leads do estado selecionado..."), span("particao", ufs=len(f_uf)):
+            versao_dados, df_base, indice = get_particionada().particao(f_uf)
+    else:
+        df_base, versao_dados = df_raw, id_versao_base
+        indice = get_indice(versao_base, df_raw)
+    # Só as posições das linhas: amostra, gráficos e arquivo puxam da base o que cada um usa
+    with span("filtro") as s:
+        selecao = Selecao(df_base, indice.filtrar(filtro))
+        s["linhas"] = len(selecao)
+    obter_leads = lambda: selecao
 
 filtro_aval_ativo = (avaliacoes_range[0] > 0) or (avaliacoes_range[1] < 1000)
-filtros_ativos = any([busca_nome, f_macro, f_google, f_uf, f_cidade, f_bairro, filtro_aval_ativo])
+filtros_ativos = any([filtro['nome'], f_macro, f_google, f_uf, f_cidade, f_bairro, filtro_aval_ativo])
 
 if not filtros_ativos:
     st.info("👆 Selecione um filtro para começar.")
     m1, m2, m3 = st.columns(3)
-    with m1: st.metric("Empresas", f"{len(df_raw):,}".replace(",", "."))
-    with m2: st.metric("Cidades", f"{df_raw['cidade'].nunique()}")
-    with m3: st.metric("Setores", f"{df_raw['Segmento'].nunique()}")
+    with m1: st.metric("Empresas", f"{cubo.total():,}".replace(",", "."))
+    with m2: st.metric("Cidades", f"{cubo.distintos('cidade')}")
+    with m3: st.metric("Setores", f"{cubo.distintos('Segmento')}")
     st.markdown("---")
 
 else:
-    total_leads = len(df_f)
+    # Filtros só categóricos saem do cubo; busca por nome ou faixa de nota/avaliações contam as linhas
+    with span("contagens") as s:
+        if cubo.atende(filtro):
+            s["origem"] = "cubo"
+            total_leads, contagens = cubo.resumo(filtro)
+            if selecao is None:
+                # O cubo remoto é uma cópia de até intervalo_cubo segundos: o total cobrado vem do count exato,
+                # o mesmo que a exportação vai trazer; o cubo fica só para os gráficos
+                s["origem"] = "cubo+remoto"
+                total_leads = get_remota().contar(filtro)
+        elif selecao is None:
+            s["origem"] = "remoto"
+            total_leads, contagens = get_remota().contar(filtro), None
+        else:
+            s["origem"] = "linhas"
+            total_leads = len(selecao)
+            contagens = {col: selecao.contar(col) for col in ['cidade', 'bairro', 'Segmento']}
+        s["linhas"] = total_leads
     resumo_preco = calcular_preco(total_leads)
     valor_total = round(resumo_preco['total'], 2)
 
@@ -327,44 +443,41 @@ else:
         # 💳 PAGAMENTO & DOWNLOAD
         # ==========================================
         if 'ref_venda' not in st.session_state:
-            st.session_state.ref_venda = f"REF_{int(time.time())}"
+            st.session_state.ref_venda = f"REF_{int(time.time())}_{st.session_state.sessao_id}"  # só o segundo repetia entre compras simultâneas
 
-        check_banco = supabase.table("vendas").select("*").eq("external_reference", st.session_state.ref_venda).execute()
-        is_pago = check_banco.data and check_banco.data[0]['status'] == 'pago'
+        is_pago = get_vigia().status(st.session_state.ref_venda) == 'pago'
 
         if is_pago:
             st.balloons()
             
-            df_final_down = pd.DataFrame()
-            df_final_down['Empresa'] = df_f['nome']
-            df_final_down['Telefone'] = df_f['telefone']
-            df_final_down['Tipo de Telefone'] = df_f['tipo_contato']
-            
-            def gerar_link_down(row):
-                if row['tipo_contato'] == "Celular":
-                    nums = "".join(filter(str.isdigit, str(row['telefone'])))
-                    if not nums.startswith("55"): nums = f"55{nums}"
-                    return f"https://wa.me/{nums}"
-                return ""
-            df_final_down['Link WhatsApp'] = df_f.apply(gerar_link_down, axis=1)
-            
-            df_final_down['Atualizado em'] = df_f['data_fmt']
-            df_final_down['Setor Principal'] = df_f['Segmento']
-            df_final_down['Nicho Específico'] = df_f['categoria_google']
-            df_final_down['Nota Google'] = df_f['nota']
-            df_final_down['Qtd Avaliações'] = df_f['avaliacoes']
-            df_final_down['Endereço Completo'] = df_f['endereco_completo']
-            df_final_down['Bairro'] = df_f['bairro']
-            df_final_down['Cidade'] = df_f['cidade']
-            df_final_down['UF'] = df_f['estado']
-            df_final_down['Site'] = df_f['site']
-
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df_final_down.to_excel(writer, index=False, sheet_name='Leads')
-                worksheet = writer.sheets['Leads']
-                worksheet.set_column('A:A', 30)
-                worksheet.set_column('D:D', 25)
+            # O arquivo é o do checkout: a base pode ter ganho uma versão (ou o filtro mudado) desde então,
+            # e o que foi pago é a fatia daquele momento, a mesma já publicada para o link do e-mail
+            formato = st.session_state.get('formato', 'xlsx')
+            pedido = st.session_state.get('pedido') or {
+                "chave": chave_exportacao(filtro, versao_dados, formato), "formato": formato, "versao": versao_dados, "leads": obter_leads}
+            formato, chave = pedido['formato'], pedido['chave']
+            if pedido['versao'] != versao_dados:
+                print(f"⚠️ Venda {st.session_state.ref_venda}: base mudou desde o checkout ({pedido['versao']} → {versao_dados}); entregando a fatia do checkout")
+            with arquivo_leads(get_cache_export(), chave, pedido['leads'], formato, publicado=True) as caminho:
+                with open(caminho, 'rb') as f: arquivo = f.read()
+
+                # Se a tarefa de segundo plano não gravou a URL (esgotou as tentativas, ou nem rodou),
+                # publica aqui: sem url_arquivo o robô de e-mail não manda o link da venda paga
+                if not st.session_state.get('url_gravada'):
+                    tarefa = get_fila_export().estado(st.session_state.get('tarefa_export'))
+                    if tarefa['estado'] != 'concluido':
+                        try:
+                            with span("publicar_venda") as s:  # falha fica no log JSON e no contador de erros
+                                s["ref_venda"] = st.session_state.ref_venda
+                                gravar_url_venda(st.session_state.ref_venda, publicar_arquivo(get_cache_export(), chave, caminho, formato))
+                        except Exception as e:
+                            # Sem url_arquivo a venda cai na varredura do robô (disparo_email.recuperar_sem_arquivo)
+                            print(f"Erro ao publicar o arquivo da venda {st.session_state.ref_venda}: {e}")
+                            st.warning("⚠️ Não conseguimos enviar o link por e-mail agora; baixe o arquivo abaixo.")
+                        else:
+                            st.session_state.url_gravada = True
+                    else:
+                        st.session_state.url_gravada = True
             
             st.success("✅ Pagamento Confirmado com Sucesso!")
             
@@ -372,14 +485,15 @@ else:
             with col_d1:
                 st.download_button(
                     label="💾 BAIXAR PLANILHA AGORA",
-                    data=output.getvalue(),
-                    file_name=f"leads_{st.session_state.ref_venda}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    data=arquivo,
+                    file_name=f"leads_{st.session_state.ref_venda}.{FORMATOS[formato]['extensao']}",
+                    mime=FORMATOS[formato]['mime'],
                     type="primary",
                     use_container_width=True
                 )
             with col_d2:
                 if st.button("🔄 Fazer Nova Busca", use_container_width=True):
+                    metricas.encerrar_rerun(st.session_state.sessao_id, "rerun")  # o clear() leva o sessao_id
                     st.session_state.clear()
                     st.rerun()
 
@@ -394,55 +508,22 @@ else:
                     st.warning("⚠️ Os e-mails não coincidem.")
                 
                 pode_prosseguir = (email_input == email_confirm) and ("@" in email_input)
+                formato = st.radio("Formato do arquivo", list(FORMATOS), format_func=lambda f: FORMATOS[f]['rotulo'], horizontal=True)
 
                 if st.button("💳 IR PARA PAGAMENTO SEGURO", type="primary", use_container_width=True, disabled=not pode_prosseguir):
                     
-                    df_final = pd.DataFrame()
-                    df_final['Empresa'] = df_f['nome']
-                    df_final['Telefone'] = df_f['telefone']
-                    df_final['Tipo de Telefone'] = df_f['tipo_contato']
-                    
-                    def gerar_link(row):
-                        if row['tipo_contato'] == "Celular":
-                            nums = "".join(filter(str.isdigit, str(row['telefone'])))
-                            if not nums.startswith("55"): nums = f"55{nums}"
-                            return f"https://wa.me/{nums}"
-                        return ""
-                    df_final['Link WhatsApp'] = df_f.apply(gerar_link, axis=1)
-                    
-                    df_final['Atualizado em'] = df_f['data_fmt']
-                    df_final['Setor Principal'] = df_f['Segmento']
-                    df_final['Nicho Específico'] = df_f['categoria_google']
-                    df_final['Nota Google'] = df_f['nota']
-                    df_final['Qtd Avaliações'] = df_f['avaliacoes']
-                    df_final['Endereço Completo'] = df_f['endereco_completo']
-                    df_final['Bairro'] = df_f['bairro']
-                    df_final['Cidade'] = df_f['cidade']
-                    df_final['UF'] = df_f['estado']
-                    df_final['Site'] = df_f['site']
-
-                    output_file = io.BytesIO()
-                    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
-                        df_final.to_excel(writer, index=False, sheet_name='Leads')
-                        worksheet = writer.sheets['Leads']
-                        worksheet.set_column('A:A', 30)
-                        worksheet.set_column('D:D', 25)
-
-                    nome_arquivo = f"{st.session_state.ref_venda}.xlsx"
-                    supabase.storage.from_('leads_pedidos').upload(
-                        path=nome_arquivo, 
-                        file=output_file.getvalue(), 
-                        file_options={"x-upsert": "true", "content-type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
-                    )
-                    url_publica = supabase.storage.from_('leads_pedidos').get_public_url(nome_arquivo)
-
-                    supabase.table("vendas").upsert({
-                        "external_reference": st.session_state.ref_venda,
-                        "valor": valor_total,
-                        "status": "pendente",
-                        "email_cliente": email_input,
-                        "url_arquivo": url_publica
-                    }).execute()
+                    st.session_state.formato = formato
+                    chave = chave_exportacao(filtro, versao_dados, formato)
+                    # url_arquivo fica vazia até a tarefa de segundo plano (ou a tela de pago) terminar o upload;
+                    # `arquivo` diz ao robô onde a cópia publicada estará, se só a gravação da URL falhar
+                    with span("supabase_vendas"):
+                        supabase.table("vendas").upsert({
+                            "external_reference": st.session_state.ref_venda,
+                            "valor": valor_total,
+                            "status": "pendente",
+                            "email_cliente": email_input,
+                            "arquivo": caminho_publicado(chave, formato)
+                        }).execute()
 
                     pref_data = {
                         "items": [{"title": f"Base {total_leads} Leads - {NOME_MARCA}", "quantity": 1, "unit_price": float(valor_total), "currency_id": "BRL"}],
@@ -451,11 +532,17 @@ else:
                         "auto_return": "approved",
                         "notification_url": "https://wsqebbwjmiwiscbkmawy.supabase.co/functions/v1/smooth-processor"
                     }
-                    res = SDK.preference().create(pref_data)
+                    with span("mercado_pago"):
+                        res = get_mercado_pago().preference().create(pref_data)
                     
                     if res["status"] in [200, 201]:
                         link_mp = res["response"]["init_point"]
                         st.session_state.link_ativo = link_mp
+                        # O que foi pago: a tela de pago reaproveita isto mesmo que a base ou o filtro mudem depois
+                        st.session_state.pedido = {"chave": chave, "formato": formato, "versao": versao_dados, "leads": obter_leads}
+                        st.session_state.tarefa_export = get_fila_export().enviar(partial(
+                            gerar_e_publicar, get_cache_export(), chave, obter_leads, formato, st.session_state.ref_venda),
+                            ref_venda=st.session_state.ref_venda)
                         st.components.v1.html(f"<script>window.open('{link_mp}', '_blank');</script>", height=0)
                     else:
                         st.error("Erro no Mercado Pago.")
@@ -464,36 +551,25 @@ else:
                     st.info("🕒 Checkout aberto.")
                     st.markdown(f'<div style="text-align:center;"><a href="{st.session_state.link_ativo}" target="_blank"><button style="padding:12px; background-color:#2e66f1; color:white; border:none; border-radius:5px; cursor:pointer; font-weight:bold;">ABRIR PAGAMENTO</button></a></div>', unsafe_allow_html=True)
                     
-                    with st.status("Aguardando confirmação...") as status:
-                        for _ in range(60):
-                            time.sleep(3)
-                            check = supabase.table("vendas").select("status").eq("external_reference", st.session_state.ref_venda).execute()
-                            if check.data and check.data[0]['status'] == 'pago':
-                                status.update(label="✅ Pago!", state="complete")
-                                st.rerun()
+                    aguardar_pagamento()
 
     # 3. Análise Visual
     st.divider()
     st.subheader("📊 Raio-X da Base Selecionada")
-    g1, g2, g3 = st.columns(3)
-    with g1: st.bar_chart(df_f['cidade'].value_counts().head(10), color="#2E66F1", horizontal=True)
-    with g2: st.bar_chart(df_f['bairro'].value_counts().head(10), color="#2ecc71", horizontal=True)
-    with g3: st.bar_chart(df_f['Segmento'].value_counts(), color="#f39c12", horizontal=True)
+    if contagens is None:
+        st.caption("Gráficos indisponíveis com busca por nome ou faixa de nota/avaliações.")
+    else:
+        g1, g2, g3 = st.columns(3)
+        with g1: st.bar_chart(contagens['cidade'].head(10), color="#2E66F1", horizontal=True)
+        with g2: st.bar_chart(contagens['bairro'].head(10), color="#2ecc71", horizontal=True)
+        with g3: st.bar_chart(contagens['Segmento'], color="#f39c12", horizontal=True)
 
     st.subheader("📋 Amostra dos Dados (Top 50)")
     
-    df_preview = pd.DataFrame()
-    df_preview['Empresa'] = df_f['nome']
-    df_preview['Telefone'] = df_f['telefone'].apply(lambda x: str(x)[:-4] + "****" if x and len(str(x)) > 4 else "****")
-    df_preview['Tipo'] = df_f['tipo_contato']
-    df_preview['Setor'] = df_f['Segmento']
-    df_preview['Nicho'] = df_f['categoria_google']
-    df_preview['Cidade'] = df_f['cidade']
-    df_preview['Nota'] = df_f['nota']
-    df_preview['Avaliações'] = df_f['avaliacoes']
-    df_preview['Atualizado em'] = df_f['data_fmt']
-    
-    st.dataframe(df_preview.head(50), use_container_width=True, hide_index=True)
+    with span("amostra", modo=LEADS_MODO):
+        df_amostra = get_remota().amostra(filtro, 50) if selecao is None else selecao.linhas(0, 50)
+        df_preview = montar_preview(df_amostra)
+    st.dataframe(df_preview, use_container_width=True, hide_index=True)
 
 # ==========================================
 # 🛡️ RODAPÉ E SUPORTE
@@ -518,4 +594,38 @@ with col_f2:
         **Garantia:** Oferecemos os dados "como estão" nas fontes públicas. A taxa de assertividade média é de 80-90%.
         """)
     st.caption(f"© 2025 {NOME_MARCA} - Todos os direitos reservados.")
-    st.caption(f"CNPJ: 61.957.100/0001-03")
\ No newline at end of file
+    st.caption(f"CNPJ: 61.957.100/0001-03")
+
+# ==========================================
+# ⏱️ PAINEL DE DESEMPENHO (?admin=<token>)
+# ==========================================
+if '_perfil' in st.session_state:
+    st.session_state.ultimo_perfil = encerrar_perfil(st.session_state.pop('_perfil'), nome=st.session_state.sessao_id)
+
+if ADMIN_TOKEN and st.query_params.get("admin") == ADMIN_TOKEN:
+    with st.sidebar:
+        st.subheader("⏱️ Reruns mais lentos")
+        lentos = metricas.reruns_lentos(15)
+        if lentos:
+            st.dataframe([{
+                "Início": time.strftime("%H:%M:%S", time.localtime(r['inicio'])),
+                "Sessão": r['sessao'],
+                "Segundos": r['segundos'],
+                "Status": r['status'],
+                "Etapas mais lentas": ", ".join(f"{e} {seg:.2f}s" for e, _, seg, _ in sorted(r['spans'], key=lambda x: -x[2])[:3]),
+            } for r in lentos], hide_index=True)
+        else:
+            st.caption("Nenhum rerun medido ainda.")
+        with st.expander("Etapas desde o início do processo"):
+            st.dataframe(metricas.resumo(), hide_index=True)
+        if st.button("🔬 Perfilar o próximo rerun desta sessão"):
+            st.session_state.perfilar = True
+            metricas.encerrar_rerun(st.session_state.sessao_id, "rerun")
+            st.rerun()
+        if 'ultimo_perfil' in st.session_state:
+            caminho_perfil, texto_perfil = st.session_state.ultimo_perfil
+            st.caption(f"Perfil gravado em `{caminho_perfil}`")
+            with st.expander("Top 30 por tempo acumulado"):
+                st.code(texto_perfil)
+
+metricas.encerrar_rerun(st.session_state.sessao_id)
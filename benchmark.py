@@ -0,0 +1,207 @@
+import gc
+import os
+import sys
+import json
+import time
+import ctypes
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from dados import baixar_tabela, carregar_snapshot, compactar_leads, salvar_snapshot, tratar_leads
+from exportacao import FORMATOS, exportar_para_arquivo, montar_preview
+from filtros import CuboContagens, IndiceFacetas, IndiceFiltros, Selecao
+from precos import calcular_preco
+from sintetico import gerar_leads, gerar_registros, interpretar_tamanho
+
+# ==========================================
+# ⏱️ BENCHMARK DO PIPELINE
+# ==========================================
+# python benchmark.py [--tamanhos 10k,100k,1M,5M] [--salvar] [--tolerancia 0.5]
+# Mede tempo e pico de memória (RSS acima do início da etapa) de carga, tratamento, índices,
+# filtro, agregação, preço, amostra e exportação sobre leads sintéticos (sintetico.py), e o
+# tempo de importação do app num interpretador novo.
+# Sem --salvar compara com a referência versionada (.benchmarks/referencia.json) e sai com
+# código 1 se alguma etapa piorar além da tolerância, ou se não houver referência para ela.
+
+REFERENCIA = os.path.join(".benchmarks", "referencia.json")
+
+# Filtros típicos da tela (mesmo formato de filtros.py)
+FILTROS = [
+    {"tipo_contato": ["Celular"]},
+    {"tipo_contato": ["Celular"], "estado": ["SP"]},
+    {"tipo_contato": ["Celular"], "estado": ["SP", "RJ", "MG"], "Segmento": ["Alimentação"]},
+    {"estado": ["PR"], "cidade": ["Curitiba"], "site": True},
+    {"Segmento": ["Automotivo", "Clínicas & Saúde"], "nota": (4.5, 5.0)},
+    {"tipo_contato": ["Celular"], "avaliacoes": (100, None)},
+    {"nome": "silva"},
+    {"nome": "pizzaria", "estado": ["SP"]},
+]
+
+# (já importado, medido): o que o app.py importa antes da primeira pintura, e o que fica para depois
+IMPORTACOES = {
+    "importacao_app": ("", "import streamlit, dados, filtros, exportacao, pagamentos, remoto, particoes, precos, metricas, clientes"),
+    "importacao_clientes": ("import streamlit, dados, exportacao", "import supabase, mercadopago"),
+}
+
+def rss_mb():
+    with open("/proc/self/statm") as f: return int(f.read().split()[1]) * resource.getpagesize() / 1024 ** 2
+
+def devolver_memoria():
+    # Sem isso o RSS inicial de cada etapa depende do que a anterior deixou livre no heap
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+@contextmanager
+def medir(resultados, etapa, linhas=None):
+    """Tempo e pico de RSS (amostrado a cada 5 ms) do bloco."""
+    devolver_memoria()
+    inicio, amostras, rodando = rss_mb(), [], [True]
+
+    def amostrar():
+        while rodando[0]:
+            amostras.append(rss_mb())
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=amostrar, daemon=True)
+    sampler.start()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - t0
+        rodando[0] = False
+        sampler.join()
+        pico = max(amostras + [rss_mb()]) - inicio
+        resultados[etapa] = {"segundos": round(segundos, 4), "pico_mb": round(max(pico, 0.0), 1)}
+        if linhas is not None: resultados[etapa]["linhas"] = int(linhas)
+        print(f"  {etapa:22} {segundos:8.3f}s  pico +{max(pico, 0.0):7.1f} MB" + (f"  ({linhas:,} linhas)" if linhas is not None else ""))
+
+def rodar(n, limite_http, limite_export):
+    resultados = {}
+    print(f"📏 {n:,} leads")
+    bruto = gerar_leads(n)
+
+    if n <= limite_http:
+        # Paginação paralela contra o Supabase falso (HTTP local)
+        import fake_supabase as fk
+        from clientes import criar_supabase
+        servidor, url = fk.iniciar(fk.BancoFalso({"leads": gerar_registros(n)}))
+        client = criar_supabase(url, "benchmark" * 5)
+        with medir(resultados, "carga_http", n):
+            baixar_tabela(client, "leads")
+        servidor.shutdown()
+
+    with medir(resultados, "tratamento", n):
+        df = compactar_leads(tratar_leads(bruto))
+    del bruto
+
+    with tempfile.TemporaryDirectory() as pasta:
+        salvar_snapshot(df, pasta, "leads")
+        with medir(resultados, "carga_snapshot", len(df)):
+            df, _ = carregar_snapshot(pasta, "leads")
+
+    with medir(resultados, "indices"):
+        indice = IndiceFiltros(df)
+        IndiceFacetas(df)
+        cubo = CuboContagens(df)
+
+    selecoes = []
+    with medir(resultados, "filtro"):
+        for filtro in FILTROS:
+            selecoes.append(Selecao(df, indice.filtrar(filtro)))
+
+    with medir(resultados, "agregacao_cubo"):
+        for filtro in FILTROS:
+            if cubo.atende(filtro):
+                cubo.total(filtro)
+                for col in ('cidade', 'bairro', 'Segmento'): cubo.contar(col, filtro)
+
+    with medir(resultados, "agregacao_linhas"):
+        for sel in selecoes:
+            for col in ('cidade', 'bairro', 'Segmento'): sel.contar(col)
+
+    with medir(resultados, "preco"):
+        for qtd in range(0, 100_000):
+            calcular_preco(qtd)
+
+    with medir(resultados, "amostra"):
+        for sel in selecoes:
+            montar_preview(sel.linhas(0, 50))
+
+    fatia = df.head(min(len(df), limite_export))
+    for formato in FORMATOS:
+        with medir(resultados, f"exportacao_{formato}", len(fatia)):
+            os.remove(exportar_para_arquivo(fatia, formato))
+    return resultados
+
+def medir_importacoes(repeticoes=3):
+    """Importações a frio (processo Python novo a cada vez); fica a melhor de `repeticoes`."""
+    resultados = {}
+    for etapa, (antes, codigo) in IMPORTACOES.items():
+        script = "\n".join(["import time, resource", antes, "m0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss",
+                            "t0 = time.perf_counter()", codigo,
+                            "print(time.perf_counter() - t0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - m0)"])
+        medidas = []
+        for _ in range(repeticoes):
+            saida = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+            medidas.append((float(saida[0]), int(saida[1]) / 1024))
+        segundos, pico = min(medidas)
+        resultados[etapa] = {"segundos": round(segundos, 4), "pico_mb": round(pico, 1)}
+        print(f"  {etapa:22} {segundos:8.3f}s  pico +{pico:7.1f} MB")
+    return resultados
+
+def comparar(atual, referencia, tolerancia, folga_s=0.05, folga_mb=16.0):
+    """Etapas que ficaram mais lentas ou gastaram mais memória que a referência (além da tolerância),
+    ou que não têm referência para comparar."""
+    regressoes = []
+    for tamanho, etapas in atual.items():
+        for etapa, medida in etapas.items():
+            base = referencia.get(tamanho, {}).get(etapa)
+            if not base:
+                regressoes.append(f"{tamanho} {etapa}: sem referência")
+                continue
+            if medida["segundos"] > base["segundos"] * (1 + tolerancia) and medida["segundos"] - base["segundos"] > folga_s:
+                regressoes.append(f"{tamanho} {etapa}: {base['segundos']:.3f}s -> {medida['segundos']:.3f}s")
+            if medida["pico_mb"] > base["pico_mb"] * (1 + tolerancia) and medida["pico_mb"] - base["pico_mb"] > folga_mb:
+                regressoes.append(f"{tamanho} {etapa}: {base['pico_mb']:.1f} MB -> {medida['pico_mb']:.1f} MB")
+    return regressoes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de leads")
+    parser.add_argument("--tamanhos", default="10k,100k,1M,5M", help="ex.: 10k,100k")
+    parser.add_argument("--salvar", action="store_true", help="grava o resultado como nova referência")
+    parser.add_argument("--referencia", default=REFERENCIA)
+    parser.add_argument("--tolerancia", type=float, default=0.5, help="piora relativa aceita (0.5 = 50%%)")
+    parser.add_argument("--limite-http", type=int, default=100_000, help="maior base para medir a carga via HTTP")
+    parser.add_argument("--limite-export", type=int, default=500_000, help="linhas exportadas por formato (a venda típica grande)")
+    args = parser.parse_args()
+
+    print("📦 importações")
+    atual = {"importacoes": medir_importacoes()}
+    for tamanho in args.tamanhos.split(","):
+        n = interpretar_tamanho(tamanho)
+        atual[str(n)] = rodar(n, args.limite_http, args.limite_export)
+
+    if args.salvar:
+        os.makedirs(os.path.dirname(args.referencia) or ".", exist_ok=True)
+        referencia = json.load(open(args.referencia)) if os.path.exists(args.referencia) else {}
+        referencia.update(atual)
+        with open(args.referencia, "w") as f: json.dump(referencia, f, indent=2)
+        print(f"💾 Referência gravada em {args.referencia}")
+        sys.exit()
+
+    if not os.path.exists(args.referencia):
+        print(f"❌ Sem referência em {args.referencia}: rode com --salvar para criar.")
+        sys.exit(1)
+    with open(args.referencia) as f: regressoes = comparar(atual, json.load(f), args.tolerancia)
+    if regressoes:
+        print("❌ Regressões:\n  " + "\n  ".join(regressoes))
+        sys.exit(1)
+    print("✅ Sem regressões em relação à referência")
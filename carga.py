@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from collections import Counter
+import numpy as np
+import fake_supabase as fk
+from sintetico import gerar_registros, interpretar_tamanho
+
+# ==========================================
+# 🏋️ TESTE DE CARGA DO SITE
+# ==========================================
+# python carga.py [--sessoes 20] [--leads 50k] [--modo local|remoto|uf] [--latencia rest=0.03,mercadopago=0.3]
+# Sobe o fake_supabase.py com leads sintéticos, roda o app.py com `streamlit run` apontado para
+# ele e abre N sessões simultâneas pelo mesmo websocket que o navegador usa. Cada sessão faz o
+# caminho de uma compra: abre o site, filtra UF e cidade, preenche o e-mail, vai para o checkout
+# e deixa o fragmento do pagamento rodar (a cada run_every, como o navegador) até a venda ficar
+# paga (o servidor falso aprova depois de --aprovar s) e o arquivo sair. Mede cada rerun do
+# pedido até o script_finished (p50/p95 por passo, com a fila do servidor incluída), as
+# consultas por segundo ao backend e a memória do servidor por sessão conectada.
+# Dependências: requirements-dev.txt (websockets).
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# ForwardMsg.script_finished: 0 terminou, 1 erro de compilação, 2 interrompido por outro rerun, 3 fragmento terminou
+FIM_RERUN = {0, 1, 3}
+
+def rss_processo_mb(pid):
+    with open(f"/proc/{pid}/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+
+def _maiores(opcoes, n):
+    """As `n` opções com mais leads ("São Paulo (1.234)" -> 1234): é o que as pessoas mais escolhem."""
+    qtd = lambda o: int(o.rsplit("(", 1)[-1].rstrip(")").replace(".", "") or 0) if o.endswith(")") else 0
+    return sorted(opcoes, key=qtd, reverse=True)[:n]
+
+class Sessao:
+    """Uma pessoa comprando, falando com o servidor como o navegador; cada interação é um rerun medido."""
+
+    def __init__(self, numero, url_ws, formatos, pensar=0.5, espera_max=90.0, timeout=120.0):
+        self.numero = numero
+        self.url_ws = url_ws
+        self.formatos = formatos
+        self.pensar = pensar
+        self.espera_max = espera_max
+        self.timeout = timeout
+        self.rng = random.Random(numero)
+        self.reruns = []  # (passo, segundos)
+        self.status = "iniciada"
+        self.erro = None
+        self.elementos = {}  # (tipo, rótulo) -> proto do elemento no último rerun
+        self.alertas = []
+        self.excecao = None
+        self.fragmento = None  # (fragment_id, intervalo) do st.fragment(run_every=...)
+        self.estados = {}  # id do widget -> WidgetState enviado em todo rerun (o navegador faz igual)
+        self.ws = self.leitor = None
+
+    async def _ler(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        async for dados in self.ws:
+            msg = ForwardMsg()
+            msg.ParseFromString(dados)
+            tipo = msg.WhichOneof("type")
+            if tipo == "new_session" and not msg.new_session.fragment_ids_this_run:
+                self.elementos, self.alertas, self.excecao = {}, [], None
+            elif tipo == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                elemento = msg.delta.new_element
+                tipo_elemento = elemento.WhichOneof("type")
+                proto = getattr(elemento, tipo_elemento)
+                if tipo_elemento == "alert": self.alertas.append(proto.body)
+                elif tipo_elemento == "exception": self.excecao = proto.message
+                elif hasattr(proto, "label"): self.elementos[(tipo_elemento, proto.label)] = proto
+            elif tipo == "auto_rerun":
+                self.fragmento = (msg.auto_rerun.fragment_id, msg.auto_rerun.interval)
+            elif tipo == "script_finished":
+                self.fins.put_nowait(msg.script_finished)
+
+    async def _rerun(self, passo, gatilhos=(), fragmento=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(self.estados.values())
+        for id_widget in gatilhos:
+            msg.rerun_script.widget_states.widgets.append(WidgetState(id=id_widget, trigger_value=True))
+        msg.rerun_script.fragment_id = fragmento
+        msg.rerun_script.is_auto_rerun = bool(fragmento)
+        t0 = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while (status := await asyncio.wait_for(self.fins.get(), self.timeout)) not in FIM_RERUN: pass
+        self.reruns.append((passo, time.perf_counter() - t0))
+        if status == 1 or self.excecao: raise RuntimeError(f"{passo}: {self.excecao or 'erro de compilação'}")
+
+    async def _pensar(self):
+        await asyncio.sleep(self.rng.uniform(0, 2 * self.pensar))
+
+    def _widget(self, tipo, rotulo):
+        return next((p for (t, r), p in self.elementos.items() if t == tipo and rotulo in r), None)
+
+    def _definir(self, tipo, rotulo, **valor):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        proto = self._widget(tipo, rotulo)
+        estado = WidgetState(id=proto.id)
+        if "opcoes" in valor: estado.string_array_value.data[:] = valor["opcoes"]
+        else: estado.string_value = valor["texto"]
+        self.estados[proto.id] = estado
+
+    async def rodar(self):
+        import websockets
+        try:
+            self.fins = asyncio.Queue()
+            self.ws = await websockets.connect(self.url_ws, subprotocols=["streamlit"], max_size=None)
+            self.leitor = asyncio.create_task(self._ler())
+            await self._rerun("landing")
+            await self._pensar()
+            uf = self.rng.choice(_maiores(self._widget("multiselect", "Estado (UF)").options, 8))
+            self._definir("multiselect", "Estado (UF)", opcoes=[uf])
+            await self._rerun("filtro_uf")
+            await self._pensar()
+            cidades = _maiores(self._widget("multiselect", "Cidade").options, 10)
+            if cidades:
+                self._definir("multiselect", "Cidade", opcoes=[self.rng.choice(cidades)])
+                await self._rerun("filtro_cidade")
+                await self._pensar()
+            if self._widget("button", "PAGAMENTO SEGURO") is None:
+                self.status = "sem_leads"
+                return self
+            email = f"carga{self.numero}@exemplo.com"
+            self._definir("text_input", "Seu E-mail", texto=email)
+            await self._rerun("email")
+            await self._pensar()
+            formato = self.rng.choice(self.formatos)
+            self._definir("radio", "Formato do arquivo", texto=next(o for o in self._widget("radio", "Formato do arquivo").options
+                                                                    if formato in o.lower()))
+            self._definir("text_input", "Confirme seu E-mail", texto=email)
+            await self._rerun("email")
+            await self._pensar()
+            await self._rerun("checkout", gatilhos=[self._widget("button", "PAGAMENTO SEGURO").id])
+            if self.fragmento is None: raise RuntimeError(f"checkout sem o fragmento do pagamento: {self.alertas}")
+            inicio = time.time()
+            while time.time() - inicio < self.espera_max:
+                await asyncio.sleep(self.fragmento[1])
+                await self._rerun("consulta_pagamento", fragmento=self.fragmento[0])
+                if any("Pagamento Confirmado" in a for a in self.alertas):
+                    self.reruns[-1] = ("pagamento_confirmado", self.reruns[-1][1])  # o fragmento chamou st.rerun: inclui ler o arquivo
+                    self.status = "paga"
+                    return self
+            self.status = "sem_confirmacao"
+        except Exception as e:
+            self.status, self.erro = "erro", f"{type(e).__name__}: {e}"
+        return self
+
+    async def fechar(self):
+        if self.ws is not None: await self.ws.close()
+        if self.leitor is not None: self.leitor.cancel()
+
+def percentis(segundos):
+    a = np.array(segundos)
+    return {"qtd": len(a), "p50": round(float(np.percentile(a, 50)), 4), "p95": round(float(np.percentile(a, 95)), 4),
+            "max": round(float(a.max()), 4)}
+
+def preparar_backend(n, modo, latencias, aprovar_em):
+    registros = gerar_registros(n)
+    tabelas = {"leads": registros, "vendas": []}
+    if modo in ("remoto", "uf"):
+        from remoto import tratar_para_remoto
+        tratados = tratar_para_remoto([dict(r) for r in registros])
+        tabelas["leads_tratados"] = tratados.astype(object).where(tratados.notna(), None).to_dict("records")
+    banco = fk.BancoFalso(tabelas, materializadas={"leads_cubo": fk.view_cubo()})
+    servidor, url = fk.iniciar(banco, latencias=latencias, aprovar_em=aprovar_em)
+    return banco, servidor, url
+
+def subir_app(url_backend, porta, modo, pasta):
+    """`streamlit run app.py` apontado para o backend falso; espera o /_stcore/health responder."""
+    ambiente = dict(os.environ, SUPABASE_URL=url_backend, SUPABASE_KEY="carga" * 8, MP_ACCESS_TOKEN="TEST-carga", MP_API_URL=url_backend,
+                    LEADS_MODO=modo, LEADS_SNAPSHOT_DIR="", EXPORT_CACHE_DIR=os.path.join(pasta, "export"),
+                    METRICAS_DIR=os.path.join(pasta, "metricas"))
+    log = open(os.path.join(pasta, "app.log"), "w")
+    processo = subprocess.Popen([sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true", "--server.port", str(porta),
+                                 "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+                                env=ambiente, cwd=os.path.dirname(APP), stdout=log, stderr=subprocess.STDOUT)
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{porta}/_stcore/health", timeout=1)
+            return processo
+        except OSError:
+            if processo.poll() is not None: break
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError(f"o app não subiu; veja {log.name}")
+
+def etapas_do_app(pasta, desde):
+    """Tempo total por etapa (spans do app, ver metricas.py) durante o teste."""
+    total = Counter()
+    caminho = os.path.join(pasta, "metricas", "spans_app.jsonl")
+    if not os.path.exists(caminho): return {}
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            span = json.loads(linha)
+            if span["ts"] >= desde and span["etapa"] != "rerun": total[span["etapa"]] += span["segundos"]
+    return {etapa: round(s, 2) for etapa, s in total.most_common(8)}
+
+async def rodar_sessoes(sessoes, rampa):
+    tarefas = []
+    for sessao in sessoes:
+        tarefas.append(asyncio.create_task(sessao.rodar()))
+        await asyncio.sleep(rampa / max(len(sessoes), 1))
+    await asyncio.gather(*tarefas)
+
+def rodar(args):
+    pasta = tempfile.mkdtemp(prefix="carga_")
+    n = interpretar_tamanho(args.leads)
+    banco, servidor, url = preparar_backend(n, args.modo, fk.ler_latencias(args.latencia), args.aprovar)
+    app = subir_app(url, args.porta, args.modo, pasta)
+    url_ws = f"ws://127.0.0.1:{args.porta}/_stcore/stream"
+    try:
+        # Uma compra sozinha antes: importações, carga da base e índices ficam fora da medida
+        print(f"🔥 aquecendo ({n:,} leads, modo {args.modo}, app em {pasta})")
+        aquecimento = Sessao(-1, url_ws, args.formatos, pensar=0, espera_max=args.espera_max)
+        t0 = time.perf_counter()
+        asyncio.run(aquecimento.rodar())
+        print(f"   {time.perf_counter() - t0:.1f}s ({aquecimento.status}{': ' + aquecimento.erro if aquecimento.erro else ''})")
+
+        rss_inicio = rss_processo_mb(app.pid)
+        requisicoes_antes = Counter(banco.requisicoes)
+        sessoes = [Sessao(i, url_ws, args.formatos, args.pensar, args.espera_max) for i in range(args.sessoes)]
+        print(f"🏋️ {args.sessoes} sessões simultâneas (rampa de {args.rampa:.0f}s)")
+        inicio = time.time()
+
+        async def medir():
+            async def amostrar():
+                while True:
+                    pico[0] = max(pico[0], rss_processo_mb(app.pid))
+                    await asyncio.sleep(0.1)
+
+            amostragem = asyncio.create_task(amostrar())
+            await rodar_sessoes(sessoes, args.rampa)
+            amostragem.cancel()
+            fim = time.time(), rss_processo_mb(app.pid)  # com todas as sessões ainda conectadas
+            await asyncio.gather(*(s.fechar() for s in sessoes))
+            return fim
+
+        pico = [rss_inicio]
+        fim, rss_fim = asyncio.run(medir())
+        duracao = fim - inicio
+        requisicoes = Counter(banco.requisicoes)
+        requisicoes.subtract(requisicoes_antes)
+    finally:
+        app.terminate()
+        app.wait()
+        servidor.shutdown()
+
+    por_passo = {}
+    for sessao in sessoes:
+        for passo, segundos in sessao.reruns: por_passo.setdefault(passo, []).append(segundos)
+    total_requisicoes = sum(requisicoes.values())
+    return {
+        "sessoes": args.sessoes, "leads": n, "modo": args.modo, "latencia": args.latencia, "duracao_s": round(duracao, 2),
+        "status": dict(Counter(s.status for s in sessoes)),
+        "erros": [s.erro for s in sessoes if s.erro][:10],
+        "reruns": percentis([seg for lista in por_passo.values() for seg in lista]) if por_passo else {},
+        "por_passo": {passo: percentis(lista) for passo, lista in por_passo.items()},
+        "backend": {"requisicoes": total_requisicoes, "qps": round(total_requisicoes / duracao, 1),
+                    "rotas": dict(sorted(((r, q) for r, q in requisicoes.items() if q), key=lambda i: -i[1]))},
+        "memoria": {"rss_inicio_mb": round(rss_inicio, 1), "rss_fim_mb": round(rss_fim, 1), "pico_mb": round(pico[0], 1),
+                    "por_sessao_mb": round((rss_fim - rss_inicio) / max(args.sessoes, 1), 2)},
+        "etapas_app_s": etapas_do_app(pasta, inicio),
+    }
+
+def imprimir(r):
+    print(f"\n📊 {r['sessoes']} sessões em {r['duracao_s']:.1f}s: " + ", ".join(f"{q} {s}" for s, q in r['status'].items()))
+    for erro in r['erros']: print(f"   ⚠️ {erro}")
+    if r['reruns']:
+        print(f"  {'passo':22} {'reruns':>6} {'p50':>8} {'p95':>8} {'max':>8}")
+        for passo, p in list(r['por_passo'].items()) + [("todos", r['reruns'])]:
+            print(f"  {passo:22} {p['qtd']:6} {p['p50']:7.3f}s {p['p95']:7.3f}s {p['max']:7.3f}s")
+    b, m = r['backend'], r['memoria']
+    print(f"🌐 backend: {b['requisicoes']:,} requisições, {b['qps']:.1f}/s (" + ", ".join(f"{rota} {q}" for rota, q in list(b['rotas'].items())[:6]) + ")")
+    print(f"🧠 servidor: {m['rss_inicio_mb']:,.0f} → {m['rss_fim_mb']:,.0f} MB (pico {m['pico_mb']:,.0f} MB), {m['por_sessao_mb']:.2f} MB por sessão")
+    if r['etapas_app_s']: print("⏱️ etapas do app: " + ", ".join(f"{e} {s:.1f}s" for e, s in r['etapas_app_s'].items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do site contra o backend falso")
+    parser.add_argument("--sessoes", type=int, default=20)
+    parser.add_argument("--leads", default="50k", help="tamanho da base sintética (ex.: 10k, 200k)")
+    parser.add_argument("--modo", default="local", choices=["local", "remoto", "uf"])
+    parser.add_argument("--latencia", default="rest=0.03,storage=0.1,mercadopago=0.3", help="ver fake_supabase.py")
+    parser.add_argument("--aprovar", type=float, default=5.0, help="segundos até o pagamento ser aprovado")
+    parser.add_argument("--pensar", type=float, default=0.5, help="pausa média entre interações (s)")
+    parser.add_argument("--rampa", type=float, default=5.0, help="segundos para todas as sessões começarem")
+    parser.add_argument("--espera-max", type=float, default=90.0, help="desiste da compra depois disso (s)")
+    parser.add_argument("--formatos", default="xlsx,csv,parquet", help="sorteados entre as sessões")
+    parser.add_argument("--porta", type=int, default=8599, help="porta do streamlit run")
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    args = parser.parse_args()
+    args.formatos = args.formatos.split(",")
+
+    resultado = rodar(args)
+    imprimir(resultado)
+    if args.saida:
+        with open(args.saida, "w") as f: json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"💾 {args.saida}")
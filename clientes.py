@@ -0,0 +1,61 @@
+import os
+import importlib.util
+
+# ==========================================
+# 🔌 CLIENTES HTTP (UM POR PROCESSO)
+# ==========================================
+# Supabase (PostgREST + Storage) e Mercado Pago com conexões persistentes num pool: o app guarda
+# cada cliente com st.cache_resource e os reruns deixam de abrir conexão (e TLS) nova. As
+# bibliotecas só são importadas aqui, quando o cliente é pedido pela primeira vez.
+
+HTTP_CONEXOES = int(os.getenv("HTTP_CONEXOES", 32))   # por cliente; cobre LEADS_WORKERS páginas em paralelo + sessões
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 120))  # uploads grandes no Storage usam o mesmo cliente
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", 120))
+MP_API_URL = os.getenv("MP_API_URL", "")  # outro endereço para a API do Mercado Pago (ex.: fake_supabase.py nos testes de carga)
+
+def criar_supabase(url, key, conexoes=HTTP_CONEXOES, timeout=HTTP_TIMEOUT):
+    """Cliente Supabase com um httpx.Client só (e o pool dele) para PostgREST e Storage."""
+    import httpx
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+
+    http = httpx.Client(
+        timeout=timeout,
+        follow_redirects=True,
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=conexoes, max_keepalive_connections=conexoes, keepalive_expiry=HTTP_KEEPALIVE),
+    )
+    return create_client(url, key, options=SyncClientOptions(httpx_client=http))
+
+def criar_mercado_pago(access_token, conexoes=HTTP_CONEXOES, timeout=30):
+    """SDK do Mercado Pago reaproveitando uma requests.Session (o HttpClient do SDK abre uma por chamada)."""
+    import mercadopago
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import Retry
+    from mercadopago.errors.exceptions import MPServerError
+    from mercadopago.http.http_client import DEFAULT_RETRY_ON, HttpClient
+
+    class HttpClientPersistente(HttpClient):
+        # Mesmo contrato do HttpClient do SDK ({"status", "response"}); os retries ficam no adapter
+        # da sessão (fixos, em vez de um por chamada), que como no SDK só repete métodos idempotentes
+        def __init__(self):
+            self.sessao = requests.Session()
+            retry = Retry(total=3, status_forcelist=DEFAULT_RETRY_ON, backoff_factor=0.3)
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=conexoes, max_retries=retry)
+            self.sessao.mount("https://", adapter)
+            self.sessao.mount("http://", adapter)
+
+        def request(self, method, url, maxretries=None, retry_on=None, backoff_factor=None, **kwargs):
+            if kwargs.get("timeout") is None: kwargs["timeout"] = timeout
+            if MP_API_URL: url = url.replace("https://api.mercadopago.com", MP_API_URL.rstrip("/"), 1)
+            resposta = self.sessao.request(method, url, **kwargs)
+            resultado = {"status": resposta.status_code, "response": None}
+            if resposta.status_code != 204 and resposta.content:
+                try:
+                    resultado["response"] = resposta.json()
+                except ValueError as e:
+                    raise MPServerError(resposta.status_code, {"message": "Invalid JSON in response body", "error": "invalid_response"}) from e
+            return resultado
+
+    return mercadopago.SDK(access_token, http_client=HttpClientPersistente())
@@ -0,0 +1,275 @@
+import io
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+from urllib.parse import parse_qsl, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from filtros import COLUNAS_FAIXA, COLUNAS_FILTRO, DIMENSOES_CUBO, CuboContagens, IndiceFiltros, normalizar_filtro
+from precos import calcular_preco
+
+# ==========================================
+# 🧮 COTAÇÃO EM LOTE (SEM PASSAR PELO SITE)
+# ==========================================
+# python cotacao.py specs.json [--csv]                                   (lista de filtros)
+# python cotacao.py --grade cidade,Segmento --filtro '{"estado": ["SP"]}'  (toda cidade × Segmento de SP)
+# python cotacao.py --servir [--porta 8765]                              (POST /cotacao)
+# Cada spec é um filtro no formato de filtros.py, com um "rotulo" opcional. A base vem do
+# Supabase como no site (LEADS_MODO, LEADS_SNAPSHOT_DIR...) ou de --arquivo com leads crus.
+
+CHAVES_SPEC = set(COLUNAS_FILTRO) | set(COLUNAS_FAIXA) | {"site", "nome", "rotulo"}
+COLUNAS_SAIDA = ["rotulo", "qtd", "nivel", "unitario", "total", "filtro"]
+MAX_COMBINACOES = 4096  # acima disso a spec soma as células do cubo direto
+
+def _numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+def validar_spec(spec):
+    """Filtro da spec (sem o rótulo) no formato de filtros.py; ValueError se alguma chave ou valor não servir."""
+    if not isinstance(spec, dict): raise ValueError(f"spec deve ser um objeto JSON: {spec!r}")
+    desconhecidas = set(spec) - CHAVES_SPEC
+    if desconhecidas: raise ValueError(f"chaves desconhecidas na spec: {', '.join(sorted(desconhecidas))}")
+    filtro = {k: v for k, v in spec.items() if k != "rotulo"}
+    if filtro.get("nome") is not None and not isinstance(filtro["nome"], str):
+        raise ValueError(f"nome deve ser texto: {filtro['nome']!r}")
+    if filtro.get("site") is not None and not isinstance(filtro["site"], bool):
+        raise ValueError(f"site deve ser true, false ou null: {filtro['site']!r}")
+    for col in COLUNAS_FILTRO:
+        valor = filtro.get(col)
+        if isinstance(valor, str): filtro[col] = valor = [valor]
+        if valor is not None and not (isinstance(valor, list) and all(isinstance(v, str) for v in valor)):
+            raise ValueError(f"{col} deve ser um texto ou uma lista de textos: {valor!r}")
+    for col in COLUNAS_FAIXA:
+        valor = filtro.get(col)
+        if valor is None: continue
+        # JSON traz a faixa como lista [min, max]; qualquer ponta pode ser null
+        if not (isinstance(valor, (list, tuple)) and len(valor) == 2 and all(v is None or _numero(v) for v in valor)):
+            raise ValueError(f"{col} deve ser [mínimo, máximo] com números ou null: {valor!r}")
+        filtro[col] = tuple(valor)
+    return filtro
+
+class Cotador:
+    """Conta e precifica muitas specs de uma vez sobre o cubo de contagens.
+
+    As células do cubo são somadas uma vez por conjunto de colunas usado nas specs
+    (ex.: estado+cidade+Segmento) num dicionário de chave composta; a partir daí cada spec
+    só categórica é uma soma de poucas consultas ao dicionário. Specs com nome ou faixa de
+    nota/avaliações vão para `contar(filtro)` (o índice de filtros no modo local, o
+    count do Supabase no remoto).
+    """
+
+    def __init__(self, cubo, contar=None):
+        self.cubo = cubo
+        self.contar = contar
+        self.grupos = {}  # colunas -> (multiplicador por coluna, {chave composta: qtd})
+        self._lock = threading.Lock()
+
+    def _grupo(self, colunas):
+        with self._lock:
+            if colunas in self.grupos: return self.grupos[colunas]
+        multiplicadores, chave, base = {}, np.zeros(len(self.cubo.contagem), dtype=np.int64), 1
+        for col in colunas:
+            multiplicadores[col] = base
+            chave += self.cubo.celulas[col].astype(np.int64) * base
+            base *= len(self.cubo.dimensoes[col]) + 1 if col != 'site' else 2
+            if base > 2 ** 62: return None  # chave composta não cabe em int64
+        somas = pd.Series(self.cubo.contagem).groupby(chave, sort=False).sum()
+        grupo = (multiplicadores, dict(zip(somas.index.tolist(), somas.tolist())))
+        with self._lock:
+            self.grupos[colunas] = grupo
+        return grupo
+
+    def quantidade(self, filtro):
+        if not self.cubo.atende(filtro):
+            if self.contar is None: raise ValueError("spec com nome ou faixa de nota/avaliações precisa da base (sem cubo só)")
+            return int(self.contar(filtro))
+        codigos = {}
+        for col in DIMENSOES_CUBO:
+            if not filtro.get(col): continue
+            lookup = self.cubo.lookup[col]
+            codigos[col] = sorted({lookup[v] for v in filtro[col] if v in lookup})
+            if not codigos[col]: return 0
+        if filtro.get('site') is not None: codigos['site'] = [int(bool(filtro['site']))]
+        if not codigos: return self.cubo.total()
+        if np.prod([len(c) for c in codigos.values()]) > MAX_COMBINACOES: return self.cubo.total(filtro)
+        grupo = self._grupo(tuple(codigos))
+        if grupo is None: return self.cubo.total(filtro)
+        multiplicadores, somas = grupo
+        return sum(somas.get(sum(c * multiplicadores[col] for col, c in zip(codigos, combo)), 0)
+                   for combo in itertools.product(*codigos.values()))
+
+    def cotar(self, specs):
+        """Uma linha por spec: rotulo, qtd, nivel, unitario, total e o filtro normalizado."""
+        resultado = []
+        for i, spec in enumerate(specs):
+            filtro = validar_spec(spec)
+            qtd = self.quantidade(filtro)
+            preco = calcular_preco(qtd)
+            resultado.append({"rotulo": spec.get("rotulo", str(i + 1)), "qtd": qtd, "nivel": preco["nivel"],
+                              "unitario": preco["unitario"], "total": round(preco["total"], 2),
+                              "filtro": normalizar_filtro(filtro)})
+        return resultado
+
+    def grade(self, colunas, filtro=None):
+        """Specs para cada combinação existente das colunas dentro do filtro (ex.: cidade × Segmento)."""
+        invalidas = [c for c in colunas if c not in DIMENSOES_CUBO]
+        if invalidas: raise ValueError(f"colunas fora do cubo: {', '.join(invalidas)} (use {', '.join(DIMENSOES_CUBO)})")
+        filtro = validar_spec(filtro or {})
+        specs = []
+        for valores, _ in self.cubo.combinacoes(list(colunas), filtro):
+            spec = {**filtro, **{col: [v] for col, v in zip(colunas, valores)}}
+            spec["rotulo"] = " / ".join(str(v) for v in valores)
+            specs.append(spec)
+        return specs
+
+def para_csv(linhas):
+    saida = io.StringIO()
+    escritor = csv.DictWriter(saida, fieldnames=COLUNAS_SAIDA)
+    escritor.writeheader()
+    for linha in linhas:
+        escritor.writerow({**linha, "filtro": json.dumps(linha["filtro"], ensure_ascii=False)})
+    return saida.getvalue()
+
+# ==========================================
+# 📥 ORIGEM DOS DADOS (A MESMA DO SITE)
+# ==========================================
+
+class FonteCotacao:
+    """Devolve o Cotador da versão atual da base, remontando cubo e índice só quando ela muda."""
+
+    def __init__(self, obter_base=None, remota=None):
+        self.obter_base = obter_base  # () -> (versao, DataFrame tratado)
+        self.remota = remota
+        self.versao = None
+        self.cotador = None
+        self._lock = threading.Lock()
+
+    def obter(self):
+        with self._lock:
+            if self.remota is not None:
+                _, cubo = self.remota.indices()
+                if self.cotador is None or self.cotador.cubo is not cubo: self.cotador = Cotador(cubo, self.remota.contar)
+                return self.cotador
+            versao, df = self.obter_base()
+            if versao != self.versao:
+                t0 = time.perf_counter()
+                indice = IndiceFiltros(df)
+                self.cotador = Cotador(CuboContagens(df), lambda filtro: len(indice.filtrar(filtro)))
+                self.versao = versao
+                print(f"🧮 Cubo e índice de {len(df):,} leads em {time.perf_counter() - t0:.1f}s")
+            return self.cotador
+
+def fonte_do_ambiente(arquivo=None):
+    """Mesma configuração do site (variáveis LEADS_*); `arquivo` = leads crus em parquet/csv, sem Supabase."""
+    from dados import BaseLeads, compactar_leads, tratar_leads
+    if arquivo:
+        df = pd.read_parquet(arquivo) if arquivo.endswith(".parquet") else pd.read_csv(arquivo, dtype=str)
+        df = compactar_leads(tratar_leads(df))
+        return FonteCotacao(lambda: (arquivo, df))
+    from clientes import criar_supabase
+    client = criar_supabase(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    tamanho_pagina, workers = int(os.getenv("LEADS_PAGE_SIZE", 1000)), int(os.getenv("LEADS_WORKERS", 8))
+    intervalo_delta = int(os.getenv("LEADS_DELTA_SECONDS", 300))
+    if os.getenv("LEADS_MODO", "local") == "remoto":
+        from remoto import BaseRemota
+        return FonteCotacao(remota=BaseRemota(client, tamanho_pagina=tamanho_pagina, max_workers=workers, intervalo_cubo=intervalo_delta))
+    base = BaseLeads(client, "leads", coluna_marca=os.getenv("LEADS_MARCA", "id"), tamanho_pagina=tamanho_pagina, max_workers=workers,
+                     pasta_snapshot=os.getenv("LEADS_SNAPSHOT_DIR", ".snapshots") or None, compactar=os.getenv("LEADS_COMPACTAR", "1") == "1")
+
+    def obter_base():
+        versao, _, df = base.obter(intervalo_delta=intervalo_delta, intervalo_total=86400)
+        return versao, df
+    return FonteCotacao(obter_base)
+
+# ==========================================
+# 🌐 ENDPOINT HTTP LOCAL
+# ==========================================
+# POST /cotacao  corpo: [spec, ...]  ou  {"specs": [...]}  ou  {"grade": ["cidade", "Segmento"], "filtro": {...}}
+# ?formato=csv devolve CSV em vez de JSON.
+
+class ManipuladorCotacao(BaseHTTPRequestHandler):
+    fonte = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo, tipo="application/json"):
+        dados = (corpo if isinstance(corpo, str) else json.dumps(corpo, ensure_ascii=False, default=str)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", f"{tipo}; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/cotacao": return self._responder(404, {"erro": "rota desconhecida (use POST /cotacao)"})
+        try:
+            corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"[]")
+            cotador = self.fonte.obter()
+            t0 = time.perf_counter()
+            if isinstance(corpo, dict) and corpo.get("grade"):
+                specs = cotador.grade(corpo["grade"], corpo.get("filtro"))
+            else:
+                specs = corpo.get("specs", []) if isinstance(corpo, dict) else corpo
+            linhas = cotador.cotar(specs)
+        except (ValueError, TypeError) as e:
+            return self._responder(400, {"erro": str(e)})
+        print(f"🧮 {len(linhas):,} specs em {time.perf_counter() - t0:.3f}s")
+        if dict(parse_qsl(url.query)).get("formato") == "csv": return self._responder(200, para_csv(linhas), "text/csv")
+        self._responder(200, linhas)
+
+def servir(fonte, host="127.0.0.1", porta=8765):
+    """Sobe o endpoint numa thread e devolve (servidor, url)."""
+    manipulador = type("Manipulador", (ManipuladorCotacao,), {"fonte": fonte})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="cotacao", daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cotação em lote de fatias da base de leads")
+    parser.add_argument("specs", nargs="?", help="arquivo JSON com a lista de specs (- para stdin)")
+    parser.add_argument("--grade", help="colunas para combinar, ex.: cidade,Segmento")
+    parser.add_argument("--filtro", default="{}", help="filtro JSON aplicado à grade")
+    parser.add_argument("--csv", action="store_true", help="saída em CSV em vez de JSON")
+    parser.add_argument("--saida", help="arquivo de saída (padrão: stdout)")
+    parser.add_argument("--arquivo", help="leads crus em parquet/csv em vez do Supabase")
+    parser.add_argument("--servir", action="store_true", help="sobe o endpoint HTTP local")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    args = parser.parse_args()
+
+    fonte = fonte_do_ambiente(args.arquivo)
+    if args.servir:
+        fonte.obter()  # carrega antes do primeiro pedido
+        servidor, url = servir(fonte, args.host, args.porta)
+        print(f"🧮 Cotação em {url}/cotacao (Ctrl+C para sair)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            servidor.shutdown()
+        sys.exit()
+
+    cotador = fonte.obter()
+    if args.grade:
+        specs = cotador.grade([c.strip() for c in args.grade.split(",")], json.loads(args.filtro))
+    elif args.specs:
+        specs = json.load(sys.stdin if args.specs == "-" else open(args.specs, encoding="utf-8"))
+    else:
+        parser.error("informe um arquivo de specs, --grade ou --servir")
+    t0 = time.perf_counter()
+    linhas = cotador.cotar(specs)
+    print(f"🧮 {len(linhas):,} specs em {time.perf_counter() - t0:.3f}s", file=sys.stderr)
+    texto = para_csv(linhas) if args.csv else json.dumps(linhas, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8", newline="") as f: f.write(texto)
+    else:
+        sys.stdout.write(texto + ("" if args.csv else "\n"))
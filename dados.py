@@ -0,0 +1,422 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from metricas import span
+
+# ==========================================
+# 🧠 TRATAMENTO
+# ==========================================
+
+def normalizar_categoria(cat_google):
+    if not cat_google: return "Outros"
+    cat = str(cat_google).lower()
+    if any(x in cat for x in ['natural', 'suplemento', 'academia', 'fit']): return "Saúde & Fitness"
+    if any(x in cat for x in ['restaurante', 'pizzaria', 'hamburgueria', 'lanchonete', 'padaria']): return "Alimentação"
+    if any(x in cat for x in ['médic', 'clinica', 'saúde', 'hospital', 'dentista']): return "Clínicas & Saúde"
+    if any(x in cat for x in ['oficina', 'mecânic', 'auto', 'carro']): return "Automotivo"
+    if any(x in cat for x in ['advoga', 'jurídic', 'lei', 'contabilidade']): return "Jurídico & Escritórios"
+    if any(x in cat for x in ['loja', 'varejo', 'comércio', 'moda']): return "Varejo & Comércio"
+    if any(x in cat for x in ['imobili', 'construtor', 'engenharia']): return "Construção & Imóveis"
+    return "Outros"
+
+def classificar_telefone_global(tel):
+    if not tel: return "Outro"
+    nums = "".join(filter(str.isdigit, str(tel)))
+    if nums.startswith("55"):
+        if len(nums) > 2 and nums[2] == '0': return "Outro"
+        if len(nums) == 13 and nums[4] == '9': return "Celular"
+        elif len(nums) == 12: return "Fixo"
+    else:
+        if nums.startswith("0"): return "Outro"
+        if len(nums) == 11 and nums[2] == '9': return "Celular"
+        elif len(nums) == 10: return "Fixo"
+    return "Outro"
+
+def classificar_categorias(serie):
+    """normalizar_categoria vetorizado: classifica cada categoria distinta uma vez só."""
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    segmentos = np.array([normalizar_categoria(c) for c in unicos], dtype=object)
+    return pd.Series(segmentos[codigos] if len(unicos) else [], index=serie.index, dtype=object)
+
+TIPOS_CONTATO = np.array(["Outro", "Celular", "Fixo"], dtype=object)
+
+def classificar_telefones(serie, max_chars=32):
+    """classificar_telefone_global vetorizado (mesmo resultado, sem apply por linha).
+
+    Os textos viram uma matriz de bytes (linhas x caracteres) e os dígitos são contados e
+    localizados com NumPy. Textos não-ASCII (str.isdigit aceita outros dígitos Unicode) ou
+    mais longos que `max_chars` caem na função original.
+    """
+    texto = serie.to_numpy(dtype=object)
+    if pd.api.types.infer_dtype(texto, skipna=False) != "string":
+        texto = np.array([str(t) for t in texto], dtype=object)
+    tam_txt = np.fromiter(map(len, texto), dtype=np.int64, count=len(texto))
+    comum = np.fromiter(map(str.isascii, texto), dtype=bool, count=len(texto)) & (tam_txt <= max_chars)
+    codigos = np.zeros(len(texto), dtype=np.int8)
+
+    if comum.any():
+        b = texto[comum].astype(f"S{max(1, tam_txt[comum].max())}")
+        m = b.view(np.uint8).reshape(len(b), b.dtype.itemsize)
+        dig = (m >= ord('0')) & (m <= ord('9'))
+        ordem = np.cumsum(dig, axis=1, dtype=np.uint8)
+        tam = ordem[:, -1]
+        # Só os dígitos, alinhados à esquerda (equivale ao "".join(filter(str.isdigit, ...)))
+        nums = np.zeros((len(b), 5), dtype=np.uint8)
+        lin, col = np.nonzero(dig & (ordem <= 5))
+        nums[lin, ordem[lin, col] - 1] = m[lin, col]
+        d0, d1, d2, d4 = nums[:, 0], nums[:, 1], nums[:, 2], nums[:, 4]
+
+        com_55 = (d0 == ord('5')) & (d1 == ord('5'))
+        com_0 = d0 == ord('0')
+        celular = np.where(com_55, (d2 != ord('0')) & (tam == 13) & (d4 == ord('9')), ~com_0 & (tam == 11) & (d2 == ord('9')))
+        fixo = np.where(com_55, (d2 != ord('0')) & (tam == 12), ~com_0 & (tam == 10))
+        codigos[comum] = np.where(celular, 1, np.where(fixo, 2, 0))
+
+    tipos = TIPOS_CONTATO[codigos]
+    if not comum.all():
+        tipos[~comum] = [classificar_telefone_global(t) for t in serie[~comum]]
+    return pd.Series(tipos, index=serie.index, dtype=object)
+
+def tratar_leads(df):
+    if not df.empty:
+        df['nota'] = pd.to_numeric(df['nota'].astype(str).str.replace(',', '.'), errors='coerce').fillna(0)
+        
+        if 'avaliacoes' in df.columns:
+            df['avaliacoes'] = pd.to_numeric(df['avaliacoes'].astype(str).str.replace('.', '', regex=False), errors='coerce').fillna(0).astype(int)
+        else:
+            df['avaliacoes'] = 0
+            
+        df['bairro'] = df['bairro'].fillna('Não informado')
+        df['estado'] = df['estado'].fillna('N/A')
+        if 'categoria_google' not in df.columns: df['categoria_google'] = 'Outros'
+        df['categoria_google'] = df['categoria_google'].fillna('Não identificada')
+        
+        df['Segmento'] = classificar_categorias(df['categoria_google'])
+        df['tipo_contato'] = classificar_telefones(df['telefone'])
+        
+        if 'data_extracao' in df.columns:
+            df['data_obj'] = pd.to_datetime(df['data_extracao'], errors='coerce')
+            df['data_fmt'] = df['data_obj'].dt.strftime('%d/%m/%Y').fillna(datetime.today().strftime('%d/%m/%Y'))
+        else:
+            df['data_fmt'] = datetime.today().strftime('%d/%m/%Y')
+        
+        df = df[df['tipo_contato'].isin(['Celular', 'Fixo'])]
+        
+    return df
+
+COLUNAS_CATEGORICAS = ['estado', 'cidade', 'bairro', 'categoria_google', 'Segmento', 'tipo_contato', 'data_fmt']
+
+def memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def compactar_leads(df):
+    """Colunas de baixa cardinalidade viram category e avaliacoes vira o menor inteiro possível.
+
+    A `nota` continua float64: em float32 um 4.1 vira 4.0999999 na planilha exportada.
+    """
+    if df.empty: return df
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    if 'avaliacoes' in df.columns:
+        df['avaliacoes'] = pd.to_numeric(df['avaliacoes'], downcast='integer')
+    return df
+
+def anexar_leads(df, novos):
+    """df + linhas novas já tratadas, sem recompactar a base inteira.
+
+    As categorias de `df` ganham só os valores que faltam e as linhas novas entram com os mesmos
+    tipos, então o concat continua category; `df` não é alterado (outras sessões ainda leem ele).
+    """
+    if df.empty: return compactar_leads(novos.reset_index(drop=True))
+    base, novos = df.copy(deep=False), novos.copy(deep=False)
+    for col in base.columns:
+        if col not in novos.columns: continue
+        tipo = base[col].dtype
+        if isinstance(tipo, pd.CategoricalDtype):
+            faltam = pd.Index(novos[col].dropna().unique()).difference(tipo.categories)
+            if len(faltam): base[col] = base[col].cat.add_categories(faltam)
+            novos[col] = novos[col].astype(base[col].dtype)
+        elif col == 'avaliacoes':
+            novos[col] = pd.to_numeric(novos[col], downcast='integer')  # o concat promove se não couber
+    return pd.concat([base, novos], ignore_index=True)
+
+# ==========================================
+# 📥 CARREGAMENTO DA BASE (SUPABASE)
+# ==========================================
+
+def contar_linhas(client, tabela="leads", preparar=None):
+    query = client.table(tabela).select("*", count="exact")
+    if preparar: query = preparar(query)
+    res = query.limit(1).execute()
+    return res.count or 0
+
+def baixar_pagina(client, tabela, inicio, fim, ordem="id", tentativas=3, espera=0.5, preparar=None):
+    # O PostgREST corta a resposta no max-rows do servidor, então repete até completar o intervalo
+    # `preparar(query)` acrescenta filtros à consulta (modo remoto)
+    linhas = []
+    while inicio <= fim:
+        for tentativa in range(tentativas):
+            try:
+                query = client.table(tabela).select("*")
+                if preparar: query = preparar(query)
+                if ordem: query = query.order(ordem)
+                lote = query.range(inicio, fim).execute().data
+                break
+            except Exception:
+                if tentativa == tentativas - 1: raise
+                time.sleep(espera * 2 ** tentativa)
+        if not lote: break
+        linhas.extend(lote)
+        inicio += len(lote)
+    return linhas
+
+def paginas_tabela(client, tabela="leads", tamanho_pagina=1000, max_workers=8, ordem="id", tentativas=3, preparar=None,
+                   total=None):
+    """Gera as páginas em ordem, à medida que chegam: no máximo 2×`max_workers` páginas baixadas à frente
+    do consumidor. `total` evita a contagem se o chamador já souber quantas linhas esperar."""
+    if total is None: total = contar_linhas(client, tabela, preparar)
+    intervalos = [(i, min(i + tamanho_pagina, total) - 1) for i in range(0, total, tamanho_pagina)]
+    baixadas = 0
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        pendentes = deque()
+        for inicio, fim in intervalos:
+            pendentes.append(pool.submit(baixar_pagina, client, tabela, inicio, fim, ordem, tentativas, preparar=preparar))
+            if len(pendentes) >= 2 * max(1, max_workers):
+                pagina = pendentes.popleft().result()
+                baixadas += len(pagina)
+                yield pagina
+        while pendentes:
+            pagina = pendentes.popleft().result()
+            baixadas += len(pagina)
+            yield pagina
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)  # consumidor parou no meio (ou uma página falhou)
+
+    # Linhas inseridas depois da contagem: segue sequencialmente até a página vir incompleta
+    while True:
+        extra = baixar_pagina(client, tabela, baixadas, baixadas + tamanho_pagina - 1, ordem, tentativas, preparar=preparar)
+        if extra: yield extra
+        baixadas += len(extra)
+        if len(extra) < tamanho_pagina: break
+
+def baixar_tabela(client, tabela="leads", tamanho_pagina=1000, max_workers=8, ordem="id", tentativas=3, preparar=None):
+    """Conta as linhas primeiro e baixa as páginas em paralelo, mantendo a ordem."""
+    t0 = time.perf_counter()
+    all_rows, paginas = [], 0
+    for pagina in paginas_tabela(client, tabela, tamanho_pagina, max_workers, ordem, tentativas, preparar):
+        all_rows.extend(pagina)
+        paginas += 1
+
+    segundos = time.perf_counter() - t0
+    print(f"📥 {tabela}: {len(all_rows):,} linhas em {segundos:.1f}s "
+          f"({len(all_rows) / max(segundos, 1e-9):,.0f} linhas/s, {paginas} páginas, {max_workers} workers)")
+    return all_rows
+
+def baixar_novos(client, tabela, coluna, marca, tamanho_pagina=1000):
+    """Baixa só as linhas com `coluna` acima da marca d'água (delta desde a última carga)."""
+    all_rows = []
+    while True:
+        # id desempata quando `coluna` não é única (data_extracao), para as páginas não se sobreporem
+        query = client.table(tabela).select("*").gt(coluna, marca).order(coluna)
+        if coluna != "id": query = query.order("id")
+        res = query.range(len(all_rows), len(all_rows) + tamanho_pagina - 1).execute()
+        all_rows.extend(res.data)
+        if len(res.data) < tamanho_pagina: break
+    return all_rows
+
+# ==========================================
+# 💾 SNAPSHOT EM DISCO (ARROW IPC)
+# ==========================================
+
+# Sobe quando o formato das colunas tratadas muda, invalidando snapshots antigos
+FORMATO_SNAPSHOT = 1
+
+def caminho_snapshot(pasta, tabela="leads"):
+    return os.path.join(pasta, f"{tabela}.v{FORMATO_SNAPSHOT}.arrow")
+
+def salvar_snapshot(df, pasta, tabela="leads", marca=None, gerado_em=None):
+    """Grava a base tratada em Arrow IPC sem compressão, pronta para memory-map."""
+    import pyarrow as pa
+
+    os.makedirs(pasta, exist_ok=True)
+    destino = caminho_snapshot(pasta, tabela)
+    meta = {"formato": FORMATO_SNAPSHOT, "gerado_em": gerado_em or time.time(), "marca": marca, "linhas": len(df)}
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"diskleads": json.dumps(meta).encode()})
+
+    # Escreve num temporário e troca atômico: processos com o arquivo antigo mapeado não são afetados
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, destino)
+    return meta
+
+def carregar_snapshot(pasta, tabela="leads", idade_max=86400):
+    """Abre o snapshot via memory-map. Retorna (df, meta) ou (None, None) se faltar ou estiver velho."""
+    destino = caminho_snapshot(pasta, tabela)
+    if not os.path.exists(destino): return None, None
+    import pyarrow as pa
+
+    with pa.memory_map(destino, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    meta = json.loads((table.schema.metadata or {}).get(b"diskleads", b"{}"))
+    if meta.get("formato") != FORMATO_SNAPSHOT or time.time() - meta.get("gerado_em", 0) >= idade_max:
+        return None, None
+    # split_blocks evita consolidar colunas numéricas: elas continuam apontando para as páginas mapeadas
+    return table.to_pandas(split_blocks=True), meta
+
+# ==========================================
+# 🔄 BASE EM MEMÓRIA COM ATUALIZAÇÃO INCREMENTAL
+# ==========================================
+
+class BaseLeads:
+    """Mantém a base tratada em memória e aplica só o delta de linhas novas.
+
+    A marca d'água é o maior valor de `coluna_marca` (id ou data_extracao) já visto nas
+    linhas brutas, antes do filtro de telefone, para não baixar de novo linhas descartadas.
+    Uma recarga completa periódica continua pegando linhas editadas ou removidas.
+    Com `pasta_snapshot`, um processo novo parte do snapshot em disco (e aplica o delta
+    a partir da marca gravada nele) em vez de baixar a tabela inteira.
+    Só a primeira carga bloqueia quem pede a base: delta e recarga completa rodam numa thread
+    e a base nova entra de uma vez (df, marca e versão juntos) quando fica pronta.
+    """
+
+    def __init__(self, client, tabela="leads", coluna_marca="id", tamanho_pagina=1000, max_workers=8, pasta_snapshot=None,
+                 compactar=True):
+        self.client = client
+        self.tabela = tabela
+        self.coluna_marca = coluna_marca
+        self.tamanho_pagina = tamanho_pagina
+        self.max_workers = max_workers
+        self.pasta_snapshot = pasta_snapshot
+        self.compactar = compactar
+        self.df = None
+        self.marca = None
+        self.versao = 0
+        self.ultima_carga = 0.0
+        self.ultimo_delta = 0.0
+        self._lock = threading.RLock()  # a primeira carga troca a base com o lock de obter() já tomado
+        self._atualizando = None  # thread do delta / recarga em andamento
+        self.ultimo_erro = 0.0
+        self.espera_erro = 60.0  # depois de uma atualização falhar, espera isto antes de tentar de novo
+
+    def _marca_de(self, rows, marca):
+        valores = [r[self.coluna_marca] for r in rows if r.get(self.coluna_marca) is not None]
+        if not valores: return marca
+        return max(valores) if marca is None else max(marca, max(valores))
+
+    @property
+    def id_versao(self):
+        """Identifica o conteúdo da base entre processos: carga completa de origem + delta aplicado."""
+        return f"{int(self.ultima_carga * 1000)}-{self.marca}-{0 if self.df is None else len(self.df)}"
+
+    def _compactado(self, df):
+        if not self.compactar: return df
+        antes = memoria_mb(df)
+        df = compactar_leads(df)
+        print(f"🗜️ {self.tabela}: memória {antes:,.1f} MB → {memoria_mb(df):,.1f} MB")
+        return df
+
+    def carregar(self):
+        with span("supabase_paginacao", tabela=self.tabela) as s:
+            # Pagina sempre por id (único): por data_extracao, linhas com a mesma data podiam trocar de
+            # página entre as requisições e sair duplicadas ou faltando. A marca só usa coluna_marca.
+            all_rows = baixar_tabela(self.client, self.tabela, tamanho_pagina=self.tamanho_pagina,
+                                     max_workers=self.max_workers, ordem="id")
+            s["linhas"] = len(all_rows)
+        marca = self._marca_de(all_rows, None)
+        with span("tratamento", tabela=self.tabela) as s:
+            df = self._compactado(tratar_leads(pd.DataFrame(all_rows)))
+            s["linhas"] = len(df)
+        carga = time.time()
+        with self._lock:
+            self.df, self.marca = df, marca
+            self.versao += 1
+            self.ultima_carga = self.ultimo_delta = carga
+        if self.pasta_snapshot and not df.empty:
+            try:
+                salvar_snapshot(df, self.pasta_snapshot, self.tabela, marca, gerado_em=carga)
+            except Exception as e:
+                print(f"Erro ao gravar snapshot: {e}")
+
+    def carregar_do_snapshot(self, idade_max=86400):
+        try:
+            with span("carga_snapshot", tabela=self.tabela):
+                df, meta = carregar_snapshot(self.pasta_snapshot, self.tabela, idade_max)
+        except Exception as e:
+            print(f"Erro ao ler snapshot: {e}")
+            return False
+        if df is None: return False
+        self.df = self._compactado(df)
+        self.marca = meta.get("marca")
+        self.versao += 1
+        # A idade conta a partir da geração do snapshot; o delta roda já na próxima chamada
+        self.ultima_carga = meta["gerado_em"]
+        self.ultimo_delta = 0.0
+        print(f"💾 {self.tabela}: {len(df):,} linhas do snapshot (marca {self.coluna_marca}={self.marca})")
+        return True
+
+    def atualizar_delta(self):
+        # Trabalha sobre a base servida agora; só a troca no fim segura o lock
+        df, marca = self.df, self.marca
+        if marca is None: return  # sem coluna de marca: fica só a recarga completa
+        with span("supabase_delta", tabela=self.tabela) as s:
+            novos = baixar_novos(self.client, self.tabela, self.coluna_marca, marca, self.tamanho_pagina)
+            s["linhas"] = len(novos)
+        self.ultimo_delta = time.time()
+        if not novos: return
+        marca = self._marca_de(novos, marca)
+        with span("tratamento_delta", tabela=self.tabela) as s:
+            df_novos = tratar_leads(pd.DataFrame(novos))
+            if not df_novos.empty:
+                # Sem recompactar a base: as categorias crescem só com os valores das linhas novas
+                df = anexar_leads(df, df_novos) if self.compactar else pd.concat([df, df_novos], ignore_index=True)
+            s["linhas"] = len(df_novos)
+        with self._lock:
+            if not df_novos.empty:
+                self.df = df
+                self.versao += 1
+            self.marca = marca
+        print(f"🔄 {self.tabela}: +{len(df_novos):,} leads novos (marca {self.coluna_marca}={self.marca})")
+
+    def _em_segundo_plano(self, tarefa):
+        # Chamar com o lock; uma atualização por vez, e nada de tentar de novo a cada rerun depois de uma falha
+        if self._atualizando is not None and self._atualizando.is_alive(): return
+        if time.time() - self.ultimo_erro < self.espera_erro: return
+
+        def rodar():
+            try:
+                tarefa()
+            except Exception as e:
+                print(f"Erro ao atualizar {self.tabela}: {e}")
+                self.ultimo_erro = time.time()
+        self._atualizando = threading.Thread(target=rodar, name=f"atualizar-{self.tabela}", daemon=True)
+        self._atualizando.start()
+
+    def aguardar(self, timeout=None):
+        """Espera a atualização em segundo plano terminar (testes, benchmark)."""
+        thread = self._atualizando
+        if thread is not None: thread.join(timeout)
+
+    def obter(self, intervalo_delta=300, intervalo_total=86400):
+        """(versao, id_versao, df) lidos juntos sob o lock: a troca pela base nova pode acontecer logo depois."""
+        with self._lock:
+            if self.df is None and self.pasta_snapshot:
+                self.carregar_do_snapshot(intervalo_total)
+            agora = time.time()
+            if self.df is None:
+                self.carregar()
+            elif agora - self.ultima_carga >= intervalo_total:
+                self._em_segundo_plano(self.carregar)
+            elif intervalo_delta and agora - self.ultimo_delta >= intervalo_delta:
+                self._em_segundo_plano(self.atualizar_delta)
+            return self.versao, self.id_versao, self.df
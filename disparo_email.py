@@ -1,76 +1,348 @@
+import os
 import time
+import queue
+import socket
 import smtplib
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from supabase import create_client
+from metricas import configurar, span
 
 # --- CONFIGURAÇÕES ---
 SUPABASE_URL = "https://wsqebbwjmiwiscbkmawy.supabase.co"
 SUPABASE_KEY = "sb_publishable_FJ5VPfb8xD197JkISbCNOQ_hoGNC6U9" # Use a Service Role para o robô ter poder total
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 EMAIL_REMNETENTE = "suporte.diskleads@gmail.com"
 SENHA_APP = "mkry hsfu hxna upqp" # Aquela de 16 dígitos
 
-def enviar_email_venda(destinatario, link_arquivo, ref):
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = f"DiskLeads <{EMAIL_REMNETENTE}>"
-        msg['To'] = destinatario
-        msg['Subject'] = f"🚀 Seus Leads Chegaram! (Ref: {ref})"
-
-        corpo = f"""
-        <html>
-            <body>
-                <h2>Pagamento Confirmado!</h2>
-                <p>Olá! Seu pedido foi processado com sucesso.</p>
-                <p><strong>Referência:</strong> {ref}</p>
-                <p>Clique no botão abaixo para baixar sua lista de leads em Excel:</p>
-                <a href="{link_arquivo}" style="background-color: #2ecc71; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">BAIXAR LEADS AGORA</a>
-                <br><br>
-                <p>Obrigado por escolher o DiskLeads!</p>
-            </body>
-        </html>
-        """
-        msg.attach(MIMEText(corpo, 'html'))
-
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(EMAIL_REMNETENTE, SENHA_APP)
-            server.sendmail(EMAIL_REMNETENTE, destinatario, msg.as_string())
-        return True
-    except Exception as e:
-        print(f"Erro ao enviar email: {e}")
-        return False
-
-print("🤖 Robô DiskLeads iniciado e monitorando vendas...")
-
-while True:
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+SMTP_SSL = os.getenv("SMTP_SSL", "1") == "1"          # 0 para servidor local de teste (aiosmtpd)
+SMTP_LOGIN = os.getenv("SMTP_LOGIN", "1") == "1"
+EMAIL_CONEXOES = int(os.getenv("EMAIL_CONEXOES", 3))   # conexões autenticadas mantidas abertas
+EMAIL_POR_MINUTO = int(os.getenv("EMAIL_POR_MINUTO", 60))  # 0 = sem limite
+
+# Vários robôs podem rodar juntos: cada um reserva um lote com prazo (lease) antes de enviar.
+# Colunas e aviso usados (rodar uma vez no SQL do Supabase):
+#   alter table vendas add column claimed_by text, add column claimed_until timestamptz, add column pago_em timestamptz,
+#     add column arquivo text, add column alerta text;
+#   create function avisar_venda() returns trigger language plpgsql as
+#     $$ begin perform pg_notify('vendas', new.external_reference); return new; end $$;
+#   create trigger vendas_aviso after insert or update of status, url_arquivo on vendas
+#     for each row execute function avisar_venda();
+#   create function marcar_pago_em() returns trigger language plpgsql as
+#     $$ begin new.pago_em = now(); return new; end $$;
+#   create trigger vendas_pago_em before update of status on vendas
+#     for each row when (new.status = 'pago' and old.status is distinct from 'pago') execute function marcar_pago_em();
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+EMAIL_LOTE = int(os.getenv("EMAIL_LOTE", 20))
+EMAIL_LEASE = int(os.getenv("EMAIL_LEASE", 120))       # segundos até a reserva expirar e outro robô pegar
+ESPERA_MIN = float(os.getenv("ESPERA_MIN", 1))
+ESPERA_MAX = float(os.getenv("ESPERA_MAX", 15))
+DATABASE_URL = os.getenv("DATABASE_URL")              # opcional: acorda no LISTEN vendas (precisa de psycopg)
+SEM_ARQUIVO_MIN = int(os.getenv("SEM_ARQUIVO_MIN", 10))  # minutos até uma venda paga sem url_arquivo ser tratada
+VARREDURA_SEG = int(os.getenv("VARREDURA_SEG", 60))    # intervalo entre as varreduras dessas vendas
+BUCKET_PEDIDOS = "leads_pedidos"
+
+def montar_mensagem(destinatario, link_arquivo, ref):
+    msg = MIMEMultipart()
+    msg['From'] = f"DiskLeads <{EMAIL_REMNETENTE}>"
+    msg['To'] = destinatario
+    msg['Subject'] = f"🚀 Seus Leads Chegaram! (Ref: {ref})"
+
+    corpo = f"""
+    <html>
+        <body>
+            <h2>Pagamento Confirmado!</h2>
+            <p>Olá! Seu pedido foi processado com sucesso.</p>
+            <p><strong>Referência:</strong> {ref}</p>
+            <p>Clique no botão abaixo para baixar sua lista de leads:</p>
+            <a href="{link_arquivo}" style="background-color: #2ecc71; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">BAIXAR LEADS AGORA</a>
+            <br><br>
+            <p>Obrigado por escolher o DiskLeads!</p>
+        </body>
+    </html>
+    """
+    msg.attach(MIMEText(corpo, 'html'))
+    return msg
+
+# ==========================================
+# 📮 ENVIO: POOL DE CONEXÕES + LIMITE DE TAXA
+# ==========================================
+
+class LimiteTaxa:
+    """Espaça os envios para no máximo `por_minuto` mensagens por minuto (entre todas as threads)."""
+
+    def __init__(self, por_minuto):
+        self.intervalo = 60.0 / por_minuto if por_minuto else 0.0
+        self.proximo = 0.0
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        with self._lock:
+            agora = time.monotonic()
+            vez = max(agora, self.proximo)
+            self.proximo = vez + self.intervalo
+        if vez > agora: time.sleep(vez - agora)
+
+def conexao_caiu(erro):
+    # SMTPException herda de OSError: só desconexão/falha ao conectar ou erro de rede puro contam como queda
+    if isinstance(erro, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)): return True
+    return isinstance(erro, OSError) and not isinstance(erro, smtplib.SMTPException)
+
+class PoolSMTP:
+    """Mantém até `tamanho` conexões SMTP autenticadas e reaproveita entre os envios.
+
+    Conexão que falhar é descartada e o envio é repetido uma vez em conexão nova.
+    """
+
+    def __init__(self, host, porta, usuario=None, senha=None, ssl=True, tamanho=3, timeout=30):
+        self.host, self.porta, self.usuario, self.senha = host, porta, usuario, senha
+        self.ssl = ssl
+        self.timeout = timeout
+        self.livres = queue.LifoQueue()
+        self.vagas = threading.Semaphore(tamanho)
+        self.conexoes_abertas = 0
+
+    def _conectar(self):
+        classe = smtplib.SMTP_SSL if self.ssl else smtplib.SMTP
+        server = classe(self.host, self.porta, timeout=self.timeout)
+        if self.usuario: server.login(self.usuario, self.senha)
+        self.conexoes_abertas += 1
+        return server
+
+    def _descartar(self, server):
+        try: server.quit()
+        except Exception: pass
+
+    def enviar(self, remetente, destinatario, mensagem):
+        with self.vagas:
+            try: server = self.livres.get_nowait()
+            except queue.Empty: server = None
+            for tentativa in range(2):
+                try:
+                    if server is None: server = self._conectar()
+                    server.sendmail(remetente, destinatario, mensagem)
+                    self.livres.put(server)
+                    return
+                except Exception as e:
+                    if not conexao_caiu(e):
+                        # Recusa do servidor (destinatário inválido, mensagem rejeitada, login...): não adianta repetir
+                        if server is not None: self.livres.put(server)
+                        raise
+                    # Servidor derrubou a conexão ociosa (ou rede caiu): reconecta e tenta de novo
+                    if server is not None: self._descartar(server)
+                    server = None
+                    if tentativa: raise
+
+    def fechar(self):
+        while True:
+            try: self._descartar(self.livres.get_nowait())
+            except queue.Empty: return
+
+class Disparador:
+    """Envia os e-mails num pool de threads, com limite por minuto e latência registrada por mensagem."""
+
+    def __init__(self, pool, remetente, max_workers=3, por_minuto=60):
+        self.pool = pool
+        self.remetente = remetente
+        self.limite = LimiteTaxa(por_minuto)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="smtp")
+        self.latencias = deque(maxlen=1000)  # (ref, segundos no SMTP)
+        self.latencias_pagamento = deque(maxlen=1000)  # (ref, segundos entre pagamento e e-mail)
+
+    def _enviar(self, destinatario, link_arquivo, ref):
+        mensagem = montar_mensagem(destinatario, link_arquivo, ref).as_string()
+        self.limite.esperar()
+        t0 = time.perf_counter()
+        with span("smtp_envio"):
+            self.pool.enviar(self.remetente, destinatario, mensagem)
+        latencia = time.perf_counter() - t0
+        self.latencias.append((ref, latencia))
+        return latencia
+
+    def enviar(self, destinatario, link_arquivo, ref):
+        return self.executor.submit(self._enviar, destinatario, link_arquivo, ref)
+
+    @staticmethod
+    def _percentis(amostras):
+        tempos = sorted(t for _, t in amostras if t is not None)
+        if not tempos: return None
+        return {"p50": round(tempos[len(tempos) // 2], 3),
+                "p95": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3), "max": round(tempos[-1], 3)}
+
+    def resumo(self):
+        return {"enviados": len(self.latencias), "smtp": self._percentis(self.latencias),
+                "pagamento_email": self._percentis(self.latencias_pagamento)}
+
+    def fechar(self):
+        self.executor.shutdown(wait=True)
+        self.pool.fechar()
+
+def criar_disparador():
+    pool = PoolSMTP(SMTP_HOST, SMTP_PORT, EMAIL_REMNETENTE if SMTP_LOGIN else None, SENHA_APP,
+                    ssl=SMTP_SSL, tamanho=EMAIL_CONEXOES)
+    return Disparador(pool, EMAIL_REMNETENTE, max_workers=EMAIL_CONEXOES, por_minuto=EMAIL_POR_MINUTO)
+
+# ==========================================
+# 🤖 LOOP DO ROBÔ
+# ==========================================
+
+def agora_iso(segundos=0):
+    return (datetime.now(timezone.utc) + timedelta(seconds=segundos)).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def _pendentes(consulta, agora):
+    # Vendas PAGAS, ainda NÃO ENVIADAS, com o arquivo já gerado pelo site e sem reserva válida
+    return consulta.eq("status", "pago")\
+        .eq("enviado", False)\
+        .not_.is_("url_arquivo", "null")\
+        .or_(f"claimed_until.is.null,claimed_until.lt.{agora}")
+
+def reservar_lote(supabase, worker=WORKER_ID, lote=EMAIL_LOTE, lease=EMAIL_LEASE):
+    """Reserva até `lote` vendas pendentes para este robô e devolve só as que ele ganhou.
+
+    O UPDATE repete as condições de pendência: se dois robôs disputarem a mesma venda,
+    o Postgres reavalia o WHERE depois do lock da linha e só um deles a recebe de volta.
+    """
+    agora = agora_iso()
+    with span("vendas_pendentes") as s:
+        res = _pendentes(supabase.table("vendas").select("id"), agora).order("id").limit(lote).execute()
+        s["linhas"] = len(res.data)
+    ids = [v['id'] for v in res.data]
+    if not ids: return []
+    with span("vendas_reservar") as s:
+        res = _pendentes(supabase.table("vendas").update({"claimed_by": worker, "claimed_until": agora_iso(lease)}), agora)\
+            .in_("id", ids).execute()
+        s["linhas"] = len(res.data)
+    return res.data
+
+def latencia_pagamento(venda):
+    """Segundos entre o pagamento (pago_em, ou created_at se não houver) e agora; None se não der para ler."""
+    marco = venda.get('pago_em') or venda.get('created_at')
+    if not marco: return None
     try:
-        # Busca vendas que estão PAGAS mas ainda NÃO FORAM ENVIADAS
-        res = supabase.table("vendas")\
-            .select("*")\
-            .eq("status", "pago")\
-            .eq("enviado", False).execute()
-
-        vendas_pendentes = res.data
-
-        for venda in vendas_pendentes:
-            print(f"📧 Enviando e-mail para: {venda['email_cliente']} (Ref: {venda['external_reference']})")
-            
-            sucesso = enviar_email_venda(
-                venda['email_cliente'], 
-                venda['url_arquivo'], 
-                venda['external_reference']
-            )
-
-            if sucesso:
-                # Marca como enviado para não mandar duas vezes
-                supabase.table("vendas")\
-                    .update({"enviado": True})\
-                    .eq("id", venda['id']).execute()
-                print(f"✅ Sucesso!")
-
-    except Exception as e:
-        print(f"Erro no loop do robô: {e}")
-
-    time.sleep(15) # Checa a cada 15 segundos
\ No newline at end of file
+        quando = datetime.fromisoformat(str(marco).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    # created_at sem fuso (coluna timestamp) vem em UTC no Supabase
+    if quando.tzinfo is None: quando = quando.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - quando).total_seconds()
+
+def recuperar_sem_arquivo(supabase, minutos=SEM_ARQUIVO_MIN, lote=EMAIL_LOTE, bucket=BUCKET_PEDIDOS):
+    """Vendas pagas, não enviadas e sem url_arquivo há mais de `minutos` (a tarefa do site falhou ou nem rodou).
+
+    Se a cópia em `vendas.arquivo` já está no Storage (só a gravação da URL falhou), grava a URL e a venda
+    entra no próximo lote; senão marca `alerta = 'sem_arquivo'` para alguém gerar o arquivo à mão.
+    Devolve quantas foram recuperadas.
+    """
+    with span("vendas_sem_arquivo") as s:
+        res = supabase.table("vendas").select("id, external_reference, arquivo")\
+            .eq("status", "pago").eq("enviado", False)\
+            .is_("url_arquivo", "null").is_("alerta", "null")\
+            .lt("created_at", agora_iso(-60 * minutos)).order("id").limit(lote).execute()
+        s["linhas"] = len(res.data)
+        recuperadas = sem_arquivo = 0
+        for venda in res.data:
+            pasta, _, nome = (venda.get('arquivo') or "").rpartition("/")
+            publicado = nome and any(obj.get('name') == nome for obj in supabase.storage.from_(bucket).list(pasta, {"search": nome}))
+            if publicado:
+                supabase.table("vendas").update({"url_arquivo": supabase.storage.from_(bucket).get_public_url(venda['arquivo'])})\
+                    .eq("id", venda['id']).is_("url_arquivo", "null").execute()
+                recuperadas += 1
+                print(f"♻️ URL recuperada do Storage (Ref: {venda['external_reference']})")
+            else:
+                supabase.table("vendas").update({"alerta": "sem_arquivo"}).eq("id", venda['id']).execute()
+                sem_arquivo += 1
+                print(f"🚨 Venda paga sem arquivo há mais de {minutos} min (Ref: {venda['external_reference']}): gerar à mão")
+        s.update(recuperadas=recuperadas, sem_arquivo=sem_arquivo)
+    return recuperadas
+
+def processar_pendentes(supabase, disparador, worker=WORKER_ID):
+    vendas = reservar_lote(supabase, worker)
+
+    envios = {}
+    for venda in vendas:
+        print(f"📧 Enviando e-mail para: {venda['email_cliente']} (Ref: {venda['external_reference']})")
+        envios[disparador.enviar(venda['email_cliente'], venda['url_arquivo'], venda['external_reference'])] = venda
+
+    for futuro in as_completed(envios):
+        venda = envios[futuro]
+        try:
+            latencia = futuro.result()
+        except Exception as e:
+            # A reserva expira sozinha e a venda volta para a fila depois de EMAIL_LEASE segundos
+            print(f"Erro ao enviar email (Ref: {venda['external_reference']}): {e}")
+            continue
+        # Marca como enviado para não mandar duas vezes (só se a reserva ainda é nossa)
+        with span("vendas_marcar_enviado"):
+            supabase.table("vendas")\
+                .update({"enviado": True, "claimed_until": None})\
+                .eq("id", venda['id']).eq("claimed_by", worker).execute()
+        total = latencia_pagamento(venda)
+        disparador.latencias_pagamento.append((venda['external_reference'], total))
+        print(f"✅ Sucesso! (SMTP {latencia:.2f}s" + (f", pagamento→e-mail {total:.1f}s)" if total is not None else ")"))
+    return len(envios)
+
+class Despertador:
+    """Espera até `timeout` ou até o Postgres avisar (NOTIFY vendas) que alguma venda mudou.
+
+    Sem DATABASE_URL ou sem psycopg instalado, vira uma espera simples.
+    """
+
+    def __init__(self, database_url=None, canal="vendas"):
+        self.evento = threading.Event()
+        self.ativo = False
+        if not database_url: return
+        try:
+            import psycopg
+        except ImportError:
+            print("⚠️ psycopg não instalado: usando só a espera adaptativa.")
+            return
+        self.ativo = True
+        threading.Thread(target=self._ouvir, args=(psycopg, database_url, canal), name="listen-vendas", daemon=True).start()
+
+    def _ouvir(self, psycopg, database_url, canal):
+        while True:
+            try:
+                with psycopg.connect(database_url, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {canal}")
+                    print(f"👂 Ouvindo avisos do canal '{canal}'")
+                    for _ in conn.notifies():
+                        self.evento.set()
+            except Exception as e:
+                print(f"Erro no LISTEN: {e}")
+                time.sleep(5)
+
+    def esperar(self, timeout):
+        acordou = self.evento.wait(timeout)
+        self.evento.clear()
+        return acordou
+
+if __name__ == "__main__":
+    from clientes import criar_supabase
+    configurar("disparo_email")
+    supabase = criar_supabase(SUPABASE_URL, SUPABASE_KEY)
+    disparador = criar_disparador()
+    despertador = Despertador(DATABASE_URL)
+    print(f"🤖 Robô DiskLeads ({WORKER_ID}) iniciado e monitorando vendas...")
+
+    espera = ESPERA_MIN
+    varredura = 0.0
+    while True:
+        try:
+            if time.monotonic() - varredura >= VARREDURA_SEG:
+                varredura = time.monotonic()
+                recuperar_sem_arquivo(supabase)
+            if processar_pendentes(supabase, disparador):
+                print(f"📊 Latência: {disparador.resumo()}")
+                espera = ESPERA_MIN
+                continue  # pode haver mais que um lote na fila
+        except Exception as e:
+            print(f"Erro no loop do robô: {e}")
+
+        # Sem trabalho: espera cada vez mais (até ESPERA_MAX), ou acorda no aviso do banco
+        if despertador.esperar(espera): espera = ESPERA_MIN
+        else: espera = min(espera * 2, ESPERA_MAX)
@@ -0,0 +1,339 @@
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from filtros import Selecao, normalizar_filtro
+from metricas import span
+
+# ==========================================
+# 📦 EXPORTAÇÃO DA LISTA DE LEADS
+# ==========================================
+
+# (coluna no arquivo, coluna na base); o link do WhatsApp é calculado
+COLUNAS_EXPORT = [
+    ('Empresa', 'nome'),
+    ('Telefone', 'telefone'),
+    ('Tipo de Telefone', 'tipo_contato'),
+    ('Link WhatsApp', None),
+    ('Atualizado em', 'data_fmt'),
+    ('Setor Principal', 'Segmento'),
+    ('Nicho Específico', 'categoria_google'),
+    ('Nota Google', 'nota'),
+    ('Qtd Avaliações', 'avaliacoes'),
+    ('Endereço Completo', 'endereco_completo'),
+    ('Bairro', 'bairro'),
+    ('Cidade', 'cidade'),
+    ('UF', 'estado'),
+    ('Site', 'site'),
+]
+
+FORMATOS = {
+    "xlsx": {"rotulo": "Excel (.xlsx)", "extensao": "xlsx", "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "csv.gz": {"rotulo": "CSV compactado (.csv.gz)", "extensao": "csv.gz", "mime": "application/gzip"},
+    "parquet": {"rotulo": "Parquet", "extensao": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+# Limite do Excel de hyperlinks por planilha
+LIMITE_URLS_XLSX = 65530
+
+def apenas_digitos(serie):
+    """Equivale a "".join(filter(str.isdigit, str(x))) por linha, vetorizado para textos ASCII."""
+    texto = pd.Series([str(t) for t in serie], index=serie.index, dtype=object)
+    ascii_ok = texto.map(str.isascii).to_numpy(dtype=bool)
+    nums = texto.str.replace(r'[^0-9]', '', regex=True).astype(object)
+    if not ascii_ok.all():
+        nums[~ascii_ok] = ["".join(filter(str.isdigit, t)) for t in texto[~ascii_ok]]
+    return nums
+
+def links_whatsapp(telefone, tipo_contato):
+    links = np.full(len(telefone), "", dtype=object)
+    celular = (tipo_contato.astype(object) == "Celular").to_numpy()
+    if celular.any():
+        nums = apenas_digitos(telefone[celular])
+        nums = nums.where(nums.str.startswith("55"), "55" + nums)
+        links[celular] = ("https://wa.me/" + nums).to_numpy()
+    return pd.Series(links, index=telefone.index, dtype=object)
+
+def montar_bloco(df):
+    """DataFrame com as colunas do arquivo, só para as linhas do bloco."""
+    bloco = {}
+    for nome, col in COLUNAS_EXPORT:
+        if col is None:
+            bloco[nome] = links_whatsapp(df['telefone'], df['tipo_contato'])
+        elif col in df.columns:
+            serie = df[col]
+            bloco[nome] = serie.astype(object) if isinstance(serie.dtype, pd.CategoricalDtype) else serie
+        else:
+            bloco[nome] = pd.Series(None, index=df.index, dtype=object)
+    return pd.DataFrame(bloco)
+
+def mascarar_telefone(tel):
+    return str(tel)[:-4] + "****" if tel and len(str(tel)) > 4 else "****"
+
+def montar_preview(df, n=50):
+    """Amostra exibida antes da compra, com o final do telefone escondido (só as `n` primeiras linhas)."""
+    df = df.head(n)
+    return pd.DataFrame({
+        'Empresa': df['nome'],
+        'Telefone': [mascarar_telefone(t) for t in df['telefone']],
+        'Tipo': df['tipo_contato'],
+        'Setor': df['Segmento'],
+        'Nicho': df['categoria_google'],
+        'Cidade': df['cidade'],
+        'Nota': df['nota'],
+        'Avaliações': df['avaliacoes'],
+        'Atualizado em': df['data_fmt'],
+    }, index=df.index)
+
+def blocos(selecao, tamanho_bloco, progresso=None):
+    # Só o bloco da vez é copiado da base (ou baixado, no modo remoto). O progresso conta as linhas
+    # escritas: no modo remoto o total é uma contagem e a tabela pode ter mudado desde então
+    total, feitas = len(selecao), 0
+    for linhas in selecao.blocos(tamanho_bloco):
+        yield montar_bloco(linhas)
+        feitas += len(linhas)
+        if progresso: progresso(min(feitas / total, 1.0) if total else 1.0)
+
+def escrever_xlsx(selecao, destino, tamanho_bloco, progresso=None):
+    import xlsxwriter
+
+    qtd_urls = selecao.qtd_igual('tipo_contato', "Celular") + (selecao.qtd_preenchidos('site') if 'site' in selecao.df.columns else 0)
+    # constant_memory grava cada linha direto no XML temporário; acima do limite de URLs os links viram texto
+    wb = xlsxwriter.Workbook(destino, {'constant_memory': True, 'strings_to_urls': qtd_urls <= LIMITE_URLS_XLSX})
+    ws = wb.add_worksheet('Leads')
+    ws.set_column('A:A', 30)
+    ws.set_column('D:D', 25)
+    ws.write_row(0, 0, [nome for nome, _ in COLUNAS_EXPORT], wb.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}))
+    linha = 1
+    for bloco in blocos(selecao, tamanho_bloco, progresso):
+        valores = bloco.astype(object).where(bloco.notna(), None).to_numpy().tolist()
+        for valores_linha in valores:
+            ws.write_row(linha, 0, valores_linha)
+            linha += 1
+    wb.close()
+
+def escrever_csv_gz(selecao, destino, tamanho_bloco, progresso=None):
+    with gzip.open(destino, 'wt', compresslevel=6, encoding='utf-8-sig', newline='') as f:
+        for i, bloco in enumerate(blocos(selecao, tamanho_bloco, progresso)):
+            bloco.to_csv(f, index=False, header=(i == 0))
+
+def escrever_parquet(selecao, destino, tamanho_bloco, progresso=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipos = {'Nota Google': pa.float64(), 'Qtd Avaliações': pa.int64()}
+    schema = pa.schema([(nome, tipos.get(nome, pa.string())) for nome, _ in COLUNAS_EXPORT])
+    with pq.ParquetWriter(destino, schema) as writer:
+        for bloco in blocos(selecao, tamanho_bloco, progresso):
+            arrays = []
+            for campo in schema:
+                serie = bloco[campo.name]
+                try:
+                    arrays.append(pa.array(serie, type=campo.type, from_pandas=True))
+                except (pa.ArrowTypeError, pa.ArrowInvalid):  # ex.: telefone salvo como número
+                    arrays.append(pa.array([None if pd.isna(v) else str(v) for v in serie], type=campo.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+ESCRITORES = {"xlsx": escrever_xlsx, "csv.gz": escrever_csv_gz, "parquet": escrever_parquet}
+
+def exportar(df, destino, formato="xlsx", tamanho_bloco=50_000, progresso=None):
+    """Escreve os leads (DataFrame, Selecao ou remoto.SelecaoRemota) em `destino` (caminho ou arquivo
+    binário) bloco a bloco.
+
+    `progresso(fracao)` é chamado ao fim de cada bloco.
+    """
+    ESCRITORES[formato](Selecao(df) if isinstance(df, pd.DataFrame) else df, destino, tamanho_bloco, progresso)
+
+def exportar_para_arquivo(df, formato="xlsx", tamanho_bloco=50_000, progresso=None):
+    """Gera o arquivo num temporário em disco e devolve o caminho (o chamador apaga)."""
+    fd, caminho = tempfile.mkstemp(suffix=f".{FORMATOS[formato]['extensao']}")
+    os.close(fd)
+    try:
+        exportar(df, caminho, formato, tamanho_bloco, progresso)
+    except Exception:
+        os.remove(caminho)
+        raise
+    return caminho
+
+# ==========================================
+# 🗃️ CACHE DE EXPORTAÇÕES (POR CONTEÚDO)
+# ==========================================
+
+# Sobe quando o layout do arquivo muda, para não servir exportações antigas
+LAYOUT_EXPORT = 1
+
+def chave_exportacao(filtro, versao_dados, formato):
+    """Hash do filtro normalizado + versão da base + formato: mesma fatia, mesmo arquivo."""
+    conteudo = json.dumps({"filtro": normalizar_filtro(filtro), "versao": versao_dados, "formato": formato,
+                           "layout": LAYOUT_EXPORT}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()[:32]
+
+class CacheExportacoes:
+    """Arquivos gerados guardados em disco por chave, com LRU limitado por tamanho.
+
+    `publicados` guarda as chaves que já estão no Storage, para uma compra repetida só
+    referenciar o arquivo existente em vez de subir outra cópia. Arquivos em uso (`usar`)
+    ficam fixados e só são despejados depois de soltos.
+    """
+
+    def __init__(self, pasta, limite_mb=500):
+        self.pasta = pasta
+        self.limite = limite_mb * 1024 ** 2
+        self.arquivos = OrderedDict()  # chave -> (caminho, bytes), do menos para o mais recente
+        self.em_uso = Counter()        # chave -> leitores com o arquivo aberto (ou prestes a abrir)
+        self.publicados = set()
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._gerando = {}
+        os.makedirs(pasta, exist_ok=True)
+        # Reaproveita o que sobrou de execuções anteriores, na ordem de uso (mtime)
+        for entrada in sorted(os.scandir(pasta), key=lambda e: e.stat().st_mtime):
+            if entrada.is_file() and not entrada.name.endswith(".tmp"):
+                self.arquivos[entrada.name.split(".", 1)[0]] = (entrada.path, entrada.stat().st_size)
+        self._despejar()
+
+    def _despejar(self, manter=None):
+        # Do menos para o mais recente, pulando os fixados e `manter` (recém-gerado); chamar com o lock
+        usado = sum(t for _, t in self.arquivos.values())
+        for chave in list(self.arquivos):
+            if usado <= self.limite: break
+            if self.em_uso[chave] or chave == manter: continue
+            caminho, tamanho = self.arquivos.pop(chave)
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            usado -= tamanho
+            self.evictions += 1
+
+    def obter(self, chave, fixar=False):
+        with self._lock:
+            item = self.arquivos.get(chave)
+            if item and os.path.exists(item[0]):
+                self.arquivos.move_to_end(chave)
+                os.utime(item[0])
+                self.hits += 1
+                if fixar: self.em_uso[chave] += 1
+                return item[0]
+            self.arquivos.pop(chave, None)
+            return None
+
+    def guardar(self, chave, caminho_tmp, extensao, fixar=False):
+        destino = os.path.join(self.pasta, f"{chave}.{extensao}")
+        shutil.move(caminho_tmp, destino)
+        with self._lock:
+            self.arquivos[chave] = (destino, os.path.getsize(destino))
+            self.arquivos.move_to_end(chave)
+            if fixar: self.em_uso[chave] += 1
+            self._despejar(manter=chave)
+        return destino
+
+    def gerar(self, chave, extensao, gerar_arquivo, fixar=False):
+        """Caminho do arquivo da chave; chama `gerar_arquivo()` (que devolve um temporário) só no miss.
+
+        Com `fixar=True` o arquivo não é despejado até `soltar(chave)`.
+        """
+        caminho = self.obter(chave, fixar)
+        if caminho: return caminho
+        with self._lock:
+            lock_chave = self._gerando.setdefault(chave, threading.Lock())
+        with lock_chave:  # duas sessões pedindo a mesma fatia geram uma vez só
+            caminho = self.obter(chave, fixar)
+            if caminho: return caminho
+            with self._lock:
+                self.misses += 1
+            caminho = self.guardar(chave, gerar_arquivo(), extensao, fixar)
+            print(f"📦 exportação {chave[:8]} gerada ({self.resumo()})")
+        with self._lock:
+            self._gerando.pop(chave, None)
+        return caminho
+
+    def soltar(self, chave):
+        with self._lock:
+            self.em_uso[chave] -= 1
+            if self.em_uso[chave] <= 0: del self.em_uso[chave]
+            self._despejar()  # o que passou do limite enquanto estava fixado sai agora
+
+    @contextmanager
+    def usar(self, chave, extensao, gerar_arquivo):
+        """Como `gerar`, mas o arquivo fica fixado (não é despejado) dentro do bloco `with`."""
+        caminho = self.gerar(chave, extensao, gerar_arquivo, fixar=True)
+        try:
+            yield caminho
+        finally:
+            self.soltar(chave)
+
+    def resumo(self):
+        usado = sum(t for _, t in self.arquivos.values()) / 1024 ** 2
+        return f"{len(self.arquivos)} arquivos, {usado:,.1f} MB, {self.hits} hits / {self.misses} misses, {self.evictions} despejos"
+
+# ==========================================
+# ⏳ FILA DE EXPORTAÇÕES EM SEGUNDO PLANO
+# ==========================================
+
+class FilaExportacoes:
+    """Roda geração + upload de arquivos num pool de threads fora do rerun do Streamlit.
+
+    Cada tarefa recebe um id; o estado ("na fila", "gerando", "enviando", "repetindo",
+    "concluido", "erro") e o progresso (0 a 1) ficam em `tarefas` para a sessão consultar.
+    "erro" só depois da última tentativa. Threads e não processos porque a base já está na
+    memória deste processo.
+    """
+
+    def __init__(self, max_workers=2, tentativas=3, espera=2.0):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exportacao")
+        self.tentativas = tentativas
+        self.espera = espera
+        self.tarefas = {}
+        self._lock = threading.Lock()
+
+    def _atualizar(self, tarefa_id, **campos):
+        with self._lock:
+            self.tarefas[tarefa_id].update(campos)
+
+    def _rodar(self, tarefa_id, funcao, contexto):
+        def progresso(fracao, estado=None):
+            self._atualizar(tarefa_id, progresso=fracao, **({"estado": estado} if estado else {}))
+
+        for tentativa in range(self.tentativas):
+            try:
+                self._atualizar(tarefa_id, estado="gerando", inicio=time.time(), erro=None)
+                # Cada tentativa vira um span: as falhas ficam no log JSON (com a mensagem) e no contador de erros
+                with span("exportacao_tarefa") as s:
+                    s.update(contexto, tarefa=tarefa_id, tentativa=tentativa + 1)
+                    resultado = funcao(progresso)
+                self._atualizar(tarefa_id, estado="concluido", progresso=1.0, resultado=resultado, fim=time.time())
+                return resultado
+            except Exception as e:
+                print(f"Erro na exportação {tarefa_id} {contexto} (tentativa {tentativa + 1}): {e}")
+                if tentativa == self.tentativas - 1:
+                    self._atualizar(tarefa_id, estado="erro", erro=str(e), fim=time.time())
+                    return None
+                self._atualizar(tarefa_id, estado="repetindo", erro=str(e))
+                time.sleep(self.espera * 2 ** tentativa)
+
+    def enviar(self, funcao, **contexto):
+        """Agenda `funcao(progresso)` e devolve o id da tarefa; `contexto` (ex.: ref_venda) vai para o log."""
+        tarefa_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            # Esquece tarefas terminadas há mais de uma hora
+            limite = time.time() - 3600
+            for antiga in [t for t, d in self.tarefas.items() if d.get("fim", d["criada"]) < limite and d["estado"] in ("concluido", "erro")]:
+                del self.tarefas[antiga]
+            self.tarefas[tarefa_id] = {"estado": "na fila", "progresso": 0.0, "criada": time.time()}
+        self.pool.submit(self._rodar, tarefa_id, funcao, contexto)
+        return tarefa_id
+
+    def estado(self, tarefa_id):
+        with self._lock:
+            return dict(self.tarefas.get(tarefa_id, {"estado": "desconhecida", "progresso": 0.0}))
@@ -0,0 +1,455 @@
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import default as politica_email
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+# ==========================================
+# 🧪 SUPABASE FALSO (POSTGREST EM MEMÓRIA)
+# ==========================================
+# Servidor HTTP local com o subconjunto do PostgREST que o app e os robôs usam, para rodar
+# o modo remoto e os scripts sem rede: select/insert/upsert/update, filtros eq/neq/gt/gte/lt/
+# lte/in/is/like/ilike (com not. e or=), order, offset/limit e Prefer: count=exact. Views
+# materializadas só mudam no refresh, chamado por RPC (POST /rest/v1/rpc/atualizar_cubo).
+# Também responde pelo Storage (upload, list, URL pública) e pelo Mercado Pago
+# (POST /checkout/preferences); a preferência criada vira venda 'pago' depois de --aprovar
+# segundos, como faria o webhook. --latencia atrasa cada resposta (por serviço, se quiser).
+# Uso: python fake_supabase.py [porta] [tabela=arquivo.parquet|.csv|.json ...] [--latencia rest=0.03,mercadopago=0.4]
+#      e aponte SUPABASE_URL (e MP_API_URL) para http://127.0.0.1:<porta> (qualquer chave serve).
+
+SERVICOS = ("rest", "storage", "mercadopago")
+
+def _dividir(texto, sep=","):
+    """Divide respeitando aspas e parênteses: 'a.in.(1,2),b.eq.3' -> ['a.in.(1,2)', 'b.eq.3']."""
+    partes, atual, nivel, aspas, escape = [], "", 0, False, False
+    for ch in texto:
+        if escape: atual += ch; escape = False; continue
+        if ch == "\\": atual += ch; escape = True; continue
+        if ch == '"': aspas = not aspas
+        elif not aspas and ch == "(": nivel += 1
+        elif not aspas and ch == ")": nivel -= 1
+        elif not aspas and nivel == 0 and ch == sep:
+            partes.append(atual); atual = ""; continue
+        atual += ch
+    partes.append(atual)
+    return partes
+
+def _valor_literal(texto):
+    texto = texto.strip()
+    if len(texto) >= 2 and texto[0] == texto[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', texto[1:-1])
+    return texto
+
+def _converter(texto, referencia):
+    """Texto da URL no tipo do valor da linha, para comparar como o Postgres compararia."""
+    if isinstance(referencia, bool): return texto.lower() == "true"
+    if isinstance(referencia, int): return float(texto)
+    if isinstance(referencia, float): return float(texto)
+    return texto
+
+def _padrao_like(padrao, ignorar_caixa):
+    regex, escape = "", False
+    for ch in padrao:
+        if escape: regex += re.escape(ch); escape = False
+        elif ch == "\\": escape = True
+        elif ch in "%*": regex += ".*"
+        elif ch == "_": regex += "."
+        else: regex += re.escape(ch)
+    return re.compile(regex, re.DOTALL | (re.IGNORECASE if ignorar_caixa else 0))
+
+def _comparar(op, valor, arg):
+    if op == "is":
+        return {"null": valor is None, "true": valor is True, "false": valor is False}[arg.lower()]
+    if valor is None: return False  # no SQL, comparação com NULL nunca é verdadeira
+    if op == "in":
+        opcoes = [_valor_literal(v) for v in _dividir(arg.strip()[1:-1])] if arg.strip() != "()" else []
+        return any(valor == _converter(o, valor) for o in opcoes)
+    if op in ("like", "ilike"):
+        return bool(_padrao_like(arg, op == "ilike").fullmatch(str(valor)))
+    arg = _converter(_valor_literal(arg), valor)
+    return {"eq": valor == arg, "neq": valor != arg, "gt": valor > arg, "gte": valor >= arg,
+            "lt": valor < arg, "lte": valor <= arg}[op]
+
+def _condicao(coluna, expressao):
+    """Predicado de um parâmetro PostgREST (coluna=gte.4, coluna=not.is.null, or=(a.eq.1,b.lt.2))."""
+    if coluna in ("or", "and", "not.or", "not.and"):
+        negar, junta = coluna.startswith("not."), any if coluna.endswith("or") else all
+        filhos = [_condicao_texto(p) for p in _dividir(expressao.strip()[1:-1])]
+        return lambda linha: junta(f(linha) for f in filhos) != negar
+    negar = expressao.startswith("not.")
+    if negar: expressao = expressao[4:]
+    op, _, arg = expressao.partition(".")
+    return lambda linha: _comparar(op, linha.get(coluna), arg) != negar
+
+def _condicao_texto(texto):
+    # Dentro de or=(...): 'coluna.op.valor', 'coluna.not.op.valor' ou 'or(...)' / 'not.and(...)'
+    texto = texto.strip()
+    for logico in ("or", "and", "not.or", "not.and"):
+        if texto.startswith(logico + "("): return _condicao(logico, texto[len(logico):])
+    coluna, _, expressao = texto.partition(".")
+    return _condicao(coluna, expressao)
+
+def _ordenar(linhas, ordem):
+    for termo in reversed(_dividir(ordem)):
+        partes = termo.strip().split(".")
+        coluna, desc = partes[0], "desc" in partes[1:]
+        nulos_primeiro = "nullsfirst" in partes[1:] or (desc and "nullslast" not in partes[1:])
+        com_valor = sorted((l for l in linhas if l.get(coluna) is not None), key=lambda l: l[coluna], reverse=desc)
+        nulos = [l for l in linhas if l.get(coluna) is None]
+        linhas = nulos + com_valor if nulos_primeiro else com_valor + nulos
+    return linhas
+
+class BancoFalso:
+    """Tabelas em memória (listas de dicts) e views calculadas a partir delas (a cada leitura, ou
+    guardadas até o refresh, se materializadas)."""
+
+    RESERVADOS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+    # RPC -> view materializada que ela atualiza (as do remoto.py)
+    FUNCOES = {"atualizar_cubo": "leads_cubo"}
+
+    def __init__(self, tabelas=None, views=None, materializadas=None):
+        self.tabelas = {nome: list(linhas) for nome, linhas in (tabelas or {}).items()}
+        self.views = dict(views or {})
+        self.materializadas = dict(materializadas or {})  # nome -> cálculo
+        self.proximo_id = {}
+        self.versao = 0  # sobe a cada escrita; invalida as consultas guardadas
+        self.consultas = {}  # (tabela, parâmetros sem offset/limit) -> (versao, linhas filtradas e ordenadas)
+        self.arquivos = {}  # (bucket, caminho) -> (bytes, content-type)
+        self.preferencias = {}  # id -> preferência do Mercado Pago
+        self.requisicoes = Counter()  # "serviço rota" -> requisições atendidas
+        self._lock = threading.Lock()
+        for nome in self.materializadas: self.atualizar_materializada(nome)
+
+    def atualizar_materializada(self, nome):
+        linhas = self.materializadas[nome](self)
+        with self._lock:
+            self.versao += 1
+            self.tabelas[nome] = linhas
+
+    def chamar(self, funcao):
+        """RPC; False se a função não existir. Com a view comum (não materializada) o refresh não faz nada."""
+        if funcao not in self.FUNCOES: return False
+        if self.FUNCOES[funcao] in self.materializadas: self.atualizar_materializada(self.FUNCOES[funcao])
+        return True
+
+    def contar(self, rota):
+        with self._lock:
+            self.requisicoes[rota] += 1
+
+    def linhas(self, nome):
+        if nome in self.views: return self.views[nome](self)
+        return self.tabelas.setdefault(nome, [])
+
+    def _filtros(self, params):
+        return [_condicao(c, v) for c, v in params if c not in self.RESERVADOS]
+
+    def selecionar(self, nome, params):
+        """(linhas da página, total antes de offset/limit, início)."""
+        p = dict(params)
+        # A paginação repete a mesma consulta mudando só offset/limit: filtra e ordena uma vez por versão
+        chave = (nome, tuple((c, v) for c, v in params if c not in ("offset", "limit", "select")))
+        with self._lock:
+            guardada = self.consultas.get(chave)
+            if guardada and guardada[0] == self.versao:
+                linhas = guardada[1]
+            else:
+                filtros = self._filtros(params)
+                linhas = [l for l in self.linhas(nome) if all(f(l) for f in filtros)]
+                if p.get("order"): linhas = _ordenar(linhas, p["order"])
+                if len(self.consultas) > 256: self.consultas.clear()
+                self.consultas[chave] = (self.versao, linhas)
+        total = len(linhas)
+        inicio = int(p.get("offset", 0))
+        fim = inicio + int(p["limit"]) if "limit" in p else None
+        linhas = linhas[inicio:fim]
+        colunas = p.get("select", "*")
+        if colunas != "*":
+            nomes = [c.strip().strip('"') for c in _dividir(colunas)]
+            linhas = [{c: l.get(c) for c in nomes} for l in linhas]
+        return [dict(l) for l in linhas], total, inicio
+
+    def inserir(self, nome, registros, chave=None):
+        """Insere; com `chave` (upsert) atualiza a linha que já tiver o mesmo valor."""
+        with self._lock:
+            self.versao += 1
+            tabela = self.tabelas.setdefault(nome, [])
+            indice = {tuple(l.get(c) for c in chave): l for l in tabela} if chave else {}
+            saida = []
+            for reg in registros:
+                existente = indice.get(tuple(reg.get(c) for c in chave)) if chave else None
+                if existente is not None:
+                    existente.update(reg)
+                    saida.append(dict(existente))
+                    continue
+                linha = dict(reg)
+                if "id" not in linha:
+                    if nome not in self.proximo_id:
+                        self.proximo_id[nome] = max([0] + [l.get("id") or 0 for l in tabela])
+                    self.proximo_id[nome] += 1
+                    linha["id"] = self.proximo_id[nome]
+                tabela.append(linha)
+                if chave: indice[tuple(linha.get(c) for c in chave)] = linha
+                saida.append(dict(linha))
+        return saida
+
+    def atualizar(self, nome, params, valores):
+        filtros = self._filtros(params)
+        with self._lock:
+            self.versao += 1
+            alvo = [l for l in self.tabelas.get(nome, []) if all(f(l) for f in filtros)]
+            for l in alvo: l.update(valores)
+            return [dict(l) for l in alvo]
+
+    def apagar(self, nome, params):
+        filtros = self._filtros(params)
+        with self._lock:
+            self.versao += 1
+            tabela = self.tabelas.get(nome, [])
+            removidas = [l for l in tabela if all(f(l) for f in filtros)]
+            self.tabelas[nome] = [l for l in tabela if not all(f(l) for f in filtros)]
+            return removidas
+
+    # --- Storage ---
+
+    def guardar_arquivo(self, bucket, caminho, dados, tipo, sobrescrever=True):
+        """False se o arquivo já existe e não é para sobrescrever (o Storage responde 409)."""
+        with self._lock:
+            if not sobrescrever and (bucket, caminho) in self.arquivos: return False
+            self.arquivos[(bucket, caminho)] = (dados, tipo)
+            return True
+
+    def listar_arquivos(self, bucket, prefixo="", busca=""):
+        prefixo = prefixo.strip("/") + "/" if prefixo.strip("/") else ""
+        with self._lock:
+            itens = [(c, d) for (b, c), (d, _) in self.arquivos.items() if b == bucket and c.startswith(prefixo)]
+        nomes = [(c[len(prefixo):], d) for c, d in itens]
+        return [{"name": nome, "id": nome, "metadata": {"size": len(d)}}
+                for nome, d in sorted(nomes) if "/" not in nome and busca.lower() in nome.lower()]
+
+    # --- Mercado Pago ---
+
+    def criar_preferencia(self, dados, base_url, aprovar_em=None):
+        preferencia = dict(dados, id=f"{random.randint(10 ** 8, 10 ** 9)}-{uuid.uuid4()}", date_created=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        preferencia["init_point"] = preferencia["sandbox_init_point"] = f"{base_url}/checkout/v1/redirect?pref_id={preferencia['id']}"
+        with self._lock:
+            self.preferencias[preferencia["id"]] = preferencia
+        if aprovar_em is not None and preferencia.get("external_reference"):
+            aprovacao = threading.Timer(aprovar_em, self.aprovar, [preferencia["external_reference"]])
+            aprovacao.daemon = True
+            aprovacao.start()
+        return preferencia
+
+    def aprovar(self, ref):
+        """O que o webhook do Mercado Pago faz com a venda quando o pagamento é aprovado (pago_em é o
+        que o trigger vendas_pago_em do disparo_email.py grava)."""
+        pago_em = datetime.now(timezone.utc).isoformat()
+        return self.atualizar("vendas", [("external_reference", f"eq.{ref}"), ("status", "neq.pago")],
+                              {"status": "pago", "pago_em": pago_em})
+
+def view_cubo(origem="leads_tratados"):
+    """Equivalente em memória da view leads_cubo do modo remoto (remoto.py)."""
+    dims = ['estado', 'cidade', 'bairro', 'Segmento', 'categoria_google', 'tipo_contato']
+
+    def calcular(banco):
+        grupos = {}
+        for l in banco.tabelas.get(origem, []):
+            chave = tuple(l.get(d) for d in dims) + (l.get('site') is not None,)
+            g = grupos.get(chave)
+            if g is None:
+                grupos[chave] = g = dict(zip(dims + ['tem_site'], chave), qtd=0, nota_min=l.get('nota'), nota_max=l.get('nota'),
+                                         avaliacoes_min=l.get('avaliacoes'), avaliacoes_max=l.get('avaliacoes'))
+            g['qtd'] += 1
+            for col in ('nota', 'avaliacoes'):
+                v = l.get(col)
+                if v is None: continue
+                g[f'{col}_min'] = v if g[f'{col}_min'] is None else min(g[f'{col}_min'], v)
+                g[f'{col}_max'] = v if g[f'{col}_max'] is None else max(g[f'{col}_max'], v)
+        return list(grupos.values())
+    return calcular
+
+def ler_latencias(texto):
+    """'0.05' (todos os serviços) ou 'rest=0.03,storage=0.1,mercadopago=0.4' -> {serviço: segundos}."""
+    if not texto: return {}
+    if "=" not in texto: return {servico: float(texto) for servico in SERVICOS}
+    latencias = {}
+    for item in texto.split(","):
+        servico, _, segundos = item.partition("=")
+        if servico.strip() not in SERVICOS: raise ValueError(f"serviço desconhecido: {servico} (use {', '.join(SERVICOS)})")
+        latencias[servico.strip()] = float(segundos)
+    return latencias
+
+def _arquivo_multipart(corpo, tipo):
+    """Conteúdo e content-type da parte 'file' de um upload multipart do storage3."""
+    mensagem = BytesParser(policy=politica_email).parsebytes(f"Content-Type: {tipo}\r\n\r\n".encode() + corpo)
+    if mensagem.is_multipart():
+        for parte in mensagem.iter_parts():
+            if parte.get_filename(): return parte.get_payload(decode=True), parte.get_content_type()
+    return corpo, tipo
+
+class ManipuladorFalso(BaseHTTPRequestHandler):
+    banco = None
+    latencias = {}  # serviço -> segundos (média; cada resposta varia de 0,5x a 1,5x)
+    aprovar_em = None  # segundos até a preferência criada virar venda paga (None = nunca)
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo=None, cabecalhos=None, tipo="application/json"):
+        dados = corpo if isinstance(corpo, bytes) else json.dumps(corpo, default=str).encode() if corpo is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(dados)))
+        for k, v in (cabecalhos or {}).items(): self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD": self.wfile.write(dados)
+
+    def _rota(self):
+        url = urlsplit(self.path)
+        params = parse_qsl(url.query, keep_blank_values=True)
+        partes = [unquote(p) for p in url.path.strip("/").split("/")]
+        return partes, params
+
+    def _bruto(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _corpo(self):
+        bruto = self._bruto()
+        return json.loads(bruto) if bruto else None
+
+    def _prefer(self):
+        return self.headers.get("Prefer", "")
+
+    def _servico(self, partes, rota):
+        """Conta a requisição e aplica a latência do serviço; None se a rota não for de nenhum."""
+        servico = {"rest": "rest", "storage": "storage", "checkout": "mercadopago"}.get(partes[0])
+        if servico is None: return None
+        self.banco.contar(f"{servico} {rota}")
+        if self.latencias.get(servico): time.sleep(self.latencias[servico] * random.uniform(0.5, 1.5))
+        return servico
+
+    def do_GET(self):
+        partes, params = self._rota()
+        if partes[:3] == ["storage", "v1", "object"] and len(partes) > 4:
+            # /object/public/<bucket>/<caminho> (link do e-mail) ou /object/<bucket>/<caminho> (download autenticado)
+            publico = partes[3] == "public" and len(partes) > 5
+            bucket, caminho = (partes[4], partes[5:]) if publico else (partes[3], partes[4:])
+            self._servico(partes, "download")
+            arquivo = self.banco.arquivos.get((bucket, "/".join(caminho)))
+            if arquivo is None: return self._responder(404, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+            return self._responder(200, arquivo[0], tipo=arquivo[1])
+        if partes[:2] == ["checkout", "preferences"] and len(partes) == 3:
+            self._servico(partes, "preferencia")
+            preferencia = self.banco.preferencias.get(partes[2])
+            return self._responder(200 if preferencia else 404, preferencia or {"message": "preference not found"})
+        if partes[:2] != ["rest", "v1"] or len(partes) < 3: return self._responder(404, {"message": "rota desconhecida"})
+        self._servico(partes, f"{self.command} {partes[2]}")
+        try:
+            linhas, total, inicio = self.banco.selecionar(partes[2], params)
+        except Exception as e:
+            return self._responder(400, {"message": str(e)})
+        contar = "count=" in self._prefer()
+        faixa = f"{inicio}-{inicio + len(linhas) - 1}" if linhas else "*"
+        self._responder(200, linhas, {"Content-Range": f"{faixa}/{total if contar else '*'}"})
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        partes, params = self._rota()
+        if partes[0] == "storage": return self._storage(partes)
+        if partes[0] == "checkout": return self._mercado_pago(partes)
+        if partes[:2] != ["rest", "v1"] or len(partes) < 3: return self._responder(404, {"message": "rota desconhecida"})
+        self._servico(partes, f"POST {'/'.join(partes[2:4])}")
+        if partes[2] == "rpc":
+            self._corpo()  # argumentos (as funções daqui não têm); lidos para não sobrar no keep-alive
+            if len(partes) == 4 and self.banco.chamar(partes[3]): return self._responder(200, None)
+            return self._responder(404, {"code": "PGRST202", "message": f"Could not find the function {'/'.join(partes[3:])}"})
+        registros = self._corpo()
+        if isinstance(registros, dict): registros = [registros]
+        chave = None
+        if "resolution=merge-duplicates" in self._prefer():
+            chave = (dict(params).get("on_conflict") or "id").split(",")
+        linhas = self.banco.inserir(partes[2], registros or [], chave)
+        self._responder(201, linhas if "return=representation" in self._prefer() else None)
+
+    def do_PUT(self):
+        partes, _ = self._rota()
+        if partes[0] != "storage": return self._responder(404, {"message": "rota desconhecida"})
+        self._storage(partes)
+
+    def do_PATCH(self):
+        partes, params = self._rota()
+        self._servico(partes, f"PATCH {partes[2]}")
+        linhas = self.banco.atualizar(partes[2], params, self._corpo() or {})
+        self._responder(200, linhas if "return=representation" in self._prefer() else None)
+
+    def do_DELETE(self):
+        partes, params = self._rota()
+        self._servico(partes, f"DELETE {partes[2]}")
+        linhas = self.banco.apagar(partes[2], params)
+        self._responder(200, linhas if "return=representation" in self._prefer() else None)
+
+    def _storage(self, partes):
+        # /storage/v1/object/list/<bucket> e /storage/v1/object/<bucket>/<caminho> (POST cria, PUT substitui)
+        if partes[:3] != ["storage", "v1", "object"] or len(partes) < 5: return self._responder(404, {"message": "rota desconhecida"})
+        if partes[3] == "list":
+            self._servico(partes, "list")
+            opcoes = self._corpo() or {}
+            return self._responder(200, self.banco.listar_arquivos(partes[4], opcoes.get("prefix", ""), opcoes.get("search", "")))
+        self._servico(partes, "upload")
+        bucket, caminho = partes[3], "/".join(partes[4:])
+        dados, tipo = _arquivo_multipart(self._bruto(), self.headers.get("Content-Type", "application/octet-stream"))
+        sobrescrever = self.command == "PUT" or self.headers.get("x-upsert", "").lower() == "true"
+        if not self.banco.guardar_arquivo(bucket, caminho, dados, tipo, sobrescrever):
+            return self._responder(409, {"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"})
+        self._responder(200, {"Key": f"{bucket}/{caminho}", "Id": str(uuid.uuid4())})
+
+    def _mercado_pago(self, partes):
+        if partes[:2] != ["checkout", "preferences"] or len(partes) != 2: return self._responder(404, {"message": "resource not found"})
+        self._servico(partes, "preferencia")
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._responder(401, {"message": "invalid access token", "status": 401})
+        preferencia = self.banco.criar_preferencia(self._corpo() or {}, f"http://{self.headers.get('Host')}", self.aprovar_em)
+        self._responder(201, preferencia)
+
+def iniciar(banco, porta=0, latencias=None, aprovar_em=None):
+    """Sobe o servidor numa thread e devolve (servidor, url)."""
+    manipulador = type("Manipulador", (ManipuladorFalso,), {"banco": banco, "latencias": dict(latencias or {}), "aprovar_em": aprovar_em})
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="supabase-falso", daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+def carregar_arquivo(caminho):
+    import pandas as pd
+    if caminho.endswith(".parquet"): df = pd.read_parquet(caminho)
+    elif caminho.endswith(".csv"): df = pd.read_csv(caminho)
+    else: df = pd.read_json(caminho)
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Supabase, Storage e Mercado Pago falsos para rodar o app sem rede")
+    parser.add_argument("porta", nargs="?", type=int, default=54321)
+    parser.add_argument("tabelas", nargs="*", help="tabela=arquivo.parquet|.csv|.json")
+    parser.add_argument("--latencia", default="", help="segundos por resposta: 0.05 ou rest=0.03,storage=0.1,mercadopago=0.4")
+    parser.add_argument("--aprovar", type=float, default=None, help="segundos até a preferência criada virar venda paga")
+    args = parser.parse_args()
+    tabelas = {}
+    for arg in args.tabelas:
+        nome, _, caminho = arg.partition("=")
+        tabelas[nome] = carregar_arquivo(caminho)
+        print(f"📄 {nome}: {len(tabelas[nome]):,} linhas")
+    servidor, url = iniciar(BancoFalso(tabelas, materializadas={"leads_cubo": view_cubo()}), args.porta, ler_latencias(args.latencia), args.aprovar)
+    print(f"🧪 Supabase falso em {url} (Ctrl+C para sair)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
@@ -0,0 +1,450 @@
+import re
+import json
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 🧾 FORMATO DO FILTRO
+# ==========================================
+# Um filtro é um dict com as chaves abaixo (chave ausente, None ou lista vazia = sem filtro):
+#   "site": True / False                       -> tem / não tem site
+#   "nota": (min, max)                         -> faixa fechada
+#   "avaliacoes": (min, max | None)            -> max None = sem teto (o "1000+" do slider)
+#   "tipo_contato", "Segmento", "categoria_google", "estado", "cidade", "bairro": [valores]
+#   "nome": "texto"                            -> trecho do nome, literal, sem diferenciar maiúsculas/acentos
+
+def normalizar_filtro(filtro):
+    """Forma canônica do filtro (sem chaves vazias, listas ordenadas, nome dobrado), para usar como chave."""
+    norm = {}
+    for chave, valor in filtro.items():
+        if valor is None or (isinstance(valor, (str, list, tuple, set)) and not len(valor)): continue
+        if chave == 'nome':
+            valor = termo_nome(filtro)
+            if not valor: continue
+        elif isinstance(valor, (list, set)):
+            valor = sorted({str(v) for v in valor})
+        elif isinstance(valor, tuple):
+            valor = list(valor)
+        norm[chave] = valor
+    return norm
+
+COLUNAS_FILTRO = ['tipo_contato', 'Segmento', 'categoria_google', 'estado', 'cidade', 'bairro']
+COLUNAS_FAIXA = ['nota', 'avaliacoes']
+
+def codificar(serie):
+    """Códigos inteiros (-1 = vazio) e os valores distintos de uma coluna."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy().astype(np.int32), list(serie.cat.categories)
+    codigos, valores = pd.factorize(serie)
+    return codigos.astype(np.int32), list(valores)
+
+# ==========================================
+# 🔤 BUSCA POR NOME (TRIGRAMAS)
+# ==========================================
+
+SEP = "\x00"
+_ACENTOS = re.compile(r"[\u0300-\u036f]")
+
+def dobrar(texto):
+    """Sem acentos e sem maiúsculas: "São Paulo" -> "sao paulo"."""
+    return _ACENTOS.sub("", unicodedata.normalize("NFKD", texto)).casefold()
+
+def termo_nome(filtro):
+    """Trecho de nome que o filtro busca, já sem espaços nas pontas e dobrado ("" = sem busca).
+
+    Índice, cubo, modo remoto e chave da exportação usam todos este mesmo termo.
+    """
+    return dobrar(str(filtro.get('nome') or '').strip())
+
+def chaves_trigrama(c):
+    """Trigramas de um vetor de code points como uint64 (21 bits por caractere)."""
+    return (c[:-2] << np.uint64(42)) | (c[1:-1] << np.uint64(21)) | c[2:]
+
+class IndiceNomes:
+    """Índice de trigramas sobre os nomes distintos (já sem acento e em minúsculas).
+
+    A busca é literal (sem regex): cruza as listas de nomes de cada trigrama da consulta,
+    começando pela menor, e confirma o trecho só nos candidatos. Consultas com menos de
+    3 caracteres, ou com candidatos demais, testam o trecho em todos os nomes distintos.
+    """
+
+    def __init__(self, nomes):
+        # Dobra tudo numa chamada só, sobre o texto concatenado, em vez de um nome por vez
+        texto = dobrar(SEP.join(str(n).replace(SEP, " ") for n in nomes))
+        self.nomes = texto.split(SEP) if len(nomes) else []
+
+        c = np.frombuffer(texto.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        if len(c) < 3:
+            self.trigramas = np.empty(0, dtype=np.uint64)
+            self.inicio_tri = self.postings = np.empty(0, dtype=np.int64)
+            return
+        eh_sep = c == ord(SEP)
+        valido = ~(eh_sep[:-2] | eh_sep[1:-1] | eh_sep[2:])
+        chave = chaves_trigrama(c)[valido]
+        nome_id = np.cumsum(eh_sep)[:-2][valido]
+        ordem = np.argsort(chave, kind="stable")
+        chave, nome_id = chave[ordem], nome_id[ordem]
+        # Um par (trigrama, nome) por nome, mesmo que o trigrama apareça várias vezes nele
+        novo = np.ones(len(chave), dtype=bool)
+        novo[1:] = (chave[1:] != chave[:-1]) | (nome_id[1:] != nome_id[:-1])
+        chave, self.postings = chave[novo], nome_id[novo].astype(np.int32)
+        self.trigramas, self.inicio_tri = np.unique(chave, return_index=True)
+        self.inicio_tri = np.append(self.inicio_tri, len(chave))
+
+    def varrer(self, q):
+        return np.flatnonzero(np.fromiter((q in n for n in self.nomes), dtype=bool, count=len(self.nomes)))
+
+    def buscar(self, consulta):
+        """Ids (ordenados) dos nomes que contêm o trecho."""
+        q = dobrar(consulta.replace(SEP, ""))
+        if len(q) < 3: return self.varrer(q)
+        chaves = np.unique(chaves_trigrama(np.frombuffer(q.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)))
+        i = np.searchsorted(self.trigramas, chaves)
+        if (i >= len(self.trigramas)).any() or (self.trigramas[np.minimum(i, len(self.trigramas) - 1)] != chaves).any():
+            return np.empty(0, dtype=np.int64)
+        listas = sorted((self.postings[self.inicio_tri[k]:self.inicio_tri[k + 1]] for k in i), key=len)
+        if len(listas[0]) > len(self.nomes) // 10: return self.varrer(q)
+        candidatos = listas[0]
+        for lista in listas[1:]:
+            candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+        return np.array([n for n in candidatos if q in self.nomes[n]], dtype=np.int64)
+
+# ==========================================
+# 🔎 ÍNDICE DE FILTROS
+# ==========================================
+
+def agrupar(codigos, qtd_valores):
+    """Posições das linhas agrupadas por código e o início de cada grupo."""
+    ordem = np.argsort(codigos, kind='stable').astype(np.int32)
+    return ordem, np.searchsorted(codigos[ordem], np.arange(qtd_valores + 1))
+
+class IndiceFiltros:
+    """Índice invertido da base, montado uma vez por versão dos dados.
+
+    Para cada coluna categórica guarda as posições das linhas agrupadas por valor (lista de
+    row-ids ordenada) e, para nota/avaliacoes, as posições ordenadas pelo valor. Um filtro
+    parte do predicado mais seletivo e testa os demais só nas posições candidatas, sem criar
+    DataFrames intermediários.
+    """
+
+    def __init__(self, df):
+        self.n = len(df)
+        self.categorias = {}
+        for col in COLUNAS_FILTRO:
+            if col not in df.columns: continue
+            codigos, valores = codificar(df[col])
+            ordem, inicio = agrupar(codigos, len(valores))
+            self.categorias[col] = {
+                "codigos": codigos,
+                "valores": valores,
+                "lookup": {v: i for i, v in enumerate(valores)},
+                "ordem": ordem,
+                "inicio": inicio,
+            }
+        self.nomes = None
+        if 'nome' in df.columns:
+            codigos, valores = codificar(df['nome'])
+            ordem, inicio = agrupar(codigos, len(valores))
+            self.categorias['nome'] = {"codigos": codigos, "valores": valores, "ordem": ordem, "inicio": inicio}
+            self.nomes = IndiceNomes(valores)
+        self.faixas = {}
+        for col in COLUNAS_FAIXA:
+            if col not in df.columns: continue
+            valores = df[col].to_numpy()
+            ordem = np.argsort(valores, kind='stable').astype(np.int32)
+            self.faixas[col] = {"valores": valores, "ordem": ordem, "ordenados": valores[ordem]}
+        self.tem_site = df['site'].notna().to_numpy() if 'site' in df.columns else np.zeros(self.n, dtype=bool)
+        self.qtd_site = int(self.tem_site.sum())
+
+    def _predicados(self, filtro):
+        preds = []
+        for col, idx in self.categorias.items():
+            selecao = termo_nome(filtro) if col == 'nome' else filtro.get(col)
+            if not selecao: continue
+            if col == 'nome':
+                cods = self.nomes.buscar(selecao)
+            else:
+                cods = np.array(sorted({idx["lookup"][v] for v in selecao if v in idx["lookup"]}), dtype=np.int64)
+            qtd = int((idx["inicio"][cods + 1] - idx["inicio"][cods]).sum()) if len(cods) else 0
+            preds.append((qtd, "categoria", col, cods))
+        for col, idx in self.faixas.items():
+            faixa = filtro.get(col)
+            if not faixa: continue
+            lo, hi = faixa
+            a = np.searchsorted(idx["ordenados"], lo, 'left') if lo is not None else 0
+            b = np.searchsorted(idx["ordenados"], hi, 'right') if hi is not None else self.n
+            if a == 0 and b == self.n: continue  # faixa cobre a base inteira
+            preds.append((int(b - a), "faixa", col, (lo, hi, a, b)))
+        if filtro.get("site") is not None:
+            qtd = self.qtd_site if filtro["site"] else self.n - self.qtd_site
+            preds.append((qtd, "site", "site", bool(filtro["site"])))
+        return sorted(preds, key=lambda p: p[0])
+
+    def _materializar(self, tipo, col, arg):
+        if tipo == "categoria":
+            idx = self.categorias[col]
+            if len(arg) > 64:  # muitos valores (ex.: busca por nome ampla): uma máscara sai mais barato
+                permitido = np.zeros(len(idx["valores"]) + 1, dtype=bool)
+                permitido[arg] = True
+                return np.flatnonzero(permitido[idx["codigos"]]).astype(np.int32)
+            partes = [idx["ordem"][idx["inicio"][c]:idx["inicio"][c + 1]] for c in arg]
+            return np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.int32)
+        if tipo == "faixa":
+            return np.sort(self.faixas[col]["ordem"][arg[2]:arg[3]])
+        return np.flatnonzero(self.tem_site == arg).astype(np.int32)
+
+    def _testar(self, pos, tipo, col, arg):
+        if tipo == "categoria":
+            idx = self.categorias[col]
+            permitido = np.zeros(len(idx["valores"]) + 1, dtype=bool)  # a última posição recebe o -1 (vazio)
+            permitido[arg] = True
+            return pos[permitido[idx["codigos"][pos]]]
+        if tipo == "faixa":
+            lo, hi = arg[0], arg[1]
+            v = self.faixas[col]["valores"][pos]
+            mask = np.ones(len(pos), dtype=bool)
+            if lo is not None: mask &= v >= lo
+            if hi is not None: mask &= v <= hi
+            return pos[mask]
+        return pos[self.tem_site[pos] == arg]
+
+    def filtrar(self, filtro):
+        """Posições (ordenadas) das linhas que atendem ao filtro."""
+        preds = self._predicados(filtro)
+        if not preds: return np.arange(self.n, dtype=np.int32)
+        _, tipo, col, arg = preds[0]
+        pos = self._materializar(tipo, col, arg)
+        for _, tipo, col, arg in preds[1:]:
+            if not len(pos): break
+            pos = self._testar(pos, tipo, col, arg)
+        return pos
+
+# ==========================================
+# 🎯 SELEÇÃO (POSIÇÕES SOBRE A BASE)
+# ==========================================
+
+class Selecao:
+    """Resultado de um filtro como posições das linhas na base, sem copiar colunas.
+
+    Cada consumidor puxa só o que usa: a amostra pega as primeiras linhas, os gráficos
+    contam pelos códigos das colunas category e a exportação lê em blocos. `posicoes`
+    None = a base inteira.
+    """
+
+    def __init__(self, df, posicoes=None):
+        self.df = df
+        self.posicoes = posicoes
+
+    def __len__(self):
+        return len(self.df) if self.posicoes is None else len(self.posicoes)
+
+    def linhas(self, inicio=0, fim=None):
+        """Linhas [inicio, fim) da seleção, como DataFrame (com o índice da base)."""
+        if self.posicoes is None: return self.df.iloc[inicio:fim]
+        return self.df.take(self.posicoes[inicio:fim])
+
+    def blocos(self, tamanho):
+        for inicio in range(0, len(self), tamanho):
+            yield self.linhas(inicio, inicio + tamanho)
+
+    def _valores(self, col):
+        # Códigos (com os valores distintos) se a coluna for category; senão os próprios valores
+        serie = self.df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            cods = serie.cat.codes.to_numpy()
+            return (cods if self.posicoes is None else cods[self.posicoes]), serie.cat.categories
+        return (serie if self.posicoes is None else serie.take(self.posicoes)), None
+
+    def contar(self, col):
+        """Contagem por valor (sem vazios e sem zeros), do maior para o menor, como no cubo."""
+        valores, categorias = self._valores(col)
+        if categorias is None:
+            return valores.value_counts().rename_axis(col).rename('count')
+        soma = np.bincount(valores[valores >= 0], minlength=len(categorias))
+        serie = pd.Series(soma.astype(np.int64), index=pd.Index(categorias, name=col), name='count')
+        return serie[serie > 0].sort_values(ascending=False, kind='stable')
+
+    def qtd_igual(self, col, valor):
+        valores, categorias = self._valores(col)
+        if categorias is None: return int((valores == valor).sum())
+        return int((valores == categorias.get_loc(valor)).sum()) if valor in categorias else 0
+
+    def qtd_preenchidos(self, col):
+        preenchido = self.df[col].notna().to_numpy()
+        return int(preenchido.sum() if self.posicoes is None else preenchido[self.posicoes].sum())
+
+# ==========================================
+# 🗂️ ÍNDICE DE FACETAS (OPÇÕES DOS FILTROS)
+# ==========================================
+
+def ordenar(contagem):
+    return {k: contagem[k] for k in sorted(contagem)}
+
+def somar(contagens):
+    total = Counter()
+    for c in contagens: total.update(c)
+    return ordenar(total)
+
+class IndiceFacetas:
+    """Opções em cascata (Setor→Nicho e UF→Cidade→Bairro) com a quantidade de leads de cada uma.
+
+    Montado uma vez por versão da base; trocar a seleção vira consulta a dicionário e soma
+    de contagens em vez de filtrar a base e chamar unique() a cada rerun.
+    """
+
+    def __init__(self, df, pesos=None):
+        # `pesos`: coluna com a quantidade de leads de cada linha (ex.: células já agregadas no banco)
+        def contar(colunas):
+            grupos = df.groupby(colunas, observed=True, sort=False)
+            return (grupos[pesos].sum() if pesos else grupos.size()).items()
+
+        self.nichos_por_segmento = defaultdict(Counter)
+        if not df.empty:
+            for (seg, nicho), qtd in contar(['Segmento', 'categoria_google']):
+                self.nichos_por_segmento[seg][nicho] += qtd
+        self.por_segmento = {s: sum(c.values()) for s, c in self.nichos_por_segmento.items()}
+        self.nichos_total = somar(self.nichos_por_segmento.values())
+
+        self.cidades_por_uf = defaultdict(Counter)
+        self.bairros_por_uf = defaultdict(Counter)
+        self.bairros_por_local = defaultdict(Counter)  # (uf, cidade) -> bairros
+        self.ufs_por_cidade = defaultdict(set)
+        if not df.empty:
+            for (uf, cidade, bairro), qtd in contar(['estado', 'cidade', 'bairro']):
+                self.cidades_por_uf[uf][cidade] += qtd
+                self.bairros_por_uf[uf][bairro] += qtd
+                self.bairros_por_local[(uf, cidade)][bairro] += qtd
+                self.ufs_por_cidade[cidade].add(uf)
+        # Contado à parte: o groupby descarta as linhas sem cidade, mas a UF continua valendo
+        self.por_uf = {uf: int(q) for uf, q in contar('estado') if q} if not df.empty else {}
+        self.cidades_total = somar(self.cidades_por_uf.values())
+        self.bairros_total = somar(self.bairros_por_uf.values())
+
+    def segmentos(self):
+        return ordenar(self.por_segmento)
+
+    def nichos(self, segmentos=None):
+        if not segmentos: return self.nichos_total
+        return somar(self.nichos_por_segmento[s] for s in segmentos if s in self.nichos_por_segmento)
+
+    def ufs(self):
+        return ordenar(self.por_uf)
+
+    def cidades(self, ufs=None):
+        if not ufs: return self.cidades_total
+        return somar(self.cidades_por_uf[uf] for uf in ufs if uf in self.cidades_por_uf)
+
+    def bairros(self, ufs=None, cidades=None):
+        if not cidades:
+            if not ufs: return self.bairros_total
+            return somar(self.bairros_por_uf[uf] for uf in ufs if uf in self.bairros_por_uf)
+        locais = [(uf, c) for c in cidades for uf in self.ufs_por_cidade.get(c, ()) if not ufs or uf in ufs]
+        return somar(self.bairros_por_local[l] for l in locais)
+
+# ==========================================
+# 🧊 CUBO DE CONTAGENS (GRÁFICOS E TOTAIS)
+# ==========================================
+
+DIMENSOES_CUBO = ['estado', 'cidade', 'bairro', 'Segmento', 'categoria_google', 'tipo_contato']
+
+class CuboContagens:
+    """Quantidade de leads por combinação de UF × cidade × bairro × Segmento × nicho × tipo × site.
+
+    Montado uma vez por versão da base. Filtros só categóricos (sem nome e com nota/avaliações
+    cobrindo a base toda) viram soma das células do cubo, em vez de varrer as linhas; o
+    Segmento sai do nicho, então incluir o nicho quase não aumenta o número de células.
+    """
+
+    def __init__(self, df, pesos=None):
+        # `pesos`: como em IndiceFacetas; nesse caso a marca de site vem em `tem_site` e as
+        # faixas de nota/avaliações em `<col>_min` / `<col>_max` (a view leads_cubo do modo remoto)
+        self.dimensoes = {}
+        self.lookup = {}
+        codigos = {}
+        for col in DIMENSOES_CUBO:
+            cods, valores = codificar(df[col])
+            cods[cods < 0] = len(valores)  # vazio vai para a última posição
+            codigos[col] = cods
+            self.dimensoes[col] = valores
+            self.lookup[col] = {v: i for i, v in enumerate(valores)}
+        codigos['site'] = (df['tem_site'].fillna(False).astype(bool) if 'tem_site' in df.columns else df['site'].notna()).to_numpy().astype(np.int32)
+        if pesos:
+            celulas = pd.DataFrame(codigos).assign(_qtd=df[pesos].to_numpy()).groupby(list(codigos), sort=False)['_qtd'].sum()
+        else:
+            celulas = pd.DataFrame(codigos).value_counts(sort=False)
+        self.celulas = {col: celulas.index.get_level_values(col).to_numpy() for col in codigos}
+        self.contagem = celulas.to_numpy().astype(np.int64)
+        self.faixas = {}
+        for col in COLUNAS_FAIXA:
+            if not len(df): continue
+            if col in df.columns: self.faixas[col] = (df[col].min(), df[col].max())
+            elif f"{col}_min" in df.columns: self.faixas[col] = (df[f"{col}_min"].min(), df[f"{col}_max"].max())
+        self._resumos = OrderedDict()  # filtro normalizado -> (total, contagens); reruns com o mesmo filtro não recalculam
+        self._lock = threading.Lock()
+
+    def atende(self, filtro):
+        """O filtro pode ser respondido pelo cubo? (sem busca por nome e sem faixa recortando a base)"""
+        if termo_nome(filtro): return False
+        for col, (vmin, vmax) in self.faixas.items():
+            faixa = filtro.get(col)
+            if not faixa: continue
+            lo, hi = faixa
+            if (lo is not None and lo > vmin) or (hi is not None and hi < vmax): return False
+        return True
+
+    def _mascara(self, filtro):
+        mask = np.ones(len(self.contagem), dtype=bool)
+        for col, valores in self.dimensoes.items():
+            selecao = filtro.get(col)
+            if not selecao: continue
+            permitido = np.zeros(len(valores) + 1, dtype=bool)
+            permitido[[self.lookup[col][v] for v in selecao if v in self.lookup[col]]] = True
+            mask &= permitido[self.celulas[col]]
+        if filtro.get('site') is not None:
+            mask &= self.celulas['site'] == int(bool(filtro['site']))
+        return mask
+
+    def total(self, filtro=None):
+        if not filtro: return int(self.contagem.sum())
+        return int(self.contagem[self._mascara(filtro)].sum())
+
+    def contar(self, col, filtro=None):
+        """Contagem por valor da coluna (sem vazios e sem zeros), do maior para o menor."""
+        return self._contar(col, self._mascara(filtro) if filtro else slice(None))
+
+    def _contar(self, col, mask):
+        valores = self.dimensoes[col]
+        soma = np.bincount(self.celulas[col][mask], weights=self.contagem[mask], minlength=len(valores) + 1)[:-1]
+        serie = pd.Series(soma.astype(np.int64), index=pd.Index(valores, name=col), name='count')
+        return serie[serie > 0].sort_values(ascending=False, kind='stable')
+
+    def resumo(self, filtro, colunas=('cidade', 'bairro', 'Segmento'), max_itens=256):
+        """Total e contagem por coluna para o filtro, guardados para os próximos reruns."""
+        chave = json.dumps([normalizar_filtro({k: v for k, v in filtro.items() if k not in self.faixas}), list(colunas)],
+                           sort_keys=True, default=str)
+        with self._lock:
+            if chave in self._resumos:
+                self._resumos.move_to_end(chave)
+                return self._resumos[chave]
+        mask = self._mascara(filtro)
+        res = (int(self.contagem[mask].sum()), {col: self._contar(col, mask) for col in colunas})
+        with self._lock:
+            self._resumos[chave] = res
+            while len(self._resumos) > max_itens: self._resumos.popitem(last=False)
+        return res
+
+    def combinacoes(self, colunas, filtro=None):
+        """Combinações de valores das colunas que têm leads no filtro, com a quantidade: [((v1, v2, ...), qtd)]."""
+        mask = self._mascara(filtro) if filtro else np.ones(len(self.contagem), dtype=bool)
+        for col in colunas: mask &= self.celulas[col] < len(self.dimensoes[col])  # sem vazio
+        if not mask.any(): return []
+        grupos = pd.DataFrame({col: self.celulas[col][mask] for col in colunas}).assign(_qtd=self.contagem[mask])\
+            .groupby(list(colunas), sort=True)['_qtd'].sum()
+        return [(tuple(self.dimensoes[col][c] for col, c in zip(colunas, cods if isinstance(cods, tuple) else (cods,))), int(q))
+                for cods, q in grupos.items()]
+
+    def distintos(self, col):
+        return int((np.bincount(self.celulas[col], minlength=len(self.dimensoes[col]) + 1)[:-1] > 0).sum())
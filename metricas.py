@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+import functools
+from io import StringIO
+from collections import deque
+from contextlib import contextmanager
+
+# ==========================================
+# ⏱️ MEDIÇÃO POR ETAPA (SPANS)
+# ==========================================
+# with span("filtro") as s:            @cronometrar("mercado_pago")
+#     ...                              def criar_preferencia(...): ...
+#     s["linhas"] = len(posicoes)
+# Cada span vira uma linha JSON em METRICAS_DIR/spans_<processo>.jsonl e entra nos histogramas de
+# METRICAS_DIR/<processo>.prom (formato texto do Prometheus; serve para o textfile collector do
+# node_exporter). Spans abertos durante um rerun do site ficam guardados com ele, para o painel
+# dos reruns mais lentos. METRICAS=0 desliga tudo (os spans viram no-op).
+
+METRICAS = os.getenv("METRICAS", "1") == "1"
+METRICAS_DIR = os.getenv("METRICAS_DIR", ".metricas")
+METRICAS_LOG_MB = int(os.getenv("METRICAS_LOG_MB", 50))  # acima disso o log vira .1 e recomeça
+
+# Limites (segundos) dos baldes do histograma: do filtro em memória ao Excel de 1M linhas
+LIMITES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+class Histograma:
+    def __init__(self, limites=LIMITES):
+        self.limites = limites
+        self.baldes = [0] * len(limites)
+        self.qtd = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self.linhas = 0
+        self.erros = 0
+
+    def registrar(self, segundos, linhas=None, erro=False):
+        for i, limite in enumerate(self.limites):
+            if segundos <= limite:
+                self.baldes[i] += 1
+                break
+        self.qtd += 1
+        self.soma += segundos
+        self.maximo = max(self.maximo, segundos)
+        if linhas: self.linhas += int(linhas)
+        if erro: self.erros += 1
+
+def _rotulos_prom(rotulos):
+    return ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in rotulos)
+
+class Metricas:
+    """Histogramas por etapa, log JSON-lines e os últimos reruns de cada processo.
+
+    O arquivo .prom é regravado (troca atômica) no máximo a cada `intervalo_prom` segundos;
+    o log recebe uma linha por span. Tudo protegido por um lock só: um span custa alguns
+    microssegundos fora do trecho medido.
+    """
+
+    def __init__(self, processo="app", pasta=METRICAS_DIR, ativo=METRICAS, prefixo="diskleads", intervalo_prom=10.0,
+                 max_log_mb=METRICAS_LOG_MB, max_reruns=200):
+        self.processo = processo
+        self.pasta = pasta
+        self.ativo = ativo
+        self.prefixo = prefixo
+        self.intervalo_prom = intervalo_prom
+        self.max_log = max_log_mb * 1024 ** 2
+        self.histogramas = {}  # (etapa, ((rótulo, valor), ...)) -> Histograma
+        self.reruns = deque(maxlen=max_reruns)
+        self.abertos = {}  # sessão -> rerun em andamento
+        self.gravado_em = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._log = None
+        if ativo: os.makedirs(pasta, exist_ok=True)
+
+    @property
+    def caminho_log(self):
+        return os.path.join(self.pasta, f"spans_{self.processo}.jsonl")
+
+    @property
+    def caminho_prom(self):
+        return os.path.join(self.pasta, f"{self.processo}.prom")
+
+    @contextmanager
+    def span(self, etapa, **rotulos):
+        """Mede o bloco; quem chama pode pôr `linhas` (ou outros campos) no dict recebido."""
+        dados = {}
+        if not self.ativo:
+            yield dados
+            return
+        t0 = time.perf_counter()
+        erro = None
+        try:
+            yield dados
+        except Exception as e:  # st.rerun / st.stop (BaseException) não contam como erro
+            erro = type(e).__name__
+            dados.setdefault("mensagem", str(e)[:500])  # vai para o log JSON junto com o span
+            raise
+        finally:
+            self.registrar(etapa, time.perf_counter() - t0, dados.pop("linhas", None), erro, rotulos, dados)
+
+    def registrar(self, etapa, segundos, linhas=None, erro=None, rotulos=None, extras=None):
+        rotulos = tuple(sorted((rotulos or {}).items()))
+        rerun = getattr(self._local, "rerun", None)
+        registro = {"ts": round(time.time(), 3), "processo": self.processo, "etapa": etapa, "segundos": round(segundos, 6)}
+        registro.update(rotulos)
+        if linhas is not None: registro["linhas"] = int(linhas)
+        if erro: registro["erro"] = erro
+        if extras: registro.update(extras)
+        if rerun is not None and "fim" not in rerun:
+            registro["rerun"] = rerun["id"]
+            rerun["spans"].append((etapa, dict(rotulos), round(segundos, 4), linhas))
+            rerun["ultimo"] = time.perf_counter()
+        with self._lock:
+            self.histogramas.setdefault((etapa, rotulos), Histograma()).registrar(segundos, linhas, erro)
+            self._escrever_log(registro)
+            if time.time() - self.gravado_em >= self.intervalo_prom: self._gravar_prom()
+
+    def _escrever_log(self, registro):
+        try:
+            if self._log is None:
+                self._log = open(self.caminho_log, "a", buffering=1, encoding="utf-8")
+            elif self._log.tell() > self.max_log:
+                self._log.close()
+                os.replace(self.caminho_log, self.caminho_log + ".1")
+                self._log = open(self.caminho_log, "a", buffering=1, encoding="utf-8")
+            self._log.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            print(f"Erro ao gravar spans: {e}")
+            self._log = None
+
+    def texto_prom(self):
+        nome = f"{self.prefixo}_etapa_segundos"
+        saida = [f"# HELP {nome} Duração das etapas medidas (spans).", f"# TYPE {nome} histogram"]
+        linhas = [f"# HELP {self.prefixo}_etapa_linhas_total Linhas processadas pelas etapas.",
+                  f"# TYPE {self.prefixo}_etapa_linhas_total counter"]
+        erros = [f"# HELP {self.prefixo}_etapa_erros_total Etapas que terminaram em exceção.",
+                 f"# TYPE {self.prefixo}_etapa_erros_total counter"]
+        for (etapa, rotulos), h in sorted(self.histogramas.items()):
+            base = _rotulos_prom((("processo", self.processo), ("etapa", etapa)) + rotulos)
+            acumulado = 0
+            for limite, qtd in zip(h.limites, h.baldes):
+                acumulado += qtd
+                saida.append(f'{nome}_bucket{{{base},le="{limite}"}} {acumulado}')
+            saida.append(f'{nome}_bucket{{{base},le="+Inf"}} {h.qtd}')
+            saida.append(f"{nome}_sum{{{base}}} {h.soma:.6f}")
+            saida.append(f"{nome}_count{{{base}}} {h.qtd}")
+            linhas.append(f"{self.prefixo}_etapa_linhas_total{{{base}}} {h.linhas}")
+            erros.append(f"{self.prefixo}_etapa_erros_total{{{base}}} {h.erros}")
+        return "\n".join(saida + linhas + erros) + "\n"
+
+    def _gravar_prom(self):
+        self.gravado_em = time.time()
+        tmp = f"{self.caminho_prom}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f: f.write(self.texto_prom())
+            os.replace(tmp, self.caminho_prom)
+        except OSError as e:
+            print(f"Erro ao gravar métricas: {e}")
+
+    def gravar(self):
+        """Força a gravação do .prom (fim do processo, testes)."""
+        if not self.ativo: return
+        with self._lock:
+            self._gravar_prom()
+
+    # --- Reruns do site ---
+
+    def iniciar_rerun(self, sessao):
+        """Abre o rerun da sessão nesta thread; um rerun anterior que não chegou ao fim (exceção, st.rerun,
+        st.stop) fecha como interrompido, com a duração até o fim do seu último span."""
+        if not self.ativo: return
+        self.encerrar_rerun(sessao, "interrompido")
+        rerun = {"id": uuid.uuid4().hex[:12], "sessao": sessao, "inicio": time.time(), "t0": time.perf_counter(), "spans": []}
+        with self._lock:
+            self.abertos[sessao] = rerun
+            # Sessões que sumiram no meio de um rerun não ficam para sempre no dict
+            for antiga in [s for s, r in self.abertos.items() if time.time() - r["inicio"] > 3600]:
+                del self.abertos[antiga]
+        self._local.rerun = rerun
+
+    def encerrar_rerun(self, sessao, status="ok"):
+        if not self.ativo: return None
+        with self._lock:
+            rerun = self.abertos.pop(sessao, None)
+        if rerun is None: return None
+        rerun["fim"] = time.time()
+        t0 = rerun.pop("t0")
+        if status == "interrompido":  # o tempo parado até o próximo rerun da sessão não é do rerun
+            rerun["segundos"] = round(rerun.pop("ultimo", t0) - t0, 4)
+            rerun["fim"] = rerun["inicio"] + rerun["segundos"]
+        else:
+            rerun["segundos"] = round(time.perf_counter() - t0, 4)
+            rerun.pop("ultimo", None)
+        rerun["status"] = status
+        if getattr(self._local, "rerun", None) is rerun: self._local.rerun = None
+        self.reruns.append(rerun)
+        self.registrar("rerun", rerun["segundos"], rotulos={"status": status})
+        return rerun
+
+    def reruns_lentos(self, n=10):
+        return sorted(list(self.reruns), key=lambda r: r["segundos"], reverse=True)[:n]
+
+    def resumo(self):
+        """Uma linha por etapa/rótulos: chamadas, média, máximo, linhas e erros."""
+        with self._lock:
+            itens = list(self.histogramas.items())
+        return [{"etapa": etapa, **dict(rotulos), "chamadas": h.qtd, "media_s": round(h.soma / h.qtd, 4),
+                 "max_s": round(h.maximo, 4), "linhas": h.linhas, "erros": h.erros}
+                for (etapa, rotulos), h in sorted(itens, key=lambda i: -i[1].soma)]
+
+# ==========================================
+# 🔬 PERFIL (cProfile) DE UMA SESSÃO
+# ==========================================
+
+def iniciar_perfil():
+    """cProfile ligado na thread atual, ou None se outro perfil já estiver rodando no processo."""
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        return None
+    return perfil
+
+def encerrar_perfil(perfil, pasta=METRICAS_DIR, nome="sessao", linhas=30):
+    """Desliga o perfil, grava o .prof (abre no snakeviz) e devolve (caminho, top por tempo acumulado)."""
+    perfil.disable()
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"perfil_{nome}_{int(time.time())}.prof")
+    perfil.dump_stats(caminho)
+    texto = StringIO()
+    pstats.Stats(perfil, stream=texto).strip_dirs().sort_stats("cumulative").print_stats(linhas)
+    return caminho, texto.getvalue()
+
+# ==========================================
+# 🌐 INSTÂNCIA DO PROCESSO
+# ==========================================
+
+_padrao = None
+_lock_padrao = threading.Lock()
+
+def configurar(processo, **opcoes):
+    """Cria (uma vez) as métricas do processo; quem roda o processo chama antes dos spans."""
+    global _padrao
+    with _lock_padrao:
+        if _padrao is None: _padrao = Metricas(processo, **opcoes)
+    return _padrao
+
+def registro():
+    return _padrao if _padrao is not None else configurar(os.getenv("METRICAS_PROCESSO", "app"))
+
+def span(etapa, **rotulos):
+    return registro().span(etapa, **rotulos)
+
+def cronometrar(etapa=None, **rotulos):
+    """Decorador: cada chamada da função vira um span (nome da função se `etapa` não vier)."""
+    def decorar(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with span(etapa or funcao.__name__, **rotulos):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorar
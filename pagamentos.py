@@ -0,0 +1,114 @@
+import time
+import threading
+from metricas import span
+
+# ==========================================
+# 💳 VIGIA DE PAGAMENTOS (UM POR PROCESSO)
+# ==========================================
+
+class VigiaPagamentos:
+    """Acompanha o status das vendas pendentes de todas as sessões com uma consulta só por ciclo.
+
+    As sessões se inscrevem com a external_reference e leem o status do cache em memória;
+    uma thread consulta todas as referências inscritas de uma vez (`in_`), com intervalo que
+    cresce enquanto nada muda e volta ao mínimo quando chega inscrição nova ou um pagamento.
+    Inscrições não renovadas em `validade` segundos (sessão fechada) são descartadas, e o
+    status/evento de referências sem inscrição sai do cache depois de `ttl` segundos.
+    """
+
+    def __init__(self, client, tabela="vendas", intervalo_min=2.0, intervalo_max=15.0, ttl=30.0,
+                 validade=900.0, lote=200):
+        self.client = client
+        self.tabela = tabela
+        self.intervalo_min = intervalo_min
+        self.intervalo_max = intervalo_max
+        self.ttl = ttl
+        self.validade = validade
+        self.lote = lote
+        self.inscritos = {}  # ref -> último contato da sessão
+        self.eventos = {}    # ref -> threading.Event disparado quando paga
+        self.cache = {}      # ref -> (status | None, quando)
+        self.consultas = 0
+        self._limpeza = time.time()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _guardar(self, ref, status):
+        self.cache[ref] = (status, time.time())
+        if status == 'pago' and ref in self.eventos:
+            self.eventos[ref].set()
+
+    def _limpar(self, agora):
+        # Chamar com o lock. Quem ainda segura o Event de uma referência removida continua com ele;
+        # uma nova inscrição cria outro, disparado no próximo ciclo se a venda estiver paga
+        for ref in [r for r, visto in self.inscritos.items() if agora - visto > self.validade]:
+            del self.inscritos[ref]
+        for ref in [r for r, (_, quando) in self.cache.items() if r not in self.inscritos and agora - quando > self.ttl]:
+            del self.cache[ref]
+        for ref in [r for r in self.eventos if r not in self.inscritos and r not in self.cache]:
+            del self.eventos[ref]
+        self._limpeza = agora
+
+    def consultar(self, refs):
+        """Status atual das referências no banco, em lotes de `lote`."""
+        encontrados = {}
+        for i in range(0, len(refs), self.lote):
+            with span("pagamento_consulta") as s:
+                res = self.client.table(self.tabela).select("external_reference,status")\
+                    .in_("external_reference", refs[i:i + self.lote]).execute()
+                s["linhas"] = len(refs[i:i + self.lote])
+            self.consultas += 1
+            encontrados.update({v['external_reference']: v['status'] for v in res.data})
+        return {ref: encontrados.get(ref) for ref in refs}
+
+    def status(self, ref):
+        """Status da venda (ou None se ainda não existe), do cache se tiver menos de `ttl` segundos."""
+        with self._cond:
+            item = self.cache.get(ref)
+            if item and time.time() - item[1] < self.ttl: return item[0]
+        status = self.consultar([ref])[ref]
+        with self._cond:
+            self._guardar(ref, status)
+            # Sem inscrição a thread pode nem estar rodando: as consultas avulsas limpam o cache também
+            agora = time.time()
+            if agora - self._limpeza > self.ttl: self._limpar(agora)
+        return status
+
+    def inscrever(self, ref):
+        """Inscreve (ou renova) a referência e devolve o Event disparado quando ela for paga."""
+        with self._cond:
+            evento = self.eventos.setdefault(ref, threading.Event())
+            if self.cache.get(ref, (None,))[0] == 'pago':
+                evento.set()
+                return evento
+            novo = ref not in self.inscritos
+            self.inscritos[ref] = time.time()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="vigia-pagamentos", daemon=True)
+                self._thread.start()
+            if novo: self._cond.notify()
+        return evento
+
+    def _loop(self):
+        intervalo = self.intervalo_min
+        while True:
+            with self._cond:
+                self._limpar(time.time())
+                refs = list(self.inscritos)
+            if refs:
+                mudou = False
+                try:
+                    atuais = self.consultar(refs)
+                except Exception as e:
+                    print(f"Erro no vigia de pagamentos: {e}")
+                    atuais = {}
+                with self._cond:
+                    for ref, status in atuais.items():
+                        if status != self.cache.get(ref, (None,))[0]: mudou = True
+                        self._guardar(ref, status)
+                        if status == 'pago': self.inscritos.pop(ref, None)
+                intervalo = self.intervalo_min if mudou else min(intervalo * 1.5, self.intervalo_max)
+            with self._cond:
+                # Acorda antes se entrar inscrição nova
+                if self._cond.wait(timeout=intervalo if refs else self.intervalo_max):
+                    intervalo = self.intervalo_min
@@ -0,0 +1,166 @@
+import sys
+import time
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from dados import baixar_tabela, compactar_leads, memoria_mb
+from filtros import IndiceFiltros
+from metricas import span
+from remoto import COLUNAS_TRATADAS
+
+# ==========================================
+# 🗺️ BASE PARTICIONADA POR UF (LEADS_MODO=uf)
+# ==========================================
+# Em vez de baixar o país inteiro em cada processo: opções dos filtros, totais e gráficos vêm
+# da view leads_cubo (como no modo remoto) e as linhas de uma UF só são baixadas de
+# leads_tratados quando ela é selecionada. As partições ficam num LRU limitado em MB e as UFs
+# mais procuradas são carregadas em segundo plano antes de alguém pedir.
+
+def _bytes_lista(valores):
+    # Lista de textos: a lista em si mais cada string (os nomes distintos são a maior parte do índice)
+    return sys.getsizeof(valores) + sum(sys.getsizeof(v) for v in valores)
+
+def mb_indice(indice):
+    arrays = [a for idx in indice.categorias.values() for a in (idx["codigos"], idx["ordem"], idx["inicio"])]
+    arrays += [a for idx in indice.faixas.values() for a in (idx["valores"], idx["ordem"], idx["ordenados"])]
+    listas = [idx["valores"] for idx in indice.categorias.values()]
+    if indice.nomes is not None:
+        arrays += [indice.nomes.trigramas, indice.nomes.postings, indice.nomes.inicio_tri]
+        listas.append(indice.nomes.nomes)
+    total = sum(a.nbytes for a in arrays) + indice.tem_site.nbytes + sum(_bytes_lista(l) for l in listas)
+    return total / 1024 ** 2
+
+class BaseParticionada:
+    """Partições (DataFrame + IndiceFiltros) por conjunto de UFs, carregadas sob demanda.
+
+    Uma UF é baixada de `remota.tabela` com estado=eq.UF; várias UFs juntas são montadas a
+    partir das partições de cada uma. Passado `intervalo` segundos a partição continua servindo
+    enquanto é recarregada em segundo plano. Acima de `limite_mb` as menos usadas saem (a que
+    acabou de ser pedida fica, mesmo sozinha acima do limite). As UFs avulsas contidas numa
+    partição de várias UFs passam a ser as primeiras a sair: as linhas delas estão em dobro.
+    """
+
+    def __init__(self, remota, limite_mb=512, intervalo=300, prefetch=2, ufs_prefetch=None, max_workers=2):
+        self.remota = remota
+        self.limite_mb = limite_mb
+        self.intervalo = intervalo
+        self.qtd_prefetch = prefetch
+        self.ufs_prefetch = list(ufs_prefetch or [])
+        self.particoes = OrderedDict()  # (UFs ordenadas) -> partição, da menos para a mais recente
+        self.procura = Counter()  # UF -> vezes que foi selecionada
+        self.hits = self.misses = self.evictions = 0
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="particao")
+        self._lock = threading.Lock()
+        self._carregando = {}
+        self._agendadas = set()
+
+    def _baixar(self, uf):
+        with span("particao_carga", uf=uf) as s:
+            linhas = baixar_tabela(self.remota.client, self.remota.tabela, self.remota.tamanho_pagina, self.remota.max_workers,
+                                   preparar=lambda q: q.eq("estado", uf))
+            s["linhas"] = len(linhas)
+        return compactar_leads(pd.DataFrame(linhas, columns=COLUNAS_TRATADAS).drop(columns=['nome_busca']))
+
+    def _montar(self, chave):
+        if len(chave) == 1:
+            df, carregada_em = self._baixar(chave[0]), time.time()
+        else:
+            partes = [self._obter((uf,)) for uf in chave]
+            df = compactar_leads(pd.concat([p["df"] for p in partes], ignore_index=True))  # concat de category vira object
+            # Idade contada da montagem: com a menor idade das partes, uma parte vencida fazia
+            # cada pedido remontar tudo (as partes vencidas se atualizam sozinhas no _obter)
+            carregada_em = time.time()
+        with span("particao_indice", ufs=len(chave)) as s:
+            indice = IndiceFiltros(df)
+            s["linhas"] = len(df)
+        return {"df": df, "indice": indice, "carregada_em": carregada_em, "atualizando": False,
+                "mb": memoria_mb(df) + mb_indice(indice), "versao": f"uf-{'+'.join(chave)}-{int(carregada_em * 1000)}"}
+
+    def _guardar(self, chave, particao):
+        with self._lock:
+            self.particoes[chave] = particao
+            self.particoes.move_to_end(chave)
+            if len(chave) > 1:
+                for uf in chave:
+                    if (uf,) in self.particoes: self.particoes.move_to_end((uf,), last=False)
+            while len(self.particoes) > 1 and self._uso_mb() > self.limite_mb:
+                antiga = next(iter(self.particoes))
+                if antiga == chave: break
+                del self.particoes[antiga]
+                self.evictions += 1
+        print(f"🗺️ partição {'+'.join(chave)}: {len(particao['df']):,} leads, {particao['mb']:,.1f} MB ({self.resumo()})")
+
+    def _recarregar(self, chave):
+        try:
+            self._guardar(chave, self._montar(chave))
+        except Exception as e:
+            print(f"Erro ao recarregar a partição {'+'.join(chave)}: {e}")
+            with self._lock:
+                if chave in self.particoes: self.particoes[chave]["atualizando"] = False
+
+    def _obter(self, chave):
+        with self._lock:
+            particao = self.particoes.get(chave)
+            if particao:
+                self.particoes.move_to_end(chave)
+                self.hits += 1
+                if time.time() - particao["carregada_em"] > self.intervalo and not particao["atualizando"]:
+                    particao["atualizando"] = True
+                    self.pool.submit(self._recarregar, chave)
+                return particao
+            lock_chave = self._carregando.setdefault(chave, threading.Lock())
+        try:
+            with lock_chave:  # duas sessões pedindo a mesma UF baixam uma vez só
+                with self._lock:
+                    particao = self.particoes.get(chave)
+                if particao: return particao
+                with self._lock:
+                    self.misses += 1
+                particao = self._montar(chave)
+                self._guardar(chave, particao)
+        finally:
+            with self._lock:
+                self._carregando.pop(chave, None)
+        return particao
+
+    def particao(self, ufs):
+        """(versão, DataFrame, IndiceFiltros) das UFs selecionadas."""
+        chave = tuple(sorted({str(uf) for uf in ufs}))
+        with self._lock:
+            self.procura.update(chave)
+        particao = self._obter(chave)
+        self.prefetch()
+        return particao["versao"], particao["df"], particao["indice"]
+
+    def prefetch(self):
+        """Carrega em segundo plano as UFs mais procuradas (ou as maiores, antes da primeira procura) que couberem."""
+        with self._lock:
+            populares = [uf for uf, _ in self.procura.most_common(self.qtd_prefetch)]
+        if not populares:
+            facetas, _ = self.remota.indices()
+            maiores = sorted(facetas.ufs().items(), key=lambda i: -i[1])
+            populares = self.ufs_prefetch or [uf for uf, _ in maiores if uf != 'N/A'][:self.qtd_prefetch]
+        with self._lock:
+            if self._uso_mb() > self.limite_mb * 0.8: return
+            for chave in [(uf,) for uf in populares]:
+                if chave in self.particoes or chave in self._carregando or chave in self._agendadas: continue
+                self._agendadas.add(chave)
+                self.pool.submit(self._prefetch, chave)
+
+    def _prefetch(self, chave):
+        try:
+            self._obter(chave)
+        except Exception as e:
+            print(f"Erro no pré-carregamento de {'+'.join(chave)}: {e}")
+        finally:
+            with self._lock:
+                self._agendadas.discard(chave)
+
+    def _uso_mb(self):
+        return sum(p["mb"] for p in self.particoes.values())
+
+    def resumo(self):
+        with self._lock:
+            return (f"{len(self.particoes)} partições, {self._uso_mb():,.1f}/{self.limite_mb} MB, "
+                    f"{self.hits} hits / {self.misses} misses, {self.evictions} despejos")
@@ -0,0 +1,38 @@
+# ==========================================
+# 💲 PREÇOS POR FAIXA DE VOLUME
+# ==========================================
+
+TABELA_PRECOS = [
+    {"limite": 200, "preco": 0.35, "nome": "Iniciante"},
+    {"limite": 1000, "preco": 0.20, "nome": "Profissional"},
+    {"limite": 5000, "preco": 0.10, "nome": "Business"},
+    {"limite": float('inf'), "preco": 0.05, "nome": "Atacado"}
+]
+
+def calcular_preco(qtd):
+    tabela = TABELA_PRECOS
+    faixa_atual = None
+    prox_faixa_info = None
+    for i, faixa in enumerate(tabela):
+        if qtd <= faixa["limite"]:
+            faixa_atual = faixa
+            if i + 1 < len(tabela):
+                proxima = tabela[i+1]
+                prox_faixa_info = {"meta": faixa["limite"] + 1, "preco": proxima["preco"]}
+            break
+    if not faixa_atual: faixa_atual = tabela[-1]
+    
+    preco_unitario = faixa_atual["preco"]
+    valor_total = qtd * preco_unitario
+    valor_ancora = qtd * 0.35
+    pct_economia_total = 0 if preco_unitario >= 0.35 else int(((valor_ancora - valor_total) / valor_ancora) * 100)
+
+    return {
+        "unitario": preco_unitario,
+        "total": valor_total,
+        "total_ancora": valor_ancora,
+        "pct_off": pct_economia_total,
+        "nivel": faixa_atual["nome"],
+        "prox_qtd": prox_faixa_info["meta"] if prox_faixa_info else None,
+        "prox_preco": prox_faixa_info["preco"] if prox_faixa_info else None
+    }
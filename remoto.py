@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+from functools import partial
+import pandas as pd
+from dados import baixar_novos, baixar_tabela, contar_linhas, paginas_tabela, tratar_leads
+from filtros import COLUNAS_FAIXA, COLUNAS_FILTRO, CuboContagens, IndiceFacetas, dobrar, normalizar_filtro, termo_nome
+
+# ==========================================
+# ☁️ MODO REMOTO: FILTRO EXECUTADO NO SUPABASE
+# ==========================================
+# Para bases grandes demais para baixar em cada processo: o filtro vira consulta PostgREST
+# sobre uma tabela já tratada (Segmento, tipo_contato, nota/avaliações numéricas e nome sem
+# acento materializados) e só a amostra e a exportação trazem linhas.
+# SQL (rodar uma vez no Supabase):
+#   create table leads_tratados (
+#     id bigint primary key, nome text, nome_busca text, telefone text, tipo_contato text, "Segmento" text,
+#     categoria_google text, nota double precision, avaliacoes integer, endereco_completo text,
+#     bairro text, cidade text, estado text, site text, data_fmt text);
+#   create index on leads_tratados (estado, cidade, bairro);
+#   create index on leads_tratados ("Segmento", categoria_google);
+#   create extension if not exists pg_trgm;
+#   create index on leads_tratados using gin (nome_busca gin_trgm_ops);
+#   create materialized view leads_cubo as
+#     select estado, cidade, bairro, "Segmento", categoria_google, tipo_contato, site is not null as tem_site,
+#            count(*) as qtd, min(nota) as nota_min, max(nota) as nota_max,
+#            min(avaliacoes) as avaliacoes_min, max(avaliacoes) as avaliacoes_max
+#     from leads_tratados group by 1, 2, 3, 4, 5, 6, 7;
+#   create unique index on leads_cubo (estado, cidade, bairro, "Segmento", categoria_google, tipo_contato, tem_site)
+#     nulls not distinct;
+#   create function atualizar_cubo() returns void language sql security definer as
+#     $$ refresh materialized view concurrently leads_cubo $$;
+# A tabela é alimentada a partir de `leads` com `python remoto.py` (incremental pelo id; --completo refaz tudo),
+# que no fim chama atualizar_cubo(): o cubo é agregado uma vez por sincronização, não a cada página lida.
+
+TABELA_TRATADA = "leads_tratados"
+VIEW_CUBO = "leads_cubo"
+RPC_CUBO = "atualizar_cubo"  # refresh da view materializada
+COLUNAS_TRATADAS = ['id', 'nome', 'nome_busca', 'telefone', 'tipo_contato', 'Segmento', 'categoria_google', 'nota',
+                    'avaliacoes', 'endereco_completo', 'bairro', 'cidade', 'estado', 'site', 'data_fmt']
+COLUNAS_CUBO = ['estado', 'cidade', 'bairro', 'Segmento', 'categoria_google', 'tipo_contato', 'tem_site', 'qtd',
+                'nota_min', 'nota_max', 'avaliacoes_min', 'avaliacoes_max']
+ORDEM_CUBO = "estado,cidade,bairro,Segmento,categoria_google,tipo_contato,tem_site"
+
+def escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def aplicar_filtro(query, filtro):
+    """Acrescenta à consulta PostgREST os predicados do filtro (mesmo formato de filtros.py)."""
+    for col in COLUNAS_FILTRO:
+        if filtro.get(col): query = query.in_(col, sorted({str(v) for v in filtro[col]}))
+    for col in COLUNAS_FAIXA:
+        faixa = filtro.get(col)
+        if not faixa: continue
+        lo, hi = faixa
+        if lo is not None: query = query.gte(col, lo)
+        if hi is not None: query = query.lte(col, hi)
+    if filtro.get('site') is not None:
+        query = query.not_.is_('site', 'null') if filtro['site'] else query.is_('site', 'null')
+    nome = termo_nome(filtro)
+    if nome: query = query.ilike('nome_busca', f"%{escapar_like(nome)}%")
+    return query
+
+class BaseRemota:
+    """Base consultada no Supabase a cada filtro, sem baixar a tabela para o processo.
+
+    Totais vêm de count="exact" (guardados por `ttl` segundos por filtro); amostra e exportação
+    buscam só as linhas do filtro, paginadas. Opções dos filtros e o cubo dos gráficos saem da
+    view materializada, recarregada a cada `intervalo_cubo` segundos (ela mesma só muda quando
+    `sincronizar` roda).
+    """
+
+    def __init__(self, client, tabela=TABELA_TRATADA, view_cubo=VIEW_CUBO, tamanho_pagina=1000, max_workers=8,
+                 ttl=60, intervalo_cubo=300, memo_max=1000):
+        self.client = client
+        self.tabela = tabela
+        self.view_cubo = view_cubo
+        self.tamanho_pagina = tamanho_pagina
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.intervalo_cubo = intervalo_cubo
+        self.memo = OrderedDict()  # (consulta, filtro normalizado) -> (resultado, quando), do menos para o mais recente
+        self.memo_max = memo_max
+        self._lock_memo = threading.Lock()
+        self.facetas = None
+        self.cubo = None
+        self.carregado_em = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def id_versao(self):
+        return f"remoto-{int(self.carregado_em * 1000)}"
+
+    def indices(self):
+        """(IndiceFacetas, CuboContagens) montados a partir da view agregada."""
+        with self._lock:
+            if self.cubo is None or time.time() - self.carregado_em > self.intervalo_cubo:
+                linhas = baixar_tabela(self.client, self.view_cubo, self.tamanho_pagina, self.max_workers, ordem=ORDEM_CUBO)
+                celulas = pd.DataFrame(linhas, columns=COLUNAS_CUBO)
+                self.facetas = IndiceFacetas(celulas, pesos='qtd')
+                self.cubo = CuboContagens(celulas, pesos='qtd')
+                self.carregado_em = time.time()
+        return self.facetas, self.cubo
+
+    def _memorizar(self, tipo, filtro, consultar):
+        # Reruns com o mesmo filtro (digitar o e-mail, trocar o formato) não voltam ao banco por `ttl` segundos
+        chave = (tipo, json.dumps(normalizar_filtro(filtro), sort_keys=True, default=str))
+        with self._lock_memo:
+            item = self.memo.get(chave)
+            if item and time.time() - item[1] < self.ttl:
+                self.memo.move_to_end(chave)
+                return item[0]
+        resultado = consultar()  # fora do lock: uma consulta lenta não segura as outras sessões
+        with self._lock_memo:
+            self.memo[chave] = (resultado, time.time())
+            self.memo.move_to_end(chave)
+            while len(self.memo) > self.memo_max: self.memo.popitem(last=False)
+        return resultado
+
+    def contar(self, filtro):
+        return self._memorizar("contar", filtro,
+                               lambda: contar_linhas(self.client, self.tabela, partial(aplicar_filtro, filtro=filtro)))
+
+    def amostra(self, filtro, n=50):
+        def consultar():
+            res = aplicar_filtro(self.client.table(self.tabela).select("*"), filtro).order("id").limit(n).execute()
+            return pd.DataFrame(res.data, columns=COLUNAS_TRATADAS)
+        return self._memorizar(f"amostra{n}", filtro, consultar)
+
+    def baixar(self, filtro):
+        """Linhas do filtro para a exportação, baixadas enquanto o arquivo é escrito (ver SelecaoRemota)."""
+        return SelecaoRemota(self, filtro)
+
+class SelecaoRemota:
+    """O que os escritores de exportacao.py usam de filtros.Selecao, com as linhas vindo do Supabase.
+
+    `blocos` pede as páginas em paralelo e entrega cada bloco assim que as páginas dele chegam:
+    a exportação nunca junta o filtro inteiro num DataFrame. Tamanho e contagens saem de
+    count="exact" (memorizados na BaseRemota).
+    """
+
+    def __init__(self, remota, filtro):
+        self.remota = remota
+        self.filtro = filtro
+        self.df = pd.DataFrame(columns=COLUNAS_TRATADAS)  # só o esquema, para quem confere as colunas
+
+    def __len__(self):
+        return self.remota.contar(self.filtro)
+
+    def blocos(self, tamanho):
+        remota, pendentes = self.remota, []
+        for pagina in paginas_tabela(remota.client, remota.tabela, remota.tamanho_pagina, remota.max_workers,
+                                     preparar=partial(aplicar_filtro, filtro=self.filtro), total=len(self)):
+            pendentes.extend(pagina)
+            while len(pendentes) >= tamanho:
+                yield pd.DataFrame(pendentes[:tamanho], columns=COLUNAS_TRATADAS)
+                del pendentes[:tamanho]
+        if pendentes: yield pd.DataFrame(pendentes, columns=COLUNAS_TRATADAS)
+
+    def qtd_igual(self, col, valor):
+        # Só colunas de COLUNAS_FILTRO: a contagem é o próprio filtro restrito ao valor
+        if self.filtro.get(col) and str(valor) not in {str(v) for v in self.filtro[col]}: return 0
+        return self.remota.contar({**self.filtro, col: [valor]})
+
+    def qtd_preenchidos(self, col):
+        if col != 'site': raise ValueError(f"sem contagem remota de preenchidos para {col}")
+        if self.filtro.get('site') is False: return 0
+        return self.remota.contar({**self.filtro, 'site': True})
+
+# ==========================================
+# 🔄 SINCRONIZAÇÃO leads -> leads_tratados
+# ==========================================
+
+def tratar_para_remoto(rows):
+    df = tratar_leads(pd.DataFrame(rows))
+    if df.empty: return pd.DataFrame(columns=COLUNAS_TRATADAS)
+    df['nome_busca'] = [dobrar(str(n)) if n is not None else "" for n in df['nome']]
+    return df.reindex(columns=COLUNAS_TRATADAS)
+
+def sincronizar(client, origem="leads", destino=TABELA_TRATADA, completo=False, tamanho_pagina=1000, lote=500):
+    """Trata as linhas novas de `origem` (ou todas, se `completo`), grava em `destino` e atualiza o cubo."""
+    marca = None
+    if not completo:
+        res = client.table(destino).select("id").order("id", desc=True).limit(1).execute()
+        marca = res.data[0]['id'] if res.data else None
+    rows = baixar_novos(client, origem, "id", marca, tamanho_pagina) if marca is not None \
+        else baixar_tabela(client, origem, tamanho_pagina)
+    df = tratar_para_remoto(rows)
+    registros = df.astype(object).where(df.notna(), None).to_dict('records')
+    for i in range(0, len(registros), lote):
+        client.table(destino).upsert(registros[i:i + lote]).execute()
+    if registros or completo:
+        client.rpc(RPC_CUBO).execute()  # refresh concurrently: quem lê o cubo continua lendo a versão anterior
+    print(f"🔄 {destino}: {len(registros):,} de {len(rows):,} linhas sincronizadas")
+    return len(registros)
+
+if __name__ == "__main__":
+    # python remoto.py [--completo]   (usa SUPABASE_URL / SUPABASE_KEY)
+    from supabase import create_client
+    sincronizar(create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"]), completo="--completo" in sys.argv)
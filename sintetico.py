@@ -0,0 +1,161 @@
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 🎲 LEADS SINTÉTICOS (PARA BENCHMARK E TESTES LOCAIS)
+# ==========================================
+# Gera linhas no formato cru da tabela `leads` do Supabase (antes de tratar_leads): telefones em
+# vários formatos, nota com vírgula, avaliações com ponto de milhar, cidades e categorias com
+# distribuição concentrada (poucas cidades/nichos com muitos leads). Mesma semente, mesmos dados.
+
+# UF -> (peso aproximado de empresas, DDDs, capital)
+UFS = {
+    'SP': (22.0, [11, 12, 13, 14, 15, 16, 17, 18, 19], 'São Paulo'), 'MG': (10.0, [31, 32, 33, 34, 35, 37, 38], 'Belo Horizonte'),
+    'RJ': (8.0, [21, 22, 24], 'Rio de Janeiro'), 'BA': (6.5, [71, 73, 74, 75, 77], 'Salvador'),
+    'PR': (6.0, [41, 42, 43, 44, 45, 46], 'Curitiba'), 'RS': (6.0, [51, 53, 54, 55], 'Porto Alegre'),
+    'PE': (4.5, [81, 87], 'Recife'), 'CE': (4.0, [85, 88], 'Fortaleza'), 'SC': (4.0, [47, 48, 49], 'Florianópolis'),
+    'GO': (3.5, [62, 64], 'Goiânia'), 'PA': (3.0, [91, 93, 94], 'Belém'), 'MA': (2.5, [98, 99], 'São Luís'),
+    'ES': (2.0, [27, 28], 'Vitória'), 'DF': (2.0, [61], 'Brasília'), 'AM': (1.8, [92, 97], 'Manaus'),
+    'PB': (1.8, [83], 'João Pessoa'), 'RN': (1.6, [84], 'Natal'), 'MT': (1.6, [65, 66], 'Cuiabá'),
+    'AL': (1.4, [82], 'Maceió'), 'PI': (1.4, [86, 89], 'Teresina'), 'MS': (1.3, [67], 'Campo Grande'),
+    'SE': (1.0, [79], 'Aracaju'), 'RO': (0.8, [69], 'Porto Velho'), 'TO': (0.7, [63], 'Palmas'),
+    'AC': (0.4, [68], 'Rio Branco'), 'AP': (0.4, [96], 'Macapá'), 'RR': (0.3, [95], 'Boa Vista'),
+}
+PREFIXOS_CIDADE = ['São', 'Santa', 'Santo', 'Nova', 'Porto', 'Campo', 'Vila', 'Barra', 'Serra', 'Rio', 'Lagoa', 'Monte']
+SUFIXOS_CIDADE = ['Alegre', 'Verde', 'do Sul', 'do Norte', 'Bonito', 'Grande', 'da Serra', 'Formosa', 'Nova', 'das Flores',
+                  'do Oeste', 'Azul', 'Branco', 'Dourado', 'Feliz', 'Esperança']
+BAIRROS = ['Centro', 'Jardim América', 'Vila Nova', 'Boa Vista', 'Santa Cruz', 'São José', 'Industrial', 'Jardim Europa',
+           'Vila Mariana', 'Planalto', 'Cidade Nova', 'Bela Vista', 'Parque São Jorge', 'Jardim Paulista', 'Alvorada',
+           'Santo Antônio', 'Vila Operária', 'Liberdade', 'Aeroporto', 'Morumbi']
+CATEGORIAS = ['Restaurante', 'Loja de roupas', 'Pizzaria', 'Salão de beleza', 'Academia', 'Oficina mecânica', 'Padaria',
+              'Dentista', 'Lanchonete', 'Advogado', 'Imobiliária', 'Farmácia', 'Pet shop', 'Clínica médica',
+              'Hamburgueria', 'Escritório de contabilidade', 'Loja de materiais de construção', 'Auto peças',
+              'Supermercado', 'Loja de suplementos', 'Barbearia', 'Construtora', 'Mercado de produtos naturais',
+              'Lava-jato', 'Escola de idiomas', 'Hotel', 'Ótica', 'Papelaria', 'Floricultura', 'Engenharia civil',
+              'Hospital', 'Loja de celulares', 'Moda feminina', 'Varejo de calçados', 'Sorveteria']
+NOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Costa', 'Rodrigues', 'Almeida',
+         'Nascimento', 'Araújo', 'Gonçalves', 'Ribeiro', 'Carvalho', 'Gomes', 'Martins', 'Rocha', 'Barbosa', 'Conceição',
+         'São João', 'Estrela', 'Primavera', 'Bom Jesus', 'Vitória', 'Real', 'Center', 'Express', 'Top', 'Mania']
+TIPOS_NOME = ['Bar do', 'Casa', 'Grupo', 'Auto', 'Espaço', 'Studio', 'Mercadinho', 'Clínica', 'Ateliê', 'Empório',
+              'Distribuidora', 'Comercial', 'Padaria', 'Pizzaria', 'Escritório']
+
+def _zipf(rng, n, qtd, a=1.2):
+    """Índices em [0, qtd) com poucos valores concentrando a maioria das linhas."""
+    pesos = 1.0 / np.arange(1, qtd + 1) ** a
+    return rng.choice(qtd, n, p=pesos / pesos.sum())
+
+def _cidades_por_uf(rng, qtd=60):
+    cidades = {}
+    for uf, (_, _, capital) in UFS.items():
+        nomes = [capital]
+        while len(nomes) < qtd:
+            nome = f"{rng.choice(PREFIXOS_CIDADE)} {rng.choice(SUFIXOS_CIDADE)}"
+            if nome not in nomes: nomes.append(nome)
+        cidades[uf] = nomes
+    return cidades
+
+def _telefones(rng, n, ddd):
+    """Telefones crus nos formatos que aparecem no Google Maps (e alguns inválidos)."""
+    celular = rng.random(n) < 0.62
+    meio = rng.integers(0, 10000, n)
+    fim = rng.integers(0, 10000, n)
+    pre_fixo = rng.integers(2000, 6000, n)
+    formato = rng.choice(12, n, p=[.30, .14, .12, .08, .16, .06, .04, .03, .02, .02, .02, .01])
+    saida = []
+    for d, cel, m, f, pf, fmt in zip(ddd.tolist(), celular.tolist(), meio.tolist(), fim.tolist(), pre_fixo.tolist(), formato.tolist()):
+        num = f"9{m:04d}{f:04d}" if cel else f"{pf:04d}{f:04d}"
+        a, b = num[:-4], num[-4:]
+        if fmt == 0: saida.append(f"({d}) {a}-{b}")
+        elif fmt == 1: saida.append(f"+55 {d} {a}-{b}")
+        elif fmt == 2: saida.append(f"{d}{num}")
+        elif fmt == 3: saida.append(f"55{d}{num}")
+        elif fmt == 4: saida.append(f"+55 ({d}) {a[:1]} {a[1:]}-{b}" if cel else f"({d}) {a}-{b}")
+        elif fmt == 5: saida.append(f"0{d} {a}-{b}")
+        elif fmt == 6: saida.append(f"0800 {m % 1000:03d} {f:04d}")
+        elif fmt == 7: saida.append(f"{a}-{b}")  # sem DDD
+        elif fmt == 8: saida.append("")
+        elif fmt == 9: saida.append(None)
+        elif fmt == 10: saida.append(f"+55 0{d} {a}-{b}")
+        else: saida.append(f"({d}) {a}-{b} ramal {m % 100}")
+    return saida
+
+def gerar_leads(n, semente=42, inicio_id=1):
+    """DataFrame com `n` leads crus (colunas object, como vêm do Supabase)."""
+    rng = np.random.default_rng(semente)
+    ufs = list(UFS)
+    pesos_uf = np.array([UFS[u][0] for u in ufs])
+    uf_idx = rng.choice(len(ufs), n, p=pesos_uf / pesos_uf.sum())
+    cidades = _cidades_por_uf(rng)
+    cid_idx = _zipf(rng, n, 60, 1.1)
+    bai_idx = _zipf(rng, n, len(BAIRROS), 0.9)
+    cat_idx = _zipf(rng, n, len(CATEGORIAS), 0.8)
+
+    estado = np.array(ufs, dtype=object)[uf_idx]
+    cidade = np.array([cidades[u][c] for u, c in zip(estado, cid_idx.tolist())], dtype=object)
+    bairro = np.array(BAIRROS, dtype=object)[bai_idx]
+    bairro[rng.random(n) < 0.07] = None
+    estado_col = estado.copy()
+    estado_col[rng.random(n) < 0.01] = None
+    categoria = np.array(CATEGORIAS, dtype=object)[cat_idx]
+    categoria[rng.random(n) < 0.03] = None
+
+    ddds = np.array([rng.choice(UFS[u][1]) for u in ufs])[uf_idx]
+    telefone = _telefones(rng, n, ddds)
+
+    # Nota: maioria entre 4 e 5, com vírgula; parte vazia ou com ponto
+    nota_num = np.clip(np.round(rng.normal(4.3, 0.5, n), 1), 1.0, 5.0)
+    sem_nota = rng.random(n) < 0.12
+    com_ponto = rng.random(n) < 0.05
+    nota = [None if s else (f"{v:.1f}" if p else f"{v:.1f}".replace(".", ",")) for v, s, p in zip(nota_num.tolist(), sem_nota.tolist(), com_ponto.tolist())]
+    nota = [v if v is None or i % 97 else "" for i, v in enumerate(nota)]
+
+    aval_num = np.floor(rng.lognormal(3.2, 1.5, n)).astype(np.int64)
+    aval_num[sem_nota] = 0
+    avaliacoes = [None if a == 0 and s else f"{a:,}".replace(",", ".") for a, s in zip(aval_num.tolist(), sem_nota.tolist())]
+
+    nome_idx = rng.integers(0, len(NOMES), n)
+    tipo_idx = rng.integers(0, len(TIPOS_NOME), n)
+    nome = [f"{TIPOS_NOME[t]} {NOMES[s]}" + (f" {i % 1000}" if i % 3 == 0 else "") for i, (t, s) in enumerate(zip(tipo_idx.tolist(), nome_idx.tolist()))]
+    tem_site = rng.random(n) < 0.35
+    site = [f"https://www.{NOMES[s].lower().replace(' ', '')}{i}.com.br" if t else None for i, (s, t) in enumerate(zip(nome_idx.tolist(), tem_site.tolist()))]
+    endereco = [f"Rua {NOMES[s]}, {num} - {b or 'Centro'}, {c} - {u}" for s, num, b, c, u in
+                zip(rng.integers(0, len(NOMES), n).tolist(), rng.integers(1, 3000, n).tolist(), bairro, cidade, estado)]
+    base = datetime(2025, 1, 1)
+    dias = rng.integers(0, 120, n)
+    data_extracao = [(base + timedelta(days=int(d), seconds=int(s))).isoformat() for d, s in zip(dias, rng.integers(0, 86400, n))]
+
+    return pd.DataFrame({
+        'id': np.arange(inicio_id, inicio_id + n),
+        'nome': nome,
+        'telefone': telefone,
+        'nota': nota,
+        'avaliacoes': avaliacoes,
+        'categoria_google': categoria,
+        'endereco_completo': endereco,
+        'bairro': bairro,
+        'cidade': cidade,
+        'estado': estado_col,
+        'site': site,
+        'data_extracao': data_extracao,
+    })
+
+def gerar_registros(n, semente=42, inicio_id=1):
+    """Mesmos dados de gerar_leads como lista de dicts (o que o Supabase devolve)."""
+    df = gerar_leads(n, semente, inicio_id)
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def interpretar_tamanho(texto):
+    """"10k" -> 10000, "1.5M" -> 1500000 (tamanhos na linha de comando do benchmark e da carga)."""
+    texto = texto.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(texto[-1], 1)
+    return int(float(texto.rstrip("km")) * mult)
+
+if __name__ == "__main__":
+    # python sintetico.py [linhas, ex.: 10k] [arquivo.parquet|.csv]
+    linhas = interpretar_tamanho(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    destino = sys.argv[2] if len(sys.argv) > 2 else f"leads_{linhas}.parquet"
+    df = gerar_leads(linhas)
+    df.to_parquet(destino, index=False) if destino.endswith(".parquet") else df.to_csv(destino, index=False)
+    print(f"🎲 {linhas:,} leads sintéticos em {destino}")
@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+
+# Os módulos do app ficam na raiz do repositório (sem pacote)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Filtros típicos da tela (mesmo formato de filtros.py), de só categóricos a nome + faixas
+FILTROS = [
+    {},
+    {"tipo_contato": ["Celular"]},
+    {"tipo_contato": ["Celular"], "estado": ["SP"]},
+    {"estado": ["SP", "RJ", "MG"], "Segmento": ["Alimentação"], "site": False},
+    {"estado": ["PR"], "cidade": ["Curitiba"], "site": True},
+    {"Segmento": ["Automotivo", "Clínicas & Saúde"], "nota": (4.5, 5.0)},
+    {"tipo_contato": ["Fixo"], "avaliacoes": (100, None)},
+    {"nome": "silva"},
+    {"nome": "pizzaria", "estado": ["SP"]},
+    {"nome": "  PÃO ", "tipo_contato": ["Celular"]},
+    {"nome": "   ", "estado": ["SP"]},
+    {"estado": ["XX"], "cidade": ["Nenhuma"]},
+]
+
+@pytest.fixture(scope="session")
+def base_tratada():
+    from dados import compactar_leads, tratar_leads
+    from sintetico import gerar_leads
+    return compactar_leads(tratar_leads(gerar_leads(30_000, semente=11))).reset_index(drop=True)
@@ -0,0 +1,68 @@
+import threading
+import pandas as pd
+import pytest
+import fake_supabase as fk
+from clientes import criar_supabase
+from dados import BaseLeads, COLUNAS_CATEGORICAS, anexar_leads, compactar_leads, tratar_leads
+from sintetico import gerar_leads, gerar_registros
+
+# ==========================================
+# 🔄 DELTA EM SEGUNDO PLANO E TROCA ATÔMICA DA BASE
+# ==========================================
+
+@pytest.fixture
+def banco():
+    banco = fk.BancoFalso({"leads": gerar_registros(3_000, semente=21)})
+    servidor, url = fk.iniciar(banco)
+    banco.client = criar_supabase(url, "teste" * 10)
+    yield banco
+    servidor.shutdown()
+
+def test_anexar_igual_a_compactar_tudo():
+    antigos, novos = gerar_leads(4_000, semente=1), gerar_leads(500, semente=2, inicio_id=10_000)
+    base = compactar_leads(tratar_leads(antigos))
+    original = base.copy()
+    junto = anexar_leads(base, tratar_leads(novos))
+    esperado = compactar_leads(pd.concat([tratar_leads(antigos), tratar_leads(novos)], ignore_index=True))
+    pd.testing.assert_frame_equal(junto.astype(object), esperado.astype(object))
+    assert all(isinstance(junto[c].dtype, pd.CategoricalDtype) for c in COLUNAS_CATEGORICAS if c in junto.columns)
+    pd.testing.assert_frame_equal(base, original)  # a base servida não muda
+
+def test_delta_nao_bloqueia_e_troca_de_uma_vez(banco):
+    base = BaseLeads(banco.client, "leads", tamanho_pagina=500, max_workers=2)
+    versao, id_versao, df = base.obter(intervalo_delta=300)
+    banco.inserir("leads", gerar_registros(400, semente=22, inicio_id=50_000))
+
+    liberar = threading.Event()
+    baixar = base.client.table
+    def lento(nome):  # o delta fica parado no download até o teste liberar
+        liberar.wait(10)
+        return baixar(nome)
+    base.client.table = lento
+    base.ultimo_delta = 0.0
+    # Com o delta em andamento, quem pede a base recebe a anterior na hora
+    assert base.obter(intervalo_delta=300) == (versao, id_versao, df)
+    assert base.obter(intervalo_delta=300)[2] is df
+    liberar.set()
+    base.aguardar(10)
+    base.client.table = baixar
+
+    nova_versao, novo_id, novo_df = base.obter(intervalo_delta=300)
+    assert nova_versao == versao + 1 and novo_id != id_versao and len(novo_df) > len(df)
+    esperado = compactar_leads(tratar_leads(pd.DataFrame(banco.tabelas["leads"])))
+    assert sorted(novo_df["id"]) == sorted(esperado["id"])
+    assert isinstance(novo_df["cidade"].dtype, pd.CategoricalDtype)
+
+def test_falha_no_delta_nao_derruba_nem_repete_a_cada_pedido(banco):
+    base = BaseLeads(banco.client, "leads", tamanho_pagina=500, max_workers=2)
+    versao, _, df = base.obter()
+    chamadas = []
+    def quebrado(nome):
+        chamadas.append(nome)
+        raise ConnectionError("sem rede")
+    base.client.table = quebrado
+    base.ultimo_delta = 0.0
+    for _ in range(3):
+        assert base.obter(intervalo_delta=1e-9)[2] is df
+        base.aguardar(10)
+    assert len(chamadas) == 1 and base.versao == versao
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dados import classificar_categorias, classificar_telefone_global, classificar_telefones, normalizar_categoria
+from sintetico import gerar_leads
+
+# ==========================================
+# 🧪 PARIDADE: CLASSIFICAÇÃO VETORIZADA x POR LINHA
+# ==========================================
+
+TELEFONES_BORDA = [
+    None, "", " ", np.nan, 0, 11987654321, "()", "-", "9", "11", "119876",
+    "(11) 98765-4321", "(11) 3456-7890", "11 9 8765 4321", "+55 11 98765-4321", "+55 (11) 3456-7890",
+    "55 11 98765-4321 ramal 2", "+55 01 98765-4321", "550119876543", "0800 123 4567", "(011) 98765-4321",
+    "11987654321999", "5511987654321", "551134567890", "55119876543", "1198765432", "1098765432",
+    "abc", "tel: 11 98765-4321", "(1１) 98765-4321", "١١٩٨٧٦٥٤٣٢١", "Telefone (11) 98765-4321 / (11) 3456-7890 / whats",
+]
+
+CATEGORIAS_BORDA = [
+    None, "", np.nan, "Pizzaria", "PIZZARIA", "Loja de roupas", "Clínica médica", "Auto peças",
+    "Escritório de advocacia", "Imobiliária", "Categoria desconhecida", "   ", 42, "Lei & Ordem", "Academia fit",
+]
+
+def _por_linha(serie, funcao):
+    return serie.apply(funcao)
+
+@pytest.fixture(scope="module")
+def leads():
+    return gerar_leads(200_000, semente=7)
+
+def test_telefones_sinteticos(leads):
+    pd.testing.assert_series_equal(classificar_telefones(leads["telefone"]), _por_linha(leads["telefone"], classificar_telefone_global),
+                                   check_names=False, check_dtype=False)
+
+def test_categorias_sinteticas(leads):
+    pd.testing.assert_series_equal(classificar_categorias(leads["categoria_google"]),
+                                   _por_linha(leads["categoria_google"], normalizar_categoria), check_names=False, check_dtype=False)
+
+@pytest.mark.parametrize("valores", [TELEFONES_BORDA, TELEFONES_BORDA[::-1] * 50])
+def test_telefones_borda(valores):
+    serie = pd.Series(valores, dtype=object, index=np.arange(len(valores)) * 3)  # índice não contíguo
+    assert classificar_telefones(serie).tolist() == _por_linha(serie, classificar_telefone_global).tolist()
+    assert classificar_telefones(serie).index.equals(serie.index)
+
+def test_categorias_borda():
+    serie = pd.Series(CATEGORIAS_BORDA * 3, dtype=object)
+    assert classificar_categorias(serie).tolist() == _por_linha(serie, normalizar_categoria).tolist()
+
+def test_series_vazias():
+    vazia = pd.Series([], dtype=object)
+    assert classificar_telefones(vazia).tolist() == []
+    assert classificar_categorias(vazia).tolist() == []
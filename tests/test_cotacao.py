@@ -0,0 +1,61 @@
+import json
+import urllib.error
+import urllib.request
+import pytest
+from conftest import FILTROS
+from cotacao import FonteCotacao, servir
+from filtros import IndiceFiltros
+from precos import calcular_preco
+
+# ==========================================
+# 🧮 COTAÇÃO EM LOTE (COTADOR E ENDPOINT HTTP)
+# ==========================================
+
+@pytest.fixture(scope="module")
+def fonte(base_tratada):
+    return FonteCotacao(lambda: ("v1", base_tratada))
+
+@pytest.fixture(scope="module")
+def url(fonte):
+    servidor, url = servir(fonte, porta=0)
+    yield url
+    servidor.shutdown()
+
+def post(url, corpo, caminho="/cotacao"):
+    req = urllib.request.Request(url + caminho, json.dumps(corpo).encode(), method="POST")
+    try:
+        with urllib.request.urlopen(req) as resposta:
+            return resposta.status, resposta.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+def test_quantidades_batem_com_o_indice(base_tratada, fonte):
+    indice = IndiceFiltros(base_tratada)
+    for linha, filtro in zip(fonte.obter().cotar(FILTROS), FILTROS):
+        qtd = len(indice.filtrar(filtro))
+        assert linha["qtd"] == qtd, filtro
+        assert linha["total"] == round(calcular_preco(qtd)["total"], 2)
+
+def test_grade_cobre_a_fatia(fonte):
+    cotador = fonte.obter()
+    filtro = {"estado": ["SP"], "tipo_contato": ["Celular"]}
+    linhas = cotador.cotar(cotador.grade(["Segmento"], filtro))
+    assert sum(l["qtd"] for l in linhas) == cotador.quantidade(filtro)
+
+def test_endpoint_json_e_csv(url):
+    status, corpo = post(url, [{"estado": ["SP"], "rotulo": "sp"}, {"nome": "pizza", "nota": [4, None]}])
+    assert status == 200 and [l["rotulo"] for l in json.loads(corpo)] == ["sp", "2"]
+    status, corpo = post(url, {"grade": ["estado"], "filtro": {"tipo_contato": ["Celular"]}}, "/cotacao?formato=csv")
+    assert status == 200 and corpo.splitlines()[0].startswith("rotulo,qtd")
+
+@pytest.mark.parametrize("corpo", [
+    [{"foo": 1}], [{"nome": 5}], [{"estado": [1]}], [{"estado": {"SP": 1}}], [{"nota": [4]}], [{"nota": [4, "5"]}],
+    [{"nota": [True, 5]}], [{"site": "sim"}], 5, "x", [1], {"specs": 3}, {"grade": ["site"]},
+    {"grade": ["estado"], "filtro": {"cidade": 3}},
+], ids=str)
+def test_spec_invalida_responde_400(url, corpo):
+    status, texto = post(url, corpo)
+    assert status == 400 and json.loads(texto)["erro"]
+
+def test_rota_desconhecida(url):
+    assert post(url, [], "/outra")[0] == 404
@@ -0,0 +1,37 @@
+import pytest
+from conftest import FILTROS
+from exportacao import chave_exportacao
+from filtros import CuboContagens, IndiceFiltros, Selecao, normalizar_filtro
+
+# ==========================================
+# 🧪 CUBO DE CONTAGENS x ÍNDICE DE FILTROS
+# ==========================================
+
+@pytest.fixture(scope="module")
+def indice(base_tratada):
+    return IndiceFiltros(base_tratada)
+
+@pytest.fixture(scope="module")
+def cubo(base_tratada):
+    return CuboContagens(base_tratada)
+
+@pytest.mark.parametrize("filtro", FILTROS, ids=str)
+def test_total_e_contagens_do_cubo_batem_com_o_indice(base_tratada, indice, cubo, filtro):
+    if not cubo.atende(filtro): pytest.skip("filtro com nome ou faixa vai para o índice")
+    selecao = Selecao(base_tratada, indice.filtrar(filtro))
+    assert cubo.total(filtro) == len(selecao)
+    for col in ('cidade', 'bairro', 'Segmento'):
+        assert cubo.contar(col, filtro).to_dict() == selecao.contar(col).to_dict()
+
+def test_nome_so_com_espacos_e_sem_busca(base_tratada, indice, cubo):
+    # O cubo cota a fatia e o índice exporta: os dois têm de enxergar a mesma coisa
+    filtro = {"nome": "   ", "estado": ["SP"]}
+    assert cubo.atende(filtro)
+    assert cubo.total(filtro) == len(indice.filtrar(filtro)) == len(indice.filtrar({"estado": ["SP"]}))
+
+def test_mesma_chave_mesmas_linhas(indice):
+    variantes = ["silva", " silva", "silva ", "  SILVA  "]
+    assert len({chave_exportacao({"nome": v}, "v1", "xlsx") for v in variantes}) == 1
+    linhas = [indice.filtrar({"nome": v}).tolist() for v in variantes]
+    assert all(l == linhas[0] for l in linhas) and linhas[0]
+    assert normalizar_filtro({"nome": "  "}) == {}
@@ -0,0 +1,154 @@
+import socket
+import smtplib
+import threading
+from datetime import datetime, timedelta, timezone
+import pytest
+from aiosmtpd.controller import Controller
+import fake_supabase as fk
+from clientes import criar_supabase
+from disparo_email import Disparador, PoolSMTP, latencia_pagamento, processar_pendentes, recuperar_sem_arquivo
+
+# ==========================================
+# 🧪 ROBÔ DE E-MAIL CONTRA UM SMTP LOCAL (aiosmtpd)
+# ==========================================
+
+class Caixa:
+    """Guarda as mensagens recebidas; recusa (550) destinatários que começam com "recusado"."""
+
+    def __init__(self):
+        self.recebidas = []
+        self.rcpts = 0
+        self._lock = threading.Lock()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        with self._lock:
+            self.rcpts += 1
+        if address.startswith("recusado"): return "550 5.1.1 caixa inexistente"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.recebidas.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+def porta_livre():
+    # O Controller do aiosmtpd precisa saber a porta antes de subir (ele se conecta nela para confirmar)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class ServidorSMTP:
+    def __init__(self, caixa):
+        self.caixa = caixa
+        self.porta = porta_livre()
+        self.controller = Controller(caixa, hostname="127.0.0.1", port=self.porta)
+        self.controller.start()
+
+    def reiniciar(self):
+        # Um Controller parado não sobe de novo: outro na mesma porta derruba as conexões abertas
+        self.controller.stop()
+        self.controller = Controller(self.caixa, hostname="127.0.0.1", port=self.porta)
+        self.controller.start()
+
+    def pool(self):
+        return PoolSMTP("127.0.0.1", self.porta, ssl=False, tamanho=2, timeout=5)
+
+@pytest.fixture
+def smtp():
+    servidor = ServidorSMTP(Caixa())
+    yield servidor
+    servidor.controller.stop()
+
+def test_envia_e_reaproveita_conexao(smtp):
+    disparador = Disparador(smtp.pool(), "robo@diskleads.test", max_workers=2, por_minuto=0)
+    futuros = [disparador.enviar(f"cliente{i}@exemplo.test", "http://arquivo", f"R{i}") for i in range(10)]
+    for futuro in futuros: futuro.result(timeout=10)
+    disparador.fechar()
+    assert sorted(smtp.caixa.recebidas) == sorted(f"cliente{i}@exemplo.test" for i in range(10))
+    assert disparador.pool.conexoes_abertas <= 2
+
+def test_recusa_permanente_nao_reconecta(smtp):
+    pool = smtp.pool()
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.enviar("robo@diskleads.test", "recusado@exemplo.test", "Subject: x\r\n\r\nx")
+    # Uma tentativa só, e a conexão (ainda boa) volta para o pool
+    assert smtp.caixa.rcpts == 1
+    assert pool.conexoes_abertas == 1
+    pool.enviar("robo@diskleads.test", "ok@exemplo.test", "Subject: x\r\n\r\nx")
+    assert pool.conexoes_abertas == 1
+    assert smtp.caixa.recebidas == ["ok@exemplo.test"]
+    pool.fechar()
+
+def test_reconecta_quando_o_servidor_derruba(smtp):
+    pool = smtp.pool()
+    pool.enviar("robo@diskleads.test", "a@exemplo.test", "Subject: x\r\n\r\nx")
+    smtp.reiniciar()  # a conexão guardada no pool morreu
+    pool.enviar("robo@diskleads.test", "b@exemplo.test", "Subject: x\r\n\r\nx")
+    assert smtp.caixa.recebidas == ["a@exemplo.test", "b@exemplo.test"]
+    assert pool.conexoes_abertas == 2
+    pool.fechar()
+
+@pytest.mark.parametrize("marco", [
+    "2026-01-01T12:00:00", "2026-01-01T12:00:00.123456", "2026-01-01T12:00:00Z", "2026-01-01T09:00:00-03:00",
+])
+def test_latencia_pagamento_com_e_sem_fuso(marco):
+    esperado = (datetime.now(timezone.utc) - datetime(2026, 1, 1, 12, tzinfo=timezone.utc)).total_seconds()
+    assert latencia_pagamento({"created_at": marco}) == pytest.approx(esperado, abs=5)
+
+def test_latencia_pagamento_sem_marco():
+    assert latencia_pagamento({}) is None
+    assert latencia_pagamento({"pago_em": "ontem"}) is None
+
+def test_lote_marcado_como_enviado(smtp):
+    pago = (datetime.now(timezone.utc) - timedelta(minutes=1)).replace(tzinfo=None).isoformat()
+    vendas = [{"id": i, "external_reference": f"R{i}", "status": "pago", "enviado": False, "url_arquivo": "http://arquivo",
+               "email_cliente": ("recusado" if i == 2 else f"cliente{i}") + "@exemplo.test", "created_at": pago,
+               "claimed_by": None, "claimed_until": None} for i in range(1, 5)]
+    banco = fk.BancoFalso({"vendas": vendas})
+    servidor, url = fk.iniciar(banco)
+    disparador = Disparador(smtp.pool(), "robo@diskleads.test", max_workers=2, por_minuto=0)
+    try:
+        assert processar_pendentes(criar_supabase(url, "teste" * 10), disparador, worker="teste") == 4
+    finally:
+        disparador.fechar()
+        servidor.shutdown()
+    # created_at sem fuso não derruba o lote; a venda recusada fica para a reserva expirar
+    assert {v["id"]: v["enviado"] for v in banco.tabelas["vendas"]} == {1: True, 2: False, 3: True, 4: True}
+    assert [ref for ref, total in disparador.latencias_pagamento] and all(
+        50 < total < 600 for _, total in disparador.latencias_pagamento)
+
+def test_vendas_pagas_sem_arquivo():
+    antiga = (datetime.now(timezone.utc) - timedelta(minutes=30)).isoformat()
+    recente = datetime.now(timezone.utc).isoformat()
+    base = {"status": "pago", "enviado": False, "url_arquivo": None, "email_cliente": "c@exemplo.test"}
+    vendas = [
+        {**base, "id": 1, "external_reference": "R1", "arquivo": "cache/publicado.xlsx", "created_at": antiga},
+        {**base, "id": 2, "external_reference": "R2", "arquivo": "cache/perdido.xlsx", "created_at": antiga},
+        {**base, "id": 3, "external_reference": "R3", "arquivo": "cache/publicado.xlsx", "created_at": recente},
+        {**base, "id": 4, "external_reference": "R4", "arquivo": "cache/publicado.xlsx", "created_at": antiga, "status": "pendente"},
+    ]
+    banco = fk.BancoFalso({"vendas": vendas})
+    banco.guardar_arquivo("leads_pedidos", "cache/publicado.xlsx", b"x", "application/octet-stream")
+    servidor, url = fk.iniciar(banco)
+    try:
+        supabase = criar_supabase(url, "teste" * 10)
+        assert recuperar_sem_arquivo(supabase, minutos=10) == 1
+        assert recuperar_sem_arquivo(supabase, minutos=10) == 0  # a sem arquivo fica marcada e não volta
+    finally:
+        servidor.shutdown()
+    por_id = {v["id"]: v for v in banco.tabelas["vendas"]}
+    assert por_id[1]["url_arquivo"].endswith("/leads_pedidos/cache/publicado.xlsx") and not por_id[1].get("alerta")
+    assert por_id[2]["url_arquivo"] is None and por_id[2]["alerta"] == "sem_arquivo"
+    assert por_id[3]["url_arquivo"] is None and not por_id[3].get("alerta")
+    assert por_id[4]["url_arquivo"] is None and not por_id[4].get("alerta")
+
+def test_latencia_conta_do_pagamento_e_nao_do_checkout():
+    # Checkout há uma hora, pagamento agora: o trigger (aqui, o BancoFalso.aprovar) grava pago_em
+    criada = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    banco = fk.BancoFalso({"vendas": [{"id": 1, "external_reference": "R1", "status": "pendente", "created_at": criada}]})
+    banco.aprovar("R1")
+    pago_em = banco.tabelas["vendas"][0]["pago_em"]
+    banco.aprovar("R1")  # webhook repetido não move o marco
+    assert banco.tabelas["vendas"][0]["pago_em"] == pago_em
+    assert latencia_pagamento(banco.tabelas["vendas"][0]) < 60
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import pytest
+from exportacao import CacheExportacoes, chave_exportacao
+
+# ==========================================
+# 🗃️ CACHE DE EXPORTAÇÕES: DESPEJO E ARQUIVOS FIXADOS
+# ==========================================
+
+def temporario(tamanho=600):
+    fd, caminho = tempfile.mkstemp(suffix=".csv.gz")
+    with os.fdopen(fd, "wb") as arquivo:
+        arquivo.write(b"x" * tamanho)
+    return caminho
+
+@pytest.fixture
+def cache(tmp_path):
+    # Cabem só dois arquivos de 600 bytes
+    return CacheExportacoes(str(tmp_path), limite_mb=1300 / 1024 ** 2)
+
+def test_despeja_o_menos_recente(cache):
+    for chave in "abc": cache.gerar(chave, "csv.gz", temporario)
+    assert list(cache.arquivos) == ["b", "c"] and cache.evictions == 1
+    assert cache.obter("b")  # "b" volta a ser o mais recente
+    cache.gerar("d", "csv.gz", temporario)
+    assert list(cache.arquivos) == ["b", "d"]
+
+def test_fixado_nao_e_despejado_ate_soltar(cache):
+    with cache.usar("a", "csv.gz", temporario) as caminho:
+        for chave in "bcd": cache.gerar(chave, "csv.gz", temporario)
+        assert os.path.exists(caminho) and "a" in cache.arquivos
+    cache.gerar("e", "csv.gz", temporario)
+    assert "a" not in cache.arquivos and not os.path.exists(caminho)
+
+def test_recem_gerado_sobrevive_ao_proprio_despejo(cache):
+    cache.gerar("a", "csv.gz", lambda: temporario(2000))  # sozinho já passa do limite
+    assert cache.obter("a")
+
+def test_gera_uma_vez_por_chave(cache):
+    chamadas = []
+    def gerar():
+        chamadas.append(1)
+        return temporario()
+    for _ in range(3): cache.gerar("a", "csv.gz", gerar)
+    assert len(chamadas) == 1 and cache.hits == 2 and cache.misses == 1
+
+def test_reaproveita_arquivos_de_execucao_anterior(cache):
+    cache.gerar("a", "csv.gz", temporario)
+    assert list(CacheExportacoes(cache.pasta, limite_mb=1).arquivos) == ["a"]
+
+def test_chave_ignora_espacos_e_acentos_do_nome():
+    chave = chave_exportacao({"nome": "silva", "estado": ["SP"]}, 1, "xlsx")
+    assert chave == chave_exportacao({"nome": "  SÍLVA ", "estado": ["SP"]}, 1, "xlsx")
+    assert chave != chave_exportacao({"nome": "silva", "estado": ["SP"]}, 2, "xlsx")
+    assert chave_exportacao({"nome": "  "}, 1, "xlsx") == chave_exportacao({}, 1, "xlsx")
@@ -0,0 +1,48 @@
+from functools import partial
+import pandas as pd
+import pytest
+from exportacao import COLUNAS_EXPORT, FORMATOS, exportar, links_whatsapp, montar_bloco
+from filtros import IndiceFiltros, Selecao
+
+# ==========================================
+# 📦 EXPORTAÇÃO EM BLOCOS x A FATIA INTEIRA DE UMA VEZ
+# ==========================================
+
+LEITORES = {"xlsx": partial(pd.read_excel, dtype=str), "csv.gz": partial(pd.read_csv, dtype=str), "parquet": pd.read_parquet}
+
+@pytest.fixture(scope="module")
+def posicoes(base_tratada):
+    return IndiceFiltros(base_tratada).filtrar({"estado": ["SP", "RJ"], "site": True})
+
+def como_texto(serie):
+    # Vazio, None e NaN viram "" (cada formato devolve o vazio de um jeito)
+    return ["" if pd.isna(v) or v in ("", "None", "nan") else str(v) for v in serie]
+
+@pytest.mark.parametrize("formato", list(FORMATOS))
+def test_arquivo_igual_a_fatia_inteira(base_tratada, posicoes, tmp_path, formato):
+    destino = tmp_path / f"leads.{FORMATOS[formato]['extensao']}"
+    fracoes = []
+    exportar(Selecao(base_tratada, posicoes), str(destino), formato, tamanho_bloco=700, progresso=fracoes.append)
+    lido = LEITORES[formato](destino)
+    esperado = montar_bloco(base_tratada.take(posicoes))
+    assert list(lido.columns) == [nome for nome, _ in COLUNAS_EXPORT]
+    assert len(lido) == len(posicoes) > 700
+    for col in ("Empresa", "Telefone", "Link WhatsApp", "UF", "Site"):
+        assert como_texto(lido[col]) == como_texto(esperado[col]), col
+    # Um aviso por bloco, crescente, terminando em 1
+    assert len(fracoes) == -(-len(posicoes) // 700) and fracoes == sorted(fracoes) and fracoes[-1] == 1.0
+
+def test_dataframe_vira_selecao(base_tratada, tmp_path):
+    destino = tmp_path / "leads.csv.gz"
+    exportar(base_tratada.head(120), str(destino), "csv.gz", tamanho_bloco=50)
+    assert len(pd.read_csv(destino)) == 120
+
+def test_links_whatsapp_como_a_versao_linha_a_linha():
+    telefone = pd.Series(["(11) 98765-4321", "5511987654321", "(21) 3333-4444", "１１９８７", None])
+    tipo = pd.Series(["Celular", "Celular", "Fixo", "Celular", "Celular"], dtype="category")
+
+    def antigo(tel, tp):
+        if tp != "Celular": return ""
+        num = "".join(filter(str.isdigit, str(tel)))
+        return "https://wa.me/" + (num if num.startswith("55") else "55" + num)
+    assert links_whatsapp(telefone, tipo).tolist() == [antigo(t, p) for t, p in zip(telefone, tipo)]
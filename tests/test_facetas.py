@@ -0,0 +1,43 @@
+import pytest
+from filtros import IndiceFacetas
+
+# ==========================================
+# 🗂️ FACETAS EM CASCATA x FILTRAR A BASE E CONTAR
+# ==========================================
+
+def contagem(df, col):
+    """O que o app fazia: filtra a base pelo nível de cima e conta os valores da coluna."""
+    contados = df[col].value_counts(dropna=True)
+    return {k: int(v) for k, v in sorted(contados[contados > 0].items())}
+
+@pytest.fixture(scope="module")
+def facetas(base_tratada):
+    return IndiceFacetas(base_tratada)
+
+def test_segmentos_e_ufs(base_tratada, facetas):
+    assert facetas.segmentos() == contagem(base_tratada, 'Segmento')
+    assert facetas.ufs() == contagem(base_tratada, 'estado')
+    assert facetas.nichos() == contagem(base_tratada, 'categoria_google')
+
+@pytest.mark.parametrize("segmentos", [["Alimentação"], ["Automotivo", "Clínicas & Saúde"], ["Inexistente"]], ids=str)
+def test_nichos_do_setor(base_tratada, facetas, segmentos):
+    assert facetas.nichos(segmentos) == contagem(base_tratada[base_tratada['Segmento'].isin(segmentos)], 'categoria_google')
+
+@pytest.mark.parametrize("ufs, cidades", [
+    (["SP"], None), (["PR", "SC", "RS"], None), (["SP"], ["São Paulo"]), (None, ["Curitiba", "São Paulo"]),
+    (["RJ"], ["São Paulo"]), (["XX"], None),
+], ids=str)
+def test_cidades_e_bairros_da_uf(base_tratada, facetas, ufs, cidades):
+    df = base_tratada[base_tratada['estado'].isin(ufs)] if ufs else base_tratada
+    if ufs: assert facetas.cidades(ufs) == contagem(df, 'cidade')
+    if cidades: df = df[df['cidade'].isin(cidades)]
+    assert facetas.bairros(ufs, cidades) == contagem(df, 'bairro')
+
+def test_celulas_agregadas_com_pesos(base_tratada, facetas):
+    # O modo remoto monta as facetas a partir da view agregada (uma linha por célula, coluna qtd)
+    celulas = base_tratada.groupby(['estado', 'cidade', 'bairro', 'Segmento', 'categoria_google'],
+                                   observed=True).size().rename('qtd').reset_index()
+    agregadas = IndiceFacetas(celulas, pesos='qtd')
+    assert agregadas.ufs() == facetas.ufs()
+    assert agregadas.nichos(["Alimentação"]) == facetas.nichos(["Alimentação"])
+    assert agregadas.bairros(["SP"], ["São Paulo"]) == facetas.bairros(["SP"], ["São Paulo"])
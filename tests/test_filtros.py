@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import FILTROS
+from filtros import COLUNAS_FAIXA, COLUNAS_FILTRO, IndiceFiltros, dobrar
+
+# ==========================================
+# 🔎 ÍNDICE DE FILTROS x MÁSCARA PANDAS (A FILTRAGEM ANTIGA DO APP)
+# ==========================================
+
+def mascara(df, filtro):
+    """A cadeia de df[...] que o app fazia, com o nome comparado sem acento e sem regex (como no índice)."""
+    m = pd.Series(True, index=df.index)
+    nome = dobrar(str(filtro.get('nome') or '').strip())
+    if nome:
+        m &= df['nome'].map(lambda n: nome in dobrar(n) if isinstance(n, str) else False).astype(bool)
+    if filtro.get('site') is True: m &= df['site'].notnull()
+    elif filtro.get('site') is False: m &= df['site'].isnull()
+    for col in COLUNAS_FAIXA:
+        lo, hi = filtro.get(col) or (None, None)
+        if lo is not None: m &= df[col] >= lo
+        if hi is not None: m &= df[col] <= hi
+    for col in COLUNAS_FILTRO:
+        if filtro.get(col): m &= df[col].isin(filtro[col])
+    return np.flatnonzero(m.to_numpy())
+
+@pytest.fixture(scope="module")
+def indice(base_tratada):
+    return IndiceFiltros(base_tratada)
+
+def sortear_filtros(df, n=40, semente=3):
+    rng = np.random.default_rng(semente)
+    def alguns(col, k):
+        valores = df[col].dropna().unique()
+        return list(rng.choice(valores, size=min(k, len(valores)), replace=False))
+    filtros = []
+    for _ in range(n):
+        filtro = {col: alguns(col, int(rng.integers(1, 4))) for col in COLUNAS_FILTRO if rng.random() < 0.3}
+        if rng.random() < 0.3: filtro['nota'] = (float(rng.choice([0.0, 3.5, 4.2])), float(rng.choice([4.5, 5.0])))
+        if rng.random() < 0.3: filtro['avaliacoes'] = (int(rng.choice([0, 10, 100])), rng.choice([None, 500]))
+        if rng.random() < 0.3: filtro['site'] = bool(rng.random() < 0.5)
+        if rng.random() < 0.3: filtro['nome'] = str(rng.choice(["pi", "silva", "ção", " LTDA", "o m", "zz"]))
+        filtros.append(filtro)
+    return filtros
+
+@pytest.mark.parametrize("filtro", FILTROS, ids=str)
+def test_filtros_tipicos(base_tratada, indice, filtro):
+    assert list(indice.filtrar(filtro)) == list(mascara(base_tratada, filtro))
+
+def test_filtros_sorteados(base_tratada, indice):
+    for filtro in sortear_filtros(base_tratada):
+        assert list(indice.filtrar(filtro)) == list(mascara(base_tratada, filtro)), filtro
+
+def test_valor_fora_da_base_e_lista_vazia(base_tratada, indice):
+    assert len(indice.filtrar({"estado": ["XX"]})) == 0
+    assert len(indice.filtrar({"estado": [], "cidade": None})) == len(base_tratada)
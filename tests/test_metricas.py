@@ -0,0 +1,38 @@
+import time
+import pytest
+from metricas import Metricas
+
+# ==========================================
+# ⏱️ RERUNS QUE NÃO CHEGAM AO FIM DO SCRIPT
+# ==========================================
+
+@pytest.fixture
+def metricas(tmp_path):
+    return Metricas("teste", pasta=str(tmp_path), intervalo_prom=3600)
+
+def test_rerun_completo(metricas):
+    metricas.iniciar_rerun("s1")
+    with metricas.span("filtro") as s:
+        s["linhas"] = 10
+    rerun = metricas.encerrar_rerun("s1")
+    assert rerun["status"] == "ok" and rerun["spans"][0][0] == "filtro" and "ultimo" not in rerun
+
+def test_interrompido_nao_conta_o_tempo_parado(metricas):
+    metricas.iniciar_rerun("s1")
+    with pytest.raises(ValueError):
+        with metricas.span("filtro"):
+            time.sleep(0.05)
+            raise ValueError("quebrou")
+    time.sleep(0.3)  # a sessão fica parada até o próximo rerun
+    metricas.iniciar_rerun("s1")
+    interrompido = metricas.reruns[-1]
+    assert interrompido["status"] == "interrompido"
+    assert 0.05 <= interrompido["segundos"] < 0.2
+    assert interrompido["fim"] == interrompido["inicio"] + interrompido["segundos"]
+    assert metricas.abertos["s1"] is not interrompido
+
+def test_interrompido_sem_spans_dura_zero(metricas):
+    metricas.iniciar_rerun("s1")
+    time.sleep(0.1)
+    metricas.iniciar_rerun("s1")
+    assert metricas.reruns[-1]["segundos"] == 0 and metricas.reruns[-1]["status"] == "interrompido"
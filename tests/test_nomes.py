@@ -0,0 +1,36 @@
+import pytest
+from filtros import IndiceNomes, dobrar
+from sintetico import gerar_leads
+
+# ==========================================
+# 🔤 ÍNDICE DE TRIGRAMAS x BUSCA LITERAL EM TODOS OS NOMES
+# ==========================================
+
+EXTRAS = ["Padaria São João", "PÃO & CIA", "Bar_do Zé", "50% Off Pizzaria", "", "ab", "Açaí 🍓 Top",
+          "Oficina  Dois  Espaços", "Ótica Ótima", "zzz"]
+
+@pytest.fixture(scope="module")
+def nomes():
+    return list(gerar_leads(5_000, semente=8)['nome'].dropna().unique()) + EXTRAS
+
+@pytest.fixture(scope="module")
+def indice(nomes):
+    return IndiceNomes(nomes)
+
+def literal(nomes, consulta):
+    q = dobrar(consulta)
+    return [i for i, n in enumerate(nomes) if q in dobrar(n)]
+
+@pytest.mark.parametrize("consulta", [
+    "pizzaria", "PIZZ", "silva", "sao jo", "pão &", "pao", "bar_do", "r_d", "50%", "ç", "a", "zz", "zzz", "zzzz",
+    "ótima", "  dois  ", "🍓 top", "oficina dois", "inexistente", "ltda", "o m",
+], ids=str)
+def test_buscar_igual_a_varrer_tudo(nomes, indice, consulta):
+    assert list(indice.buscar(consulta)) == literal(nomes, consulta)
+
+def test_nomes_dobrados_uma_vez(nomes, indice):
+    assert indice.nomes == [dobrar(n) for n in nomes]
+
+def test_sem_nomes():
+    indice = IndiceNomes([])
+    assert list(indice.buscar("abc")) == [] and list(indice.buscar("a")) == []
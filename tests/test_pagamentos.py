@@ -0,0 +1,50 @@
+import time
+import pytest
+import fake_supabase as fk
+from clientes import criar_supabase
+from pagamentos import VigiaPagamentos
+
+# ==========================================
+# 💳 VIGIA DE PAGAMENTOS CONTRA O SUPABASE FALSO
+# ==========================================
+
+@pytest.fixture
+def banco():
+    banco = fk.BancoFalso({"vendas": [{"id": i, "external_reference": f"R{i}", "status": "pendente"} for i in range(450)]})
+    servidor, url = fk.iniciar(banco)
+    banco.client = criar_supabase(url, "teste" * 10)
+    yield banco
+    servidor.shutdown()
+
+def test_status_avulso_usa_o_cache(banco):
+    vigia = VigiaPagamentos(banco.client, ttl=30)
+    assert vigia.status("R1") == "pendente" and vigia.status("R1") == "pendente"
+    assert vigia.status("NAO_EXISTE") is None
+    assert vigia.consultas == 2
+
+def test_um_ciclo_consulta_todas_as_sessoes_em_lotes(banco):
+    vigia = VigiaPagamentos(banco.client, intervalo_min=0.05, intervalo_max=0.2, lote=200)
+    eventos = {f"R{i}": vigia.inscrever(f"R{i}") for i in range(450)}
+    time.sleep(0.3)
+    assert not any(e.is_set() for e in eventos.values())
+    assert vigia.consultas < 30  # 450 referências = 3 consultas (lotes de 200) por ciclo, não 450
+    banco.aprovar("R7")
+    assert eventos["R7"].wait(2)
+    assert not eventos["R8"].is_set()
+    assert vigia.status("R7") == "pago" and "R7" not in vigia.inscritos and len(vigia.inscritos) == 449
+
+def test_ja_pago_dispara_na_inscricao(banco):
+    vigia = VigiaPagamentos(banco.client)
+    banco.aprovar("R3")
+    assert vigia.status("R3") == "pago"
+    assert vigia.inscrever("R3").is_set() and "R3" not in vigia.inscritos
+
+def test_sessoes_fechadas_saem_do_vigia(banco):
+    vigia = VigiaPagamentos(banco.client, intervalo_min=0.05, intervalo_max=0.1, ttl=0.3, validade=0.6)
+    for i in range(20): vigia.status(f"R{i}")
+    vigia.inscrever("R200")
+    for _ in range(12):
+        time.sleep(0.1)
+        vigia.inscrever("R201")  # sessão aberta renova a inscrição
+    assert sorted(vigia.inscritos) == ["R201"]
+    assert set(vigia.cache) <= {"R201"} and set(vigia.eventos) == {"R201"}
@@ -0,0 +1,22 @@
+import tracemalloc
+import pytest
+from filtros import IndiceFiltros
+from particoes import mb_indice
+
+# ==========================================
+# 🗺️ PARTIÇÕES: TAMANHO CONTADO NO LRU
+# ==========================================
+
+def test_mb_indice_acompanha_a_memoria_alocada(base_tratada):
+    tracemalloc.start()
+    try:
+        indice = IndiceFiltros(base_tratada)
+        alocado = tracemalloc.get_traced_memory()[0] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+    # Nomes distintos e índice de trigramas entram na conta (antes ficavam de fora: ~1/3 do real)
+    assert mb_indice(indice) == pytest.approx(alocado, rel=0.25)
+
+def test_mb_indice_sem_coluna_nome(base_tratada):
+    indice = IndiceFiltros(base_tratada.drop(columns=["nome"]))
+    assert indice.nomes is None and mb_indice(indice) > 0
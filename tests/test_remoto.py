@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+from conftest import FILTROS
+import fake_supabase as fk
+from clientes import criar_supabase
+from dados import compactar_leads, tratar_leads
+from filtros import IndiceFiltros
+from remoto import BaseRemota, sincronizar
+from sintetico import gerar_registros
+
+# ==========================================
+# ☁️ MODO REMOTO (SUPABASE FALSO) x ÍNDICE LOCAL
+# ==========================================
+
+@pytest.fixture(scope="module")
+def ambiente():
+    registros = gerar_registros(3_000, semente=5)
+    # Nomes com curinga do LIKE: a busca tem de ser literal nos dois lados
+    registros[0]["nome"], registros[1]["nome"] = "Pizzaria 50% Off", "Bar_do Zé"
+    banco = fk.BancoFalso({"leads": registros}, materializadas={"leads_cubo": fk.view_cubo()})
+    servidor, url = fk.iniciar(banco)
+    client = criar_supabase(url, "teste" * 10)
+    sincronizar(client)
+    df = compactar_leads(tratar_leads(pd.DataFrame(registros))).reset_index(drop=True)
+    yield banco, client, df, IndiceFiltros(df)
+    servidor.shutdown()
+
+@pytest.fixture
+def remota(ambiente):
+    return BaseRemota(ambiente[1], tamanho_pagina=400, max_workers=4)
+
+FILTROS_REMOTO = FILTROS + [{"nome": "50%"}, {"nome": "r_d"}, {"nome": "bar_do"}]
+
+@pytest.mark.parametrize("filtro", FILTROS_REMOTO, ids=str)
+def test_contar_e_amostra_batem_com_o_indice(ambiente, remota, filtro):
+    _, _, df, indice = ambiente
+    posicoes = indice.filtrar(filtro)
+    assert remota.contar(filtro) == len(posicoes)
+    assert list(remota.amostra(filtro, 20)["id"]) == list(df["id"].take(posicoes[:20]))
+
+@pytest.mark.parametrize("filtro", [
+    {"estado": ["SP"]}, {"nome": "silva"}, {"nome": "  PIZZÁRIA ", "tipo_contato": ["Celular"]},
+    {"Segmento": ["Automotivo", "Clínicas & Saúde"], "nota": (4.5, 5.0)},
+], ids=str)
+def test_blocos_da_exportacao_batem_com_o_indice(ambiente, remota, filtro):
+    _, _, df, indice = ambiente
+    posicoes = indice.filtrar(filtro)
+    assert len(posicoes) > 50  # mais de um bloco
+    selecao = remota.baixar(filtro)
+    blocos = list(selecao.blocos(50))
+    assert all(len(b) == 50 for b in blocos[:-1])
+    assert len(selecao) == len(posicoes)
+    assert list(pd.concat(blocos)["id"]) == list(df["id"].take(posicoes))
+    assert selecao.qtd_igual("tipo_contato", "Celular") == int((df["tipo_contato"].take(posicoes) == "Celular").sum())
+    assert selecao.qtd_preenchidos("site") == int(df["site"].take(posicoes).notna().sum())
+
+def test_cubo_materializado_muda_so_na_sincronizacao(ambiente):
+    banco, client, df, _ = ambiente
+    total = lambda: BaseRemota(client).indices()[1].total({})
+    assert total() == len(df)
+    novos = gerar_registros(200, semente=6, inicio_id=10_000)
+    banco.inserir("leads", novos)
+    assert total() == len(df)  # a view materializada ainda é a da última sincronização
+    sincronizar(client)
+    assert total() == len(banco.tabelas["leads_tratados"]) > len(df)